@@ -5,10 +5,26 @@
 Using vtkImagePlaneWidget to pick up points from image.
 """
 
+import os
 import sys
-import vtk
-import SimpleITK as sitk
-from vtk.util import numpy_support
+import argparse
+import profiling
+from lazy import vtk_module, load_rendering
+from image_io import read_DICOM, read_DICOM_native, read_DICOM_parallel, \
+    read_DICOM_header, read_meta_image, CAST_AUTO
+
+# Importing this module costs the standard library only: each VTK module
+# is imported on first use (see `lazy`), the modules of this package which
+# import NumPy or VTK are imported by `main` and the key handlers.
+# $ python bench_import.py checks it.
+vtkCommonExecutionModel = vtk_module('vtkCommonExecutionModel')
+vtkFiltersGeneral = vtk_module('vtkFiltersGeneral')
+vtkFiltersSources = vtk_module('vtkFiltersSources')
+vtkInteractionStyle = vtk_module('vtkInteractionStyle')
+vtkInteractionWidgets = vtk_module('vtkInteractionWidgets')
+vtkRenderingAnnotation = vtk_module('vtkRenderingAnnotation')
+vtkRenderingCore = vtk_module('vtkRenderingCore')
+vtkRenderingFreeType = vtk_module('vtkRenderingFreeType')
 
 # START - Constants
 
@@ -18,129 +34,221 @@ path_dicom = "/Users/Quentan/Develop/IMAGE/CTK_Dataset/Head_Axial_DICOM_2461_CTH
 # path_dicom = "/Users/Quentan/Develop/IMAGE/medical data/5.25 SnapShot
 # Segment 0.625 mm 56-69 BPM - Large/dcm/4"  # lung
 
+# Keep the scanner's data type and share SimpleITK's buffer instead of
+# a transposed copy cast to double (see `read_DICOM_native`)
+native_load = False
+
+# Decode the slices on this many threads (see `read_DICOM_parallel`),
+# in the scanner's type and axes like `native_load`. 0 decodes them in one
+# SimpleITK read. Not cached in `cache_dir`.
+parallel_load = 0
+
+# Store the volume in the smallest type holding its values losslessly,
+# instead of double (legacy) or the scanner's type (native)
+auto_cast_load = False
+
+# Bytes of decoded slices kept in memory when streaming the series in
+# Z-slabs, so only the displayed slices are read. 0 loads it all at once.
+stream_budget = 0
+
+# Decoded volumes are kept here and memory-mapped on the next run.
+# None disables the cache.
+cache_dir = None
+cache_max_bytes = 8 * 2 ** 30
+
+# Mouse move picking runs at most once per interval (seconds) and only
+# re-renders when the voxel changes. 0 picks and renders on every event.
+pick_interval = 1 / 60.
+
+# Time the load stages, the picks and every frame, show them on screen
+# and write the histograms to this JSON file on exit. None disables it.
+profile_json = None
+
+# Number of half resolution levels built in the background. While a plane
+# is dragged it shows the coarsest one, then refines when released.
+# 0 always reslices the full resolution image.
+pyramid_levels = 0
+
+# Open the window at once and decode the series on a worker thread,
+# central slices first. Escape stops the load.
+async_load = False
+
+# Picks (key `p` over a plane) are logged to this file (in .npz format, under
+# this very name) and the picks of this study are shown again on the next
+# run. None disables it.
+pick_log = None
+
+# A pick closer than this (mm) to a landmark snaps onto it
+snap_distance = 2.0
+
+# Window/level preset of the planes at start, one of lut_cache.PRESETS,
+# None for the data range. Keys 1, 2, 3, ... switch between presets.
+window_preset = None
+
+# Further studies browsed with the same planes (Page Down / Page Up),
+# after `path_dicom`. The loaded ones, and the next one loaded in the
+# background, are kept up to `session_max_bytes`. Not with streaming or
+# asynchronous loading.
+study_paths = []
+session_max_bytes = 2 * 2 ** 30
+
+# Slices resliced and color-mapped ahead of the scroll direction, per
+# plane, so paging through them (drag, or Up / Down over a plane) does not
+# reslice. Runs a worker thread per plane. 0 disables it. Not with the
+# pyramid.
+cine_prefetch = 0
+
+# Index the volume (global and per-slice ranges and histograms) as it is
+# loaded, so key `w` over a plane sets the window of that slice at once.
+# The DICOM loaders index each chunk of slices as they decode it, no pass
+# of its own over the volume, yet it costs CPU time on every load; without
+# it the index is built on the first `w`.
+index_statistics = False
+
+# Key `g` over a plane grows a region from that voxel (`G` clears it),
+# within this (lower, upper) range, or None for mean +/- 2.5 standard
+# deviations around the first seed (confidence connected)
+grow_threshold = None
+
+# Key `i` shows the isosurface at the next of these values (HU for CT),
+# within `iso_radius` mm of the last pick (`p`), or of the whole volume
+# with no pick or a radius of 0. `I` hides it. Meshes are decimated by
+# `iso_decimation` and cached up to `iso_cache_bytes`, so going back to a
+# threshold is instant.
+iso_thresholds = [300, 700]
+iso_radius = 40.
+iso_decimation = 0.5
+iso_cache_bytes = 512 * 2 ** 20
+
 # END - Constants
 
-# Initialisation
-render_window = vtk.vtkRenderWindow()
-iren = vtk.vtkRenderWindowInteractor()
-renderer = vtk.vtkRenderer()
-
-
-def read_DICOM(path_DICOM, cast_type=11):
-    """
-    Read a serial of DICOM images with SimpleITK,
-    Cast it and return a VTK image (vtkImageData)
-    Note: numpy's array order is opposite with ITK's
-    :param path_DICOM: the PATH of DICOM series
-    :param cast_type:
-    0 - No casting
-    2 - VTK_CHAR
-    3 - VTK_UNSIGNED_CHAR
-    4 - VTK_SHORT           
-    5 - VTK_UNSIGNED_SHORT
-    6 - VTK_INT
-    7 - VTK_UNSIGNED_INT
-    8 - VTK_LONG
-    9 - VTK_UNSIGNED_LONG
-    10 - VTK_FLOAT
-    11 - VTK_DOUBLE   * default *
-    :return: vtkImageData
-    """
-
-    # Load DICOM images
-    reader = sitk.ImageSeriesReader()
-    filenamesDICOM = reader.GetGDCMSeriesFileNames(path_DICOM)
-    reader.SetFileNames(filenamesDICOM)
-    img_sitk = reader.Execute()  # the entire 3D image is stored
-    spacing = img_sitk.GetSpacing()
-
-    # Convert SimpleITK image to numpy array
-    numpy_data_array = sitk.GetArrayFromImage(img_sitk)
-
-    # Convert numpy array to VTK array (vtkDoubleArray).
-    # Note the opposite array order!
-    vtk_data_array = numpy_support.numpy_to_vtk(
-        num_array=numpy_data_array.transpose(2, 1, 0).ravel(),
-        deep=True,
-        array_type=vtk.VTK_DOUBLE)
-
-    # Convert vtkArray to vtkImageData
-    img_vtk = vtk.vtkImageData()
-    img_vtk.SetDimensions(numpy_data_array.shape)
-    img_vtk.SetSpacing(spacing[::-1])  # Note the order should be reversed!
-    img_vtk.GetPointData().SetScalars(vtk_data_array)  # is a vtkImageData
-
-    # No cast
-    if cast_type == 0:
-        return img_vtk
-
-    # Cast the image to another data type
-    elif cast_type in [i for i in range(2, 12)]:
-        cast = vtk.vtkImageCast()
-        cast.SetInputData(img_vtk)
-        cast.SetOutputScalarType(cast_type)
-        cast.Update()
-
-        # The output of `cast` is a vtkImageData
-        # `cast` is a vtkImageAlgorithm
-        return cast.GetOutput()
-
-    # Wrong cast type. Return the no-cast vtkImageData
-    else:
-        sys.stderr.write('Wrong Cast Type! It should be 2, 3, ..., or 11')
-        return img_vtk
+# Initialisation, see `init_window`
+render_window = None
+iren = None
+renderer = None
+
+# Picking on the image planes, see `MoveCursor`
+plane_picker = None
+cursor_annotation = None
+throttled_picker = None
+
+# Every pick of the session, and their markers in the scene, see `main`
+pick_store = None
+picked_points = None
+landmark_index = None
+
+# Window/level tables, shared by the three planes
+lut_cache = None
+plane_widgets = []
+
+# Prefetched slices, by plane axis, see `step_slice`
+slice_caches = {}
+
+# Region grown from the picks, see `grow_region`
+region_grower = None
+region_overlay = None
 
+# Isosurfaces around the last pick, see `show_isosurface`
+last_pick = None
+isosurface = None
+iso_index = -1
 
-def read_meta_image(meta_name, cast_type=5):
+# Studies of the session, see `switch_study`
+session = None
+current_study = None
+outline = None
+
+
+def init_window():
     """
-    Usually Meta Image is `unsigned short`
-    No casting leads to wrong reslut!
+    Make the render window, its interactor, the renderer and the corner
+    annotation, once
     """
-    reader = vtk.vtkMetaImageReader()
-    reader.SetFileName(meta_name)
+    global render_window, iren, renderer, cursor_annotation
+    if render_window is not None:
+        return
+    load_rendering()
+    render_window = vtkRenderingCore.vtkRenderWindow()
+    iren = vtkRenderingCore.vtkRenderWindowInteractor()
+    renderer = vtkRenderingCore.vtkRenderer()
+    cursor_annotation = vtkRenderingAnnotation.vtkCornerAnnotation()
+
 
-    # No cast
-    if cast_type == 0:
-        # vtkImageData with wrong dims and bounds value.
-        return reader.GetOutput()
+def MoveCursor(obj, event):
+    """
+    Show the voxel under the mouse in the lower right corner.
+    Analytic pick on the planes of `plane_picker`, no ray casting.
+    """
+    from picking import pick_text
+    if plane_picker is None:
+        return
+    x, y = obj.GetEventPosition()
+    result = plane_picker.pick(x, y, obj.FindPokedRenderer(x, y))
+    cursor_annotation.SetText(1, pick_text(result))
+    obj.GetRenderWindow().Render()
 
-    # Cast the image to another data type
-    elif cast_type in [i for i in range(2, 12)]:
-        cast = vtk.vtkImageCast()
-        # cast.SetInputData(img_vtk)
-        cast.SetInputConnection(reader.GetOutputPort())
-        cast.SetOutputScalarType(cast_type)
-        cast.Update()
-        return cast.GetOutput()  # The output of `cast` is a vtkImageData
 
-    # Wrong cast type. Return the no-cast vtkImageData
+def watch_cursor(interactor, _renderer):
+    """
+    Show the voxel under the mouse in the corner annotation, picking at
+    most once per `pick_interval` (see picking.ThrottledPicker), or on
+    every mouse move with MoveCursor
+    """
+    global throttled_picker
+    from picking import ThrottledPicker, pick_text
+    _renderer.AddViewProp(cursor_annotation)
+    if pick_interval and plane_picker is not None:
+        throttled_picker = ThrottledPicker(
+            interactor,
+            lambda x, y: plane_picker.pick(x, y, _renderer),
+            lambda result: cursor_annotation.SetText(1, pick_text(result)),
+            interval=pick_interval)
     else:
-        sys.stderr.write('Wrong Cast Type! It should be 2, 3, ..., or 11')
-        return reader.GetOutput()
+        interactor.AddObserver('MouseMoveEvent', MoveCursor)
 
 
-def vtk_show(_renderer, window_name='VTK Show Window',
-             width=640, height=480, has_picker=False):
+def record_pick(obj, event):
     """
-    Show the vtkRenderer in an vtkRenderWindow
-    Only support ONE vtkRenderer
-    :return: No return value
+    Key `p`: log the voxel under the mouse and mark it
     """
-    # render_window = vtk.vtkRenderWindow()
-    render_window.AddRenderer(_renderer)
-    render_window.SetSize(width, height)
-    render_window.Render()
-    # It works only after Render() is called
-    render_window.SetWindowName(window_name)
-
-    # iren = vtk.vtkRenderWindowInteractor()
-    # iren.SetRenderWindow(render_window)
+    global last_pick
+    if obj.GetKeySym() != 'p' or plane_picker is None:
+        return
+    x, y = obj.GetEventPosition()
+    result = plane_picker.pick(x, y, obj.FindPokedRenderer(x, y))
+    if result is None:
+        return
+    position, landmark = landmark_index.snap(result['position'],
+                                             snap_distance)
+    if landmark is not None:
+        result = plane_picker.probe(position, result['axis'])
+    last_pick = position
+    pick_store.append(result, study=current_study)
+    if landmark is None:
+        add_point(None, position, color=[1, 0, 0],
+                  radius=max(plane_picker.spacing), point_set=picked_points)
+    obj.GetRenderWindow().Render()
+
+
+def switch_preset(obj, event):
+    """
+    Keys 1, 2, 3, ...: window/level presets, in alphabetical order
+    """
+    from lut_cache import PRESETS
+    names = sorted(PRESETS)
+    key = obj.GetKeySym()
+    if not key.isdigit() or not 1 <= int(key) <= len(names):
+        return
+    lut_cache.apply_preset(plane_widgets, names[int(key) - 1])
+    obj.GetRenderWindow().Render()
 
-    interactor_style = vtk.vtkInteractorStyleTrackballCamera()
-    iren.SetInteractorStyle(interactor_style)
 
-    # Add an Annoted Cube with Arrows
-    cube = vtk.vtkAnnotatedCubeActor()
+def add_orientation_marker(interactor):
+    """
+    Add an annotated cube with arrows in the lower left corner
+    :return: the vtkOrientationMarkerWidget, keep a reference to it
+    """
+    cube = vtkRenderingAnnotation.vtkAnnotatedCubeActor()
     cube.SetXPlusFaceText('R')
     cube.SetXMinusFaceText('L')
     cube.SetYPlusFaceText('A')
@@ -172,21 +280,21 @@ def vtk_show(_renderer, window_name='VTK Show Window',
     cube.GetZMinusFaceProperty().SetColor(0, 0, 1)
     cube.GetZMinusFaceProperty().SetInterpolationToFlat()
 
-    text_property = vtk.vtkTextProperty()
+    text_property = vtkRenderingCore.vtkTextProperty()
     text_property.ItalicOn()
     text_property.ShadowOn()
     text_property.BoldOn()
     text_property.SetFontFamilyToTimes()
     text_property.SetColor(1, 0, 0)
 
-    text_property_2 = vtk.vtkTextProperty()
+    text_property_2 = vtkRenderingCore.vtkTextProperty()
     text_property_2.ShallowCopy(text_property)
     text_property_2.SetColor(0, 1, 0)
-    text_property_3 = vtk.vtkTextProperty()
+    text_property_3 = vtkRenderingCore.vtkTextProperty()
     text_property_3.ShallowCopy(text_property)
     text_property_3.SetColor(0, 0, 1)
 
-    axes = vtk.vtkAxesActor()
+    axes = vtkRenderingAnnotation.vtkAxesActor()
     axes.SetShaftTypeToCylinder()
     axes.SetXAxisLabelText('X')
     axes.SetYAxisLabelText('Y')
@@ -196,24 +304,188 @@ def vtk_show(_renderer, window_name='VTK Show Window',
     axes.GetYAxisCaptionActor2D().SetCaptionTextProperty(text_property_2)
     axes.GetZAxisCaptionActor2D().SetCaptionTextProperty(text_property_3)
 
-    assembly = vtk.vtkPropAssembly()
+    assembly = vtkRenderingCore.vtkPropAssembly()
     assembly.AddPart(axes)
     assembly.AddPart(cube)
 
-    marker = vtk.vtkOrientationMarkerWidget()
+    marker = vtkInteractionWidgets.vtkOrientationMarkerWidget()
     marker.SetOutlineColor(0.93, 0.57, 0.13)
     marker.SetOrientationMarker(assembly)
     marker.SetViewport(0.0, 0.0, 0.15, 0.3)
-    marker.SetInteractor(iren)
+    marker.SetInteractor(interactor)
     marker.EnabledOn()
     marker.InteractiveOn()
+    return marker
+
+
+def step_slice(obj, event):
+    """
+    Keys Up / Down: next / previous slice of the plane under the mouse
+    """
+    key = obj.GetKeySym()
+    if key not in ('Up', 'Down') or plane_picker is None:
+        return
+    x, y = obj.GetEventPosition()
+    result = plane_picker.pick(x, y, obj.FindPokedRenderer(x, y))
+    if result is None or result['axis'] not in slice_caches:
+        return
+    cache = slice_caches[result['axis']]
+    step = 1 if key == 'Up' else -1
+    cache.set_slice_index(cache.widget.GetSliceIndex() + step)
+    obj.GetRenderWindow().Render()
+
+
+def auto_window(obj, event):
+    """
+    Key `w`: window/level from the 1st to 99th percentiles of the slice
+    under the mouse
+    """
+    if obj.GetKeySym() != 'w' or plane_picker is None:
+        return
+    x, y = obj.GetEventPosition()
+    result = plane_picker.pick(x, y, obj.FindPokedRenderer(x, y))
+    if result is None:
+        return
+    from volume_stats import image_statistics
+    axis = result['axis']
+    widget = [w for w in plane_widgets
+              if w.GetPlaneOrientation() == axis][0]
+    statistics = image_statistics(widget.GetInput())
+    window, level = statistics.window_level(axis, widget.GetSliceIndex())
+    if lut_cache.window_level is not None:
+        # Baked in the cached tables, rounded not to build one per value
+        lut_cache.apply(plane_widgets, round(window), round(level))
+    else:
+        widget.SetWindowLevel(window, level)
+    obj.GetRenderWindow().Render()
+
+
+def grow_region(obj, event):
+    """
+    Key `g`: grow the region from the voxel under the mouse.
+    Key `G`: clear the region.
+    """
+    global region_grower, region_overlay
+    key = obj.GetKeySym()
+    if key not in ('g', 'G') or plane_picker is None or stream_budget:
+        return
+    from region_grow import RegionGrower, RegionOverlay
+    image = plane_widgets[0].GetInput()
+    if region_grower is None or region_grower.image_data is not image:
+        # First use, or another study
+        if region_overlay is not None:
+            region_overlay.remove(renderer)
+        region_grower = RegionGrower(image)
+        if grow_threshold is not None:
+            region_grower.set_threshold(*grow_threshold)
+        region_overlay = RegionOverlay(region_grower, plane_widgets,
+                                       renderer)
+    if key == 'G':
+        region_grower.reset()
+    else:
+        x, y = obj.GetEventPosition()
+        result = plane_picker.pick(x, y, obj.FindPokedRenderer(x, y))
+        index = None if result is None else \
+            region_grower.index_of(result['position'])
+        if index is None:
+            return
+        if grow_threshold is None and not region_grower.count:
+            region_grower.confidence_range([index])
+        with profiling.timed('grow_region'):
+            region_grower.add_seeds([index])
+    region_overlay.update()
+    obj.GetRenderWindow().Render()
+
+
+def show_isosurface(obj, event):
+    """
+    Key `i`: isosurface at the next of `iso_thresholds`, around the last
+    pick. Key `I`: hide it.
+    """
+    global isosurface, iso_index
+    key = obj.GetKeySym()
+    if key not in ('i', 'I') or stream_budget or not iso_thresholds:
+        return
+    from isosurface import IsosurfaceCache, IsosurfaceActor, roi_around
+    if isosurface is None:
+        isosurface = IsosurfaceActor(IsosurfaceCache(iso_cache_bytes),
+                                     renderer)
+    if key == 'I':
+        isosurface.hide()
+    else:
+        image = plane_widgets[0].GetInput()
+        iso_index = (iso_index + 1) % len(iso_thresholds)
+        roi = None
+        if last_pick is not None and iso_radius:
+            roi = roi_around(image, last_pick, iso_radius)
+        with profiling.timed('isosurface'):
+            isosurface.show(image, iso_thresholds[iso_index], roi,
+                            iso_decimation)
+        render_window.SetWindowName('Isosurface %g' %
+                                    iso_thresholds[iso_index])
+    obj.GetRenderWindow().Render()
+
+
+def switch_study(obj, event):
+    """
+    Keys Page Down / Page Up: next / previous study of the session
+    """
+    key = obj.GetKeySym()
+    if session is None or key not in ('Next', 'Prior'):
+        return
+    if key == 'Next':
+        session.next()
+    else:
+        session.previous()
+    obj.GetRenderWindow().Render()
+
+
+def show_study(study):
+    """
+    Point the picker, the outline and the markers at a session's study
+    """
+    global current_study
+    current_study = study.path
+    if plane_picker is not None:
+        plane_picker.set_image(study.image)
+    outline.SetBounds(study.image.GetBounds())
+    picked_points.clear()
+    picked_points.extend(pick_store.positions(study.path), colors=[1, 0, 0],
+                         radii=max(study.image.GetSpacing()))
+    renderer.ResetCameraClippingRange()
+    render_window.SetWindowName(os.path.basename(study.path))
+
+
+def vtk_show(_renderer, window_name='VTK Show Window',
+             width=640, height=480, has_picker=False):
+    """
+    Show the vtkRenderer in an vtkRenderWindow
+    Only support ONE vtkRenderer
+    :return: No return value
+    """
+    init_window()
+    # render_window = vtkRenderingCore.vtkRenderWindow()
+    render_window.AddRenderer(_renderer)
+    render_window.SetSize(width, height)
+    render_window.Render()
+    # It works only after Render() is called
+    render_window.SetWindowName(window_name)
+
+    # iren = vtkRenderingCore.vtkRenderWindowInteractor()
+    # iren.SetRenderWindow(render_window)
+
+    interactor_style = vtkInteractionStyle.vtkInteractorStyleTrackballCamera()
+    iren.SetInteractorStyle(interactor_style)
+
+    # Kept until Start() returns, the widget goes with its last reference
+    marker = add_orientation_marker(iren)
 
     # Add a x-y-z coordinate to the original point
-    axes_coor = vtk.vtkAxes()
+    axes_coor = vtkFiltersGeneral.vtkAxes()
     axes_coor.SetOrigin(0, 0, 0)
-    mapper_axes_coor = vtk.vtkPolyDataMapper()
+    mapper_axes_coor = vtkRenderingCore.vtkPolyDataMapper()
     mapper_axes_coor.SetInputConnection(axes_coor.GetOutputPort())
-    actor_axes_coor = vtk.vtkActor()
+    actor_axes_coor = vtkRenderingCore.vtkActor()
     actor_axes_coor.SetMapper(mapper_axes_coor)
     _renderer.AddActor(actor_axes_coor)
 
@@ -226,35 +498,55 @@ def vtk_show(_renderer, window_name='VTK Show Window',
 
     # iren.Initialize()  # will be called by Start() autometically
     if has_picker:
-        iren.AddObserver('MouseMoveEvent', MoveCursor)
+        watch_cursor(iren, _renderer)
     iren.Start()
 
 
-def add_point(_renderer, position=[0, 0, 0], color=[0.4, 0.4, 0.4], radius=0.2):
-    _point = vtk.vtkSphereSource()
+def add_point(_renderer, position=[0, 0, 0], color=[0.4, 0.4, 0.4], radius=0.2,
+              point_set=None):
+    """
+    Add a sphere to the scene
+    :param point_set: a markers.PointSet. If given, the point is appended to
+    it (one actor for all points) and its index is returned. Otherwise a
+    new actor is made for this point.
+    """
+    if point_set is not None:
+        return point_set.append(position, color, radius)
+
+    _point = vtkFiltersSources.vtkSphereSource()
     _point.SetCenter(position)
     _point.SetRadius(radius)
     _point.SetPhiResolution(10)
     _point.SetThetaResolution(10)
 
-    _mapper_point = vtk.vtkPolyDataMapper()
+    _mapper_point = vtkRenderingCore.vtkPolyDataMapper()
     _mapper_point.SetInputConnection(_point.GetOutputPort())
 
-    _actor_point = vtk.vtkActor()
+    _actor_point = vtkRenderingCore.vtkActor()
     _actor_point.SetMapper(_mapper_point)
     _actor_point.GetProperty().SetColor(color)
 
     _renderer.AddActor(_actor_point)
 
 
-def add_text(_renderer, position, text="TEXT", color=[0.5, 0.5, 0.5], scale=0.1):
+def add_text(_renderer, position, text="TEXT", color=[0.5, 0.5, 0.5], scale=0.1,
+             label_set=None):
+    """
+    Add a 3D text facing the camera
+    :param label_set: a markers.LabelSet. If given, the text is appended to
+    it (one mapper for all labels, overlaps culled) and its index is
+    returned; `color` and `scale` are then those of the set.
+    """
+    if label_set is not None:
+        return label_set.append(position, text)
+
     # Create text with the x-y-z coordinate system
-    _text = vtk.vtkVectorText()
+    _text = vtkRenderingFreeType.vtkVectorText()
     _text.SetText(text)
-    mapper_text = vtk.vtkPolyDataMapper()
+    mapper_text = vtkRenderingCore.vtkPolyDataMapper()
     mapper_text.SetInputConnection(_text.GetOutputPort())
-    # actor_text_origin = vtk.vtkActor()
-    actor_text = vtk.vtkFollower()
+    # actor_text_origin = vtkRenderingCore.vtkActor()
+    actor_text = vtkRenderingCore.vtkFollower()
     actor_text.SetCamera(_renderer.GetActiveCamera())
     actor_text.SetMapper(mapper_text)
     actor_text.SetScale(scale, scale, scale)
@@ -265,14 +557,26 @@ def add_text(_renderer, position, text="TEXT", color=[0.5, 0.5, 0.5], scale=0.1)
     _renderer.AddActor(actor_text)
 
 
+def set_input(consumer, image):
+    """
+    Connect an image to a filter or a widget
+    :param consumer: a vtkAlgorithm or a vtkImagePlaneWidget
+    :param image: a vtkImageData, or a source producing one (streaming)
+    """
+    if isinstance(image, vtkCommonExecutionModel.vtkAlgorithm):
+        consumer.SetInputConnection(image.GetOutputPort())
+    else:
+        consumer.SetInputData(image)
+
+
 def get_plane_widget(input_data, axis=0, slice_idx=10, color=[1, 0, 0], key_value='i'):
-    plane_widget = vtk.vtkImagePlaneWidget()
+    plane_widget = vtkInteractionWidgets.vtkImagePlaneWidget()
     plane_widget.DisplayTextOn()
-    plane_widget.SetInputData(input_data)
+    set_input(plane_widget, input_data)
     plane_widget.SetPlaneOrientation(axis)
     plane_widget.SetSliceIndex(slice_idx)
 
-    picker = vtk.vtkCellPicker()
+    picker = vtkRenderingCore.vtkCellPicker()
     picker.SetTolerance(0.005)
     plane_widget.SetPicker(picker)
 
@@ -282,116 +586,354 @@ def get_plane_widget(input_data, axis=0, slice_idx=10, color=[1, 0, 0], key_valu
     return plane_widget
 
 
-reader = read_DICOM(path_dicom)
-
-# Some informaion of the image
-dims = reader.GetDimensions()
-bounds = reader.GetBounds()
-spacing = reader.GetSpacing()
-origin = reader.GetOrigin()
-
-# Outline
-outline = vtk.vtkOutlineFilter()
-outline.SetInputData(reader)
-
-mapper_outline = vtk.vtkPolyDataMapper()
-mapper_outline.SetInputConnection(outline.GetOutputPort())
-
-actor_outline = vtk.vtkActor()
-actor_outline.SetMapper(mapper_outline)
-
-# vtkImagePlaneWidgets
-# plane_widget_x = get_plane_widget(reader, axis=0, slice_idx=dims[0] / 2,
-#                                   color=[1, 0, 0], key_value='x')
-# plane_widget_y = get_plane_widget(reader, axis=1, slice_idx=dims[1] / 2,
-#                                   color=[1, 1, 0], key_value='y')
-# plane_widget_y.SetLookupTable(plane_widget_x.GetLookupTable())
-
-# plane_widget_z = get_plane_widget(reader, axis=2, slice_idx=dims[2] / 2,
-#                                   color=[0, 0, 1], key_value='z')
-# plane_widget_z.SetLookupTable(plane_widget_x.GetLookupTable())
-
-
-# Set the interactor for the widgets
-# iren.SetRenderWindow(render_window)
-# plane_widget_x.SetInteractor(iren)
-# plane_widget_x.On()
-# plane_widget_y.SetInteractor(iren)
-# plane_widget_y.On()
-# plane_widget_z.SetInteractor(iren)
-# plane_widget_z.On()
-
-
-img_data = reader
-# The shared picker enables us to use 3 planes at one time
-# and gets the picking order right
-picker = vtk.vtkCellPicker()
-picker.SetTolerance(0.005)
-
-# The 3 image plane widgets are used to probe the dataset.
-planeWidgetX = vtk.vtkImagePlaneWidget()
-planeWidgetX.DisplayTextOn()
-planeWidgetX.SetInputData(img_data)
-planeWidgetX.SetPlaneOrientationToXAxes()
-planeWidgetX.SetSliceIndex(32)
-planeWidgetX.SetPicker(picker)
-planeWidgetX.SetKeyPressActivationValue("x")
-prop1 = planeWidgetX.GetPlaneProperty()
-prop1.SetColor(1, 0, 0)
-
-planeWidgetY = vtk.vtkImagePlaneWidget()
-planeWidgetY.DisplayTextOn()
-planeWidgetY.SetInputData(img_data)
-planeWidgetY.SetPlaneOrientationToYAxes()
-planeWidgetY.SetSliceIndex(32)
-planeWidgetY.SetPicker(picker)
-planeWidgetY.SetKeyPressActivationValue("y")
-prop2 = planeWidgetY.GetPlaneProperty()
-prop2.SetColor(1, 1, 0)
-planeWidgetY.SetLookupTable(planeWidgetX.GetLookupTable())
-
-# for the z-slice, turn off texture interpolation:
-# interpolation is now nearest neighbour, to demonstrate
-# cross-hair cursor snapping to pixel centers
-planeWidgetZ = vtk.vtkImagePlaneWidget()
-planeWidgetZ.DisplayTextOn()
-planeWidgetZ.SetInputData(img_data)
-planeWidgetZ.SetPlaneOrientationToZAxes()
-planeWidgetZ.SetSliceIndex(46)
-planeWidgetZ.SetPicker(picker)
-planeWidgetZ.SetKeyPressActivationValue("z")
-prop3 = planeWidgetZ.GetPlaneProperty()
-prop3.SetColor(0, 0, 1)
-planeWidgetZ.SetLookupTable(planeWidgetX.GetLookupTable())
-
-# VTK Rendering
-render_window.AddRenderer(renderer)
-render_window.SetMultiSamples(0)
-
-renderer.AddActor(actor_outline)
-
-# Set the interactor for the widgets
-iact = vtk.vtkRenderWindowInteractor()
-# iact = renWin.GetInteractor()
-iact.SetRenderWindow(render_window)
-planeWidgetX.SetInteractor(iact)
-planeWidgetX.On()
-planeWidgetY.SetInteractor(iact)
-planeWidgetY.On()
-planeWidgetZ.SetInteractor(iact)
-planeWidgetZ.On()
-
-# vtk_show(renderer)
-
-
-
-renderer.ResetCamera()
-cam1 = renderer.GetActiveCamera()
-cam1.Elevation(110)
-cam1.SetViewUp(0, 0, -1)
-cam1.Azimuth(45)
-renderer.ResetCameraClippingRange()
-
-iact.Initialize()
-iact.Start()
-render_window.Render()
+def main(argv=None):
+    """
+    Show `path_dicom` on three image plane widgets, the other
+    `study_paths` being browsed with Page Down / Page Up
+    :param argv: command line, `path_dicom` and `study_paths` by default
+    :return: exit status
+    """
+    global path_dicom, study_paths, plane_picker, pick_store, \
+        picked_points, landmark_index, lut_cache, plane_widgets, session, \
+        current_study, outline
+    # The helpers of the features turned on only, each importing the VTK
+    # modules it needs when it needs them
+    from markers import PointSet, LandmarkIndex
+    from pick_store import PickStore
+    from lut_cache import LookupTableCache
+
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('series', nargs='*',
+                        help='DICOM directories, the first one shown')
+    args = parser.parse_args(argv)
+    if args.series:
+        path_dicom, study_paths = args.series[0], args.series[1:]
+
+    init_window()
+    pick_store = PickStore()
+    picked_points = PointSet()
+    landmark_index = LandmarkIndex(picked_points)
+    lut_cache = LookupTableCache()
+    current_study = path_dicom
+
+    profiling.profiler.enabled = profile_json is not None
+
+    # Header only pass: the outline, the camera and the orientation marker are
+    # on screen before a single pixel of the series is decoded
+    header = read_DICOM_header(path_dicom)
+    if async_load or stream_budget or native_load or parallel_load:
+        bounds = header['bounds']
+    else:
+        # `read_DICOM` swaps X and Z and leaves the origin at 0
+        bounds = []
+        for s, n in zip(header['spacing'][::-1], header['dimensions'][::-1]):
+            bounds.extend([0, s * (n - 1)])
+
+    # Outline
+    # Built from the bounds only, an outline filter would pull the whole volume
+    outline = vtkFiltersSources.vtkOutlineSource()
+    outline.SetBounds(bounds)
+
+    mapper_outline = vtkRenderingCore.vtkPolyDataMapper()
+    mapper_outline.SetInputConnection(outline.GetOutputPort())
+
+    actor_outline = vtkRenderingCore.vtkActor()
+    actor_outline.SetMapper(mapper_outline)
+
+    # VTK Rendering
+    render_window.AddRenderer(renderer)
+    render_window.SetMultiSamples(0)
+
+    renderer.AddActor(actor_outline)
+
+    renderer.ResetCamera()
+    cam1 = renderer.GetActiveCamera()
+    cam1.Elevation(110)
+    cam1.SetViewUp(0, 0, -1)
+    cam1.Azimuth(45)
+    renderer.ResetCameraClippingRange()
+
+    iact = vtkRenderingCore.vtkRenderWindowInteractor()
+    # iact = renWin.GetInteractor()
+    iact.SetRenderWindow(render_window)
+    orientation_marker = add_orientation_marker(iact)
+    render_window.Render()
+
+    load_stats = {}
+    volume_cache = None
+    if cache_dir is not None:
+        from volume_cache import VolumeCache
+        volume_cache = VolumeCache(cache_dir, cache_max_bytes)
+    async_loader = None
+    if async_load:
+        from async_load import AsyncSeriesLoader
+        async_loader = AsyncSeriesLoader(path_dicom,
+                                         file_names=header['file_names'],
+                                         statistics=index_statistics)
+        reader = async_loader.image
+    elif stream_budget:
+        from dicom_stream import DICOMSeriesSource
+        reader = DICOMSeriesSource(path_dicom, budget=stream_budget,
+                                   file_names=header['file_names'])
+    elif parallel_load:
+        reader = read_DICOM_parallel(
+            path_dicom, workers=parallel_load,
+            cast_type=CAST_AUTO if auto_cast_load else 0, stats=load_stats,
+            statistics=index_statistics, file_names=header['file_names'])
+    elif native_load:
+        reader = read_DICOM_native(
+            path_dicom, cast_type=CAST_AUTO if auto_cast_load else 0,
+            stats=load_stats, cache=volume_cache,
+            statistics=index_statistics, file_names=header['file_names'])
+    else:
+        reader = read_DICOM(path_dicom,
+                            cast_type=CAST_AUTO if auto_cast_load else 11,
+                            stats=load_stats, cache=volume_cache,
+                            statistics=index_statistics,
+                            file_names=header['file_names'])
+    if load_stats:
+        print('Loaded %(dimensions)s %(scalar_type)s (%(mode)s): '
+              '%(buffer_bytes)d bytes, peak RSS +%(peak_rss_delta)d bytes'
+              % load_stats)
+    if 'auto_type' in load_stats:
+        print('Stored as %(auto_type)s, %(bytes_saved_vs_double)d bytes saved '
+              'against double' % load_stats)
+
+    # Some informaion of the image
+    if stream_budget:
+        dims = reader.dimensions
+        spacing = reader.spacing
+        origin = reader.origin
+    else:
+        dims = reader.GetDimensions()
+        spacing = reader.GetSpacing()
+        origin = reader.GetOrigin()
+
+    # vtkImagePlaneWidgets
+    # plane_widget_x = get_plane_widget(reader, axis=0, slice_idx=dims[0] / 2,
+    #                                   color=[1, 0, 0], key_value='x')
+    # plane_widget_y = get_plane_widget(reader, axis=1, slice_idx=dims[1] / 2,
+    #                                   color=[1, 1, 0], key_value='y')
+    # plane_widget_y.SetLookupTable(plane_widget_x.GetLookupTable())
+
+    # plane_widget_z = get_plane_widget(reader, axis=2, slice_idx=dims[2] / 2,
+    #                                   color=[0, 0, 1], key_value='z')
+    # plane_widget_z.SetLookupTable(plane_widget_x.GetLookupTable())
+
+
+    # Set the interactor for the widgets
+    # iren.SetRenderWindow(render_window)
+    # plane_widget_x.SetInteractor(iren)
+    # plane_widget_x.On()
+    # plane_widget_y.SetInteractor(iren)
+    # plane_widget_y.On()
+    # plane_widget_z.SetInteractor(iren)
+    # plane_widget_z.On()
+
+
+    img_data = reader
+    # The shared picker enables us to use 3 planes at one time
+    # and gets the picking order right. It is only used to grab a plane,
+    # the voxel under the mouse is picked by `plane_picker`
+    picker = vtkRenderingCore.vtkCellPicker()
+    picker.SetTolerance(0.005)
+
+    # The 3 image plane widgets are used to probe the dataset.
+    planeWidgetX = vtkInteractionWidgets.vtkImagePlaneWidget()
+    planeWidgetX.DisplayTextOn()
+    set_input(planeWidgetX, img_data)
+    planeWidgetX.SetPlaneOrientationToXAxes()
+    planeWidgetX.SetSliceIndex(32)
+    planeWidgetX.SetPicker(picker)
+    planeWidgetX.SetKeyPressActivationValue("x")
+    prop1 = planeWidgetX.GetPlaneProperty()
+    prop1.SetColor(1, 0, 0)
+
+    planeWidgetY = vtkInteractionWidgets.vtkImagePlaneWidget()
+    planeWidgetY.DisplayTextOn()
+    set_input(planeWidgetY, img_data)
+    planeWidgetY.SetPlaneOrientationToYAxes()
+    planeWidgetY.SetSliceIndex(32)
+    planeWidgetY.SetPicker(picker)
+    planeWidgetY.SetKeyPressActivationValue("y")
+    prop2 = planeWidgetY.GetPlaneProperty()
+    prop2.SetColor(1, 1, 0)
+    planeWidgetY.SetLookupTable(planeWidgetX.GetLookupTable())
+
+    # for the z-slice, turn off texture interpolation:
+    # interpolation is now nearest neighbour, to demonstrate
+    # cross-hair cursor snapping to pixel centers
+    planeWidgetZ = vtkInteractionWidgets.vtkImagePlaneWidget()
+    planeWidgetZ.DisplayTextOn()
+    set_input(planeWidgetZ, img_data)
+    planeWidgetZ.SetPlaneOrientationToZAxes()
+    planeWidgetZ.SetSliceIndex(46)
+    planeWidgetZ.SetPicker(picker)
+    planeWidgetZ.SetKeyPressActivationValue("z")
+    prop3 = planeWidgetZ.GetPlaneProperty()
+    prop3.SetColor(0, 0, 1)
+    planeWidgetZ.SetLookupTable(planeWidgetX.GetLookupTable())
+
+    plane_widgets = [planeWidgetX, planeWidgetY, planeWidgetZ]
+    if window_preset is not None:
+        lut_cache.apply_preset(plane_widgets, window_preset)
+    lut_cache.follow(plane_widgets)
+
+    if not stream_budget:
+        from picking import ImagePlanePicker
+        plane_picker = ImagePlanePicker(
+            img_data, [planeWidgetX, planeWidgetY, planeWidgetZ])
+
+    if study_paths and not (stream_budget or async_load):
+        from session import StudySession
+
+        def load_study(path):
+            if parallel_load:
+                return read_DICOM_parallel(
+                    path, workers=parallel_load,
+                    cast_type=CAST_AUTO if auto_cast_load else 0,
+                    statistics=index_statistics)
+            if native_load:
+                return read_DICOM_native(
+                    path, cast_type=CAST_AUTO if auto_cast_load else 0,
+                    cache=volume_cache, statistics=index_statistics)
+            return read_DICOM(
+                path, cast_type=CAST_AUTO if auto_cast_load else 11,
+                cache=volume_cache, statistics=index_statistics)
+
+        session = StudySession([path_dicom] + list(study_paths), plane_widgets,
+                               load=load_study, max_bytes=session_max_bytes,
+                               on_activate=show_study)
+        session.add(path_dicom, img_data)
+
+    # The pyramid is of the first study only, and of the whole volume: when
+    # loading in the background it is built once the load is done
+    pyramid_interaction = None
+    if pyramid_levels and not stream_budget and session is None and \
+            async_loader is None:
+        from pyramid import ImagePyramid, PyramidInteraction
+        pyramid = ImagePyramid(img_data, pyramid_levels)
+        pyramid.build_async()
+        pyramid_interaction = PyramidInteraction(
+            pyramid, [planeWidgetX, planeWidgetY, planeWidgetZ],
+            level=pyramid_levels)
+
+    picked_points.add_to(renderer)
+    if pick_log is not None and os.path.exists(pick_log):
+        pick_store = PickStore.load(pick_log)
+        picked_points.extend(pick_store.positions(path_dicom),
+                             colors=[1, 0, 0], radii=max(spacing))
+
+    if profiling.profiler.enabled:
+        profiling.profiler.watch_render_window(render_window)
+        profiling.profiler.add_overlay(renderer, render_window)
+
+    # Set the interactor for the widgets
+    planeWidgetX.SetInteractor(iact)
+    planeWidgetX.On()
+    planeWidgetY.SetInteractor(iact)
+    planeWidgetY.On()
+    planeWidgetZ.SetInteractor(iact)
+    planeWidgetZ.On()
+    if plane_picker is not None:
+        # Hovering picks analytically; the cell picker of the widgets only
+        # runs when a plane is grabbed, and only against the planes
+        watch_cursor(iact, renderer)
+    iact.AddObserver('KeyPressEvent', record_pick)
+    iact.AddObserver('KeyPressEvent', switch_preset)
+    iact.AddObserver('KeyPressEvent', switch_study)
+    iact.AddObserver('KeyPressEvent', auto_window)
+    iact.AddObserver('KeyPressEvent', grow_region)
+    iact.AddObserver('KeyPressEvent', show_isosurface)
+    if cine_prefetch and not stream_budget and not \
+            (pyramid_levels and session is None):
+        from slice_cache import SliceCache
+        for widget in plane_widgets:
+            slice_caches[widget.GetPlaneOrientation()] = SliceCache(
+                widget, ahead=cine_prefetch, behind=cine_prefetch // 4)
+        iact.AddObserver('KeyPressEvent', step_slice)
+
+    # vtk_show(renderer)
+
+    renderer.ResetCameraClippingRange()
+
+    iact.Initialize()
+
+    if session is not None:
+        session.activate(0)
+
+    if async_loader is not None:
+        window_set = window_preset is not None
+
+        def show_progress(done, total):
+            nonlocal window_set
+            # The widgets took their window from an empty image: set it once
+            # from the first slices, later changes are the user's
+            if not window_set:
+                data_range = img_data.GetScalarRange()
+                planeWidgetX.SetWindowLevel(
+                    data_range[1] - data_range[0],
+                    (data_range[0] + data_range[1]) / 2.)
+                window_set = True
+            render_window.SetWindowName('Loading %d / %d' % (done, total))
+
+        def cancel_load(obj, event):
+            """
+            Key Escape: stop loading, the slices decoded so far stay
+            """
+            if obj.GetKeySym() == 'Escape':
+                async_loader.cancel()
+
+        def finish_load(cancelled, error):
+            nonlocal pyramid_interaction
+            iact.RemoveObserver(cancel_observer)
+            if error is not None:
+                render_window.SetWindowName('Loading failed')
+            elif cancelled:
+                render_window.SetWindowName('Loading cancelled')
+            else:
+                render_window.SetWindowName('VTK Show Window')
+            if cancelled or error is not None:
+                # Partial volume: no statistics or pyramid of it
+                img_data.statistics = None
+                return
+            if not index_statistics:
+                # Statistics asked for (key `w`) while loading are of a
+                # partial volume. Otherwise the loader indexed the slices
+                # as they came.
+                img_data.statistics = None
+            if pyramid_levels:
+                from pyramid import ImagePyramid, PyramidInteraction
+                pyramid = ImagePyramid(img_data, pyramid_levels)
+                pyramid.build_async()
+                pyramid_interaction = PyramidInteraction(
+                    pyramid, plane_widgets, level=pyramid_levels)
+
+        async_loader.on_progress = show_progress
+        async_loader.on_done = finish_load
+        cancel_observer = iact.AddObserver('KeyPressEvent', cancel_load)
+        async_loader.attach(iact)
+        async_loader.start()
+
+    iact.Start()
+    render_window.Render()
+
+    if throttled_picker is not None:
+        throttled_picker.remove()
+        if profiling.profiler.enabled:
+            print('Mouse moves: %(events)d events, %(dropped)d dropped, '
+                  '%(picks)d picks, %(renders)d renders, '
+                  '%(renders_skipped)d skipped' % throttled_picker.counters)
+    if session is not None:
+        session.shutdown()
+    for cache in slice_caches.values():
+        cache.remove()
+    if profiling.profiler.enabled:
+        profiling.profiler.dump_json(profile_json)
+    if pick_log is not None:
+        pick_store.save(pick_log)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
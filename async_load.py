@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Background loading of a DICOM series with a progressive first render.
+"""
+
+import sys
+import threading
+import collections
+import numpy
+import SimpleITK as sitk
+from image_io import series_geometry, numpy_to_vtk_image, decode_slices
+from volume_stats import StatisticsBuilder
+
+
+def center_out(count, chunk_size):
+    """
+    Chunks (start, stop) of range(count), from the middle outwards
+    """
+    starts = list(range(0, count, chunk_size))
+    middle = (count // 2) // chunk_size
+    order = sorted(range(len(starts)), key=lambda i: (abs(i - middle), i))
+    return [(starts[i], min(starts[i] + chunk_size, count)) for i in order]
+
+
+class AsyncSeriesLoader(object):
+    """
+    Load a DICOM series on a worker thread into an image which is shown
+    while it fills.
+    Only the geometry (first two slices) is read up front: `image` exists
+    at once and can be bound to the plane widgets before the window opens.
+    The slices are then decoded from the middle of the series outwards,
+    so the central slice of each axis appears first.
+    VTK is only touched from the main thread: the worker writes into the
+    NumPy buffer and queues what it did, and a repeating interactor timer
+    marks the image modified and renders.
+    """
+
+    def __init__(self, path_DICOM, chunk_size=4, on_progress=None,
+                 on_done=None, file_names=None, statistics=False):
+        """
+        :param path_DICOM: the PATH of DICOM series
+        :param chunk_size: number of slices decoded, then shown, at once
+        :param on_progress: function (done, total) called in the main
+        thread after slices were shown. Returning True cancels the load.
+        :param on_done: function (cancelled, error) called in the main
+        thread, `error` the exception which stopped the worker or None.
+        The image is only complete if neither is set.
+        :param file_names: the sorted files of the series if known (see
+        image_io.read_DICOM_header), not to scan the directory again
+        :param statistics: index the slices as they are decoded (on the
+        worker, see volume_stats.StatisticsBuilder), the result is
+        `image.statistics` once the load is complete
+        """
+        self.file_names = file_names or \
+            sitk.ImageSeriesReader.GetGDCMSeriesFileNames(path_DICOM)
+        dims, spacing, origin, dtype = series_geometry(self.file_names)
+        self.buffer = numpy.zeros(dims[::-1], dtype=dtype)
+        self.image = numpy_to_vtk_image(self.buffer, spacing, origin)
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.builder = StatisticsBuilder(self.buffer.shape) \
+            if statistics else None
+
+        self.done = 0
+        self.finished = False
+        self.error = None
+        self.cancelled = threading.Event()
+        self.updates = collections.deque()  # worker -> main thread
+        self.thread = None
+        self.interactor = None
+        self.timer_id = None
+        self.observer = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _run(self):
+        try:
+            for start, stop in center_out(len(self.file_names),
+                                          self.chunk_size):
+                if self.cancelled.is_set():
+                    break
+                chunk = decode_slices(self.file_names[start:stop])
+                self.buffer[start:stop] = chunk
+                if self.builder is not None:
+                    self.builder.add(start, chunk)
+                self.updates.append(stop - start)
+        except Exception as error:
+            self.error = error
+        self.updates.append(None)  # end of the load
+
+    def attach(self, interactor, interval=100):
+        """
+        Show the progress in the window of `interactor`, every `interval`
+        milliseconds. Call it after interactor.Initialize().
+        """
+        self.interactor = interactor
+        self.observer = interactor.AddObserver('TimerEvent', self.on_timer)
+        self.timer_id = interactor.CreateRepeatingTimer(interval)
+
+    def on_timer(self, obj, event):
+        if obj.GetTimerEventId() != self.timer_id:
+            return
+        shown = 0
+        while self.updates:
+            update = self.updates.popleft()
+            if update is None:
+                self.finished = True
+            else:
+                shown += update
+        if shown:
+            self.done += shown
+            self.image.GetPointData().GetScalars().Modified()
+            self.image.Modified()
+            if self.on_progress is not None and \
+                    self.on_progress(self.done, len(self.file_names)):
+                self.cancel()
+            obj.GetRenderWindow().Render()
+        if self.finished:
+            self.detach()
+            if self.error is not None:
+                sys.stderr.write('Loading failed: %s\n' % self.error)
+            elif self.builder is not None and not self.cancelled.is_set():
+                self.image.statistics = self.builder.result()
+            if self.on_done is not None:
+                self.on_done(self.cancelled.is_set(), self.error)
+
+    def detach(self):
+        if self.interactor is not None:
+            self.interactor.DestroyTimer(self.timer_id)
+            self.interactor.RemoveObserver(self.observer)
+            self.interactor = None
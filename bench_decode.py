@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark serial against parallel decoding of a DICOM series.
+
+$ python bench_decode.py PATH_DICOM --workers 1 4 8 32
+"""
+
+import argparse
+import timeit
+from image_io import read_DICOM_native, read_DICOM_parallel
+
+
+def bench(label, load, repeat):
+    """
+    Best wall time of `repeat` loads
+    :return: (label, seconds, stats of the last load)
+    """
+    best = None
+    stats = {}
+    for _ in range(repeat):
+        start = timeit.default_timer()
+        load(stats)
+        elapsed = timeit.default_timer() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return label, best, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('path_dicom')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--chunk-size', type=int, default=8)
+    parser.add_argument('--processes', action='store_true',
+                        help='use a process pool instead of threads')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    results = [bench('serial', lambda stats: read_DICOM_native(
+        args.path_dicom, stats=stats), args.repeat)]
+    for workers in args.workers:
+        results.append(bench(
+            'parallel x%d' % workers,
+            lambda stats: read_DICOM_parallel(
+                args.path_dicom, workers=workers,
+                use_processes=args.processes, chunk_size=args.chunk_size,
+                stats=stats),
+            args.repeat))
+
+    serial_time = results[0][1]
+    print('%-14s %10s %8s' % ('mode', 'time (s)', 'speedup'))
+    for label, elapsed, stats in results:
+        print('%-14s %10.3f %8.2f' % (label, elapsed, serial_time / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the time to import the Picking module, each run in a fresh
+interpreter, and check that it imports neither VTK, SimpleITK nor NumPy.
+Exits with status 1 past the budget.
+
+$ python bench_import.py --runs 20 --budget 50
+"""
+
+import sys
+import argparse
+import subprocess
+
+HEAVY_MODULES = ('vtk', 'vtkmodules', 'SimpleITK', 'numpy')
+
+# Run by the child interpreter: seconds of the import, then the heavy
+# modules it brought
+PROBE = '''
+import sys, timeit
+start = timeit.default_timer()
+import %s
+print(timeit.default_timer() - start)
+print(' '.join(sorted(set(name.split('.')[0] for name in sys.modules) &
+                      set(%r))))
+'''
+
+
+def import_time(module):
+    """
+    :return: (seconds, heavy modules imported)
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE % (module, HEAVY_MODULES)],
+        universal_newlines=True).splitlines()
+    return float(output[0]), output[1].split() if len(output) > 1 else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--module', default='Picking_1')
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget', type=float, default=50.,
+                        help='milliseconds, median of the runs')
+    args = parser.parse_args()
+
+    times = []
+    heavy = set()
+    for _ in range(args.runs):
+        seconds, modules = import_time(args.module)
+        times.append(seconds)
+        heavy.update(modules)
+    times.sort()
+    median = times[len(times) // 2]
+
+    print('%-12s %10s %10s %10s' % ('module', 'min (ms)', 'median (ms)',
+                                    'max (ms)'))
+    print('%-12s %10.2f %10.2f %10.2f' % (args.module, times[0] * 1e3,
+                                          median * 1e3, times[-1] * 1e3))
+    if heavy:
+        print('imported at import time: %s' % ', '.join(sorted(heavy)))
+    if median * 1e3 > args.budget or heavy:
+        print('over budget (%g ms, no heavy import)' % args.budget)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark the frame time of many point markers, offscreen.
+
+$ python bench_markers.py --counts 10000 100000
+"""
+
+import argparse
+import random
+import timeit
+import vtk
+from markers import PointSet, LandmarkIndex
+
+
+def frame_time(render_window, frames):
+    """
+    Mean seconds per frame, the camera moving between frames
+    """
+    camera = render_window.GetRenderers().GetFirstRenderer().GetActiveCamera()
+    render_window.Render()  # first frame uploads the data
+    start = timeit.default_timer()
+    for _ in range(frames):
+        camera.Azimuth(1)
+        render_window.Render()
+    return (timeit.default_timer() - start) / frames
+
+
+def make_window(size):
+    renderer = vtk.vtkRenderer()
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(size, size)
+    render_window.AddRenderer(renderer)
+    return renderer, render_window
+
+
+def bench_point_set(count, frames):
+    renderer, render_window = make_window(600)
+    point_set = PointSet()
+    point_set.add_to(renderer)
+
+    start = timeit.default_timer()
+    for _ in range(count):
+        point_set.append([random.uniform(0, 100) for _ in range(3)],
+                         color=(random.random(), random.random(), 0.5),
+                         radius=random.uniform(0.1, 0.5))
+    append_time = (timeit.default_timer() - start) / count
+
+    renderer.ResetCamera()
+    return append_time, frame_time(render_window, frames)
+
+
+def bench_queries(count, queries):
+    """
+    Mean seconds of nearest, radius and 8-nearest queries
+    """
+    point_set = PointSet()
+    point_set.extend([[random.uniform(0, 100) for _ in range(3)]
+                      for _ in range(count)])
+    index = LandmarkIndex(point_set)
+    index.update()
+    # A few points appended after the build, as during a session
+    for _ in range(100):
+        point_set.append([random.uniform(0, 100) for _ in range(3)])
+
+    positions = [[random.uniform(0, 100) for _ in range(3)]
+                 for _ in range(queries)]
+    results = []
+    for query in (lambda p: index.nearest(p),
+                  lambda p: index.within(p, 2.0),
+                  lambda p: index.k_nearest(p, 8)):
+        start = timeit.default_timer()
+        for position in positions:
+            query(position)
+        results.append((timeit.default_timer() - start) / queries)
+    return results
+
+
+def bench_actors(count, frames):
+    """
+    One sphere actor per point, as add_point used to do
+    """
+    renderer, render_window = make_window(600)
+    start = timeit.default_timer()
+    for _ in range(count):
+        sphere = vtk.vtkSphereSource()
+        sphere.SetCenter([random.uniform(0, 100) for _ in range(3)])
+        sphere.SetRadius(0.2)
+        sphere.SetPhiResolution(10)
+        sphere.SetThetaResolution(10)
+        mapper = vtk.vtkPolyDataMapper()
+        mapper.SetInputConnection(sphere.GetOutputPort())
+        actor = vtk.vtkActor()
+        actor.SetMapper(mapper)
+        renderer.AddActor(actor)
+    append_time = (timeit.default_timer() - start) / count
+
+    renderer.ResetCamera()
+    return append_time, frame_time(render_window, frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--counts', type=int, nargs='+',
+                        default=[10000, 100000])
+    parser.add_argument('--frames', type=int, default=20)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--actors', action='store_true',
+                        help='also time one actor per point (slow)')
+    args = parser.parse_args()
+
+    print('%-10s %10s %14s %14s' % ('markers', 'points', 'append (us)',
+                                    'frame (ms)'))
+    for count in args.counts:
+        benches = [('glyphs', bench_point_set)]
+        if args.actors:
+            benches.append(('actors', bench_actors))
+        for label, bench in benches:
+            append_time, frame = bench(count, args.frames)
+            print('%-10s %10d %14.2f %14.2f' % (label, count,
+                                                append_time * 1e6,
+                                                frame * 1e3))
+
+    print('%-10s %14s %14s %14s' % ('points', 'nearest (us)', 'radius (us)',
+                                    '8-nearest (us)'))
+    for count in args.counts:
+        print('%-10d %14.2f %14.2f %14.2f' % ((count,) + tuple(
+            1e6 * t for t in bench_queries(count, args.queries))))
+
+
+if __name__ == '__main__':
+    main()
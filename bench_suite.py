@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Offscreen benchmark suite: loading, slicing and picking on synthetic data.
+
+Volumes of several sizes and types are generated, and a synthetic DICOM
+series is written in a temporary directory, so nothing outside this
+directory is needed. Every window is offscreen; on a machine without GPU
+use a VTK built with OSMesa (e.g. the `vtk-osmesa` wheel), the render
+window class in use is stored with the results.
+
+Each run is appended as one JSON line to the results file and compared
+with the previous run.
+
+$ python bench_suite.py --sizes 64 128 256 --dtypes uint8 int16 float32
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import timeit
+import argparse
+import tempfile
+import concurrent.futures
+import numpy
+import vtk
+import SimpleITK as sitk
+from image_io import peak_rss, numpy_to_vtk_image, read_DICOM, \
+    read_DICOM_native, read_DICOM_parallel
+from picking import ImagePlanePicker
+
+LOADERS = {'legacy': read_DICOM,
+           'native': read_DICOM_native,
+           'parallel': read_DICOM_parallel}
+
+
+def synthetic_volume(size, dtype):
+    """
+    A sphere with a radial ramp and some noise, (z, y, x) cube of `size`
+    """
+    dtype = numpy.dtype(dtype)
+    axis = numpy.linspace(-1, 1, size, dtype=numpy.float32)
+    z, y, x = numpy.meshgrid(axis, axis, axis, indexing='ij', sparse=True)
+    ramp = numpy.clip(1 - (x * x + y * y + z * z), 0, 1)
+    ramp += numpy.random.uniform(0, 0.05, ramp.shape).astype(numpy.float32)
+    if dtype.kind == 'f':
+        return ramp.astype(dtype)
+    top = min(numpy.iinfo(dtype).max, 2000)
+    return (ramp * top).astype(dtype)
+
+
+def write_dicom_series(volume, spacing, directory):
+    """
+    Write a (z, y, x) integer volume as one CT DICOM file per slice
+    """
+    image = sitk.GetImageFromArray(volume)
+    image.SetSpacing(spacing)
+    series_uid = '1.2.826.0.1.3680043.2.1125.%d' % int(time.time() * 1e6)
+    writer = sitk.ImageFileWriter()
+    writer.KeepOriginalImageUIDOn()
+    for k in range(image.GetDepth()):
+        slice_k = image[:, :, k]
+        position = image.TransformIndexToPhysicalPoint((0, 0, k))
+        slice_k.SetMetaData('0008|0016', '1.2.840.10008.5.1.4.1.1.2')
+        slice_k.SetMetaData('0008|0018', '%s.%d' % (series_uid, k + 1))
+        slice_k.SetMetaData('0008|0060', 'CT')
+        slice_k.SetMetaData('0020|000e', series_uid)
+        slice_k.SetMetaData('0020|0013', str(k + 1))
+        slice_k.SetMetaData('0020|0032', '\\'.join(map(str, position)))
+        slice_k.SetMetaData('0020|0037', '1\\0\\0\\0\\1\\0')
+        writer.SetFileName(os.path.join(directory, '%05d.dcm' % k))
+        writer.Execute(slice_k)
+
+
+def _load_in_child(mode, path_dicom):
+    """
+    Run in a fresh process, so that its peak RSS is this load's only
+    :return: (seconds, peak RSS growth in bytes)
+    """
+    baseline = peak_rss()
+    start = timeit.default_timer()
+    LOADERS[mode](path_dicom)
+    return timeit.default_timer() - start, peak_rss() - baseline
+
+
+def bench_load(path_dicom, modes, repeat):
+    results = {}
+    for mode in modes:
+        best = None
+        for _ in range(repeat):
+            with concurrent.futures.ProcessPoolExecutor(1) as executor:
+                seconds, rss = executor.submit(
+                    _load_in_child, mode, path_dicom).result()
+            if best is None or seconds < best[0]:
+                best = (seconds, rss)
+        results['load.%s.seconds' % mode] = best[0]
+        results['load.%s.peak_rss' % mode] = best[1]
+    return results
+
+
+def bench_reslice(img_vtk, slices):
+    """
+    Mean seconds to extract one axis-aligned slice, per axis
+    """
+    results = {}
+    dims = img_vtk.GetDimensions()
+    center = img_vtk.GetCenter()
+    cosines = [(0, 1, 0, 0, 0, 1, 1, 0, 0),  # x plane
+               (1, 0, 0, 0, 0, 1, 0, 1, 0),  # y plane
+               (1, 0, 0, 0, 1, 0, 0, 0, 1)]  # z plane
+    for axis in range(3):
+        reslice = vtk.vtkImageReslice()
+        reslice.SetInputData(img_vtk)
+        reslice.SetOutputDimensionality(2)
+        reslice.SetResliceAxesDirectionCosines(cosines[axis])
+        start = timeit.default_timer()
+        for n in range(slices):
+            origin = list(center)
+            origin[axis] = img_vtk.GetOrigin()[axis] + \
+                img_vtk.GetSpacing()[axis] * (n * dims[axis] // slices)
+            reslice.SetResliceAxesOrigin(origin)
+            reslice.Update()
+        results['reslice.%s.seconds' % 'xyz'[axis]] = \
+            (timeit.default_timer() - start) / slices
+    return results
+
+
+def make_scene(img_vtk, size):
+    """
+    The three plane widgets of Picking_1.py, in an offscreen window
+    """
+    renderer = vtk.vtkRenderer()
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(size, size)
+    render_window.AddRenderer(renderer)
+    iren = vtk.vtkRenderWindowInteractor()
+    iren.SetRenderWindow(render_window)
+
+    outline = vtk.vtkOutlineFilter()
+    outline.SetInputData(img_vtk)
+    mapper_outline = vtk.vtkPolyDataMapper()
+    mapper_outline.SetInputConnection(outline.GetOutputPort())
+    actor_outline = vtk.vtkActor()
+    actor_outline.SetMapper(mapper_outline)
+    renderer.AddActor(actor_outline)
+
+    picker = vtk.vtkCellPicker()
+    picker.SetTolerance(0.005)
+    widgets = []
+    dims = img_vtk.GetDimensions()
+    for axis in range(3):
+        widget = vtk.vtkImagePlaneWidget()
+        widget.SetInputData(img_vtk)
+        widget.SetPlaneOrientation(axis)
+        widget.SetSliceIndex(dims[axis] // 2)
+        widget.SetPicker(picker)
+        widget.SetInteractor(iren)
+        if widgets:
+            widget.SetLookupTable(widgets[0].GetLookupTable())
+        widget.On()
+        widgets.append(widget)
+
+    renderer.ResetCamera()
+    camera = renderer.GetActiveCamera()
+    camera.Elevation(110)
+    camera.SetViewUp(0, 0, -1)
+    camera.Azimuth(45)
+    renderer.ResetCameraClippingRange()
+    render_window.Render()
+    return renderer, render_window, widgets, picker
+
+
+def bench_scene(img_vtk, size, frames, picks):
+    results = {}
+    renderer, render_window, widgets, cell_picker = make_scene(img_vtk, size)
+
+    # Frame time, camera moving
+    camera = renderer.GetActiveCamera()
+    start = timeit.default_timer()
+    for _ in range(frames):
+        camera.Azimuth(1)
+        render_window.Render()
+    results['frame.camera.seconds'] = (timeit.default_timer() - start) / frames
+
+    # Frame time, z plane scrolling (reslice + texture upload)
+    widget_z = widgets[2]
+    dz = img_vtk.GetDimensions()[2]
+    start = timeit.default_timer()
+    for n in range(frames):
+        widget_z.SetSliceIndex(n * dz // frames)
+        render_window.Render()
+    results['frame.slice.seconds'] = (timeit.default_timer() - start) / frames
+    widget_z.SetSliceIndex(dz // 2)
+    render_window.Render()
+
+    # Pick latency at the same random positions, both pickers
+    positions = [(random.randrange(size), random.randrange(size))
+                 for _ in range(picks)]
+    plane_picker = ImagePlanePicker(img_vtk, widgets)
+    start = timeit.default_timer()
+    for x, y in positions:
+        plane_picker.pick(x, y, renderer)
+    results['pick.analytic.seconds'] = (timeit.default_timer() - start) / picks
+    start = timeit.default_timer()
+    for x, y in positions:
+        cell_picker.Pick(x, y, 0, renderer)
+    results['pick.cell.seconds'] = (timeit.default_timer() - start) / picks
+
+    for widget in widgets:
+        widget.Off()
+    render_window.Finalize()
+    return results
+
+
+def previous_run(results_file):
+    if not os.path.exists(results_file):
+        return None
+    last = None
+    with open(results_file) as lines:
+        for line in lines:
+            if line.strip():
+                last = json.loads(line)
+    return last
+
+
+def print_comparison(run, previous):
+    print('%-48s %14s %10s' % ('case', 'value', 'vs prev'))
+    old_cases = previous['cases'] if previous else {}
+    for case, value in sorted(run['cases'].items()):
+        ratio = ''
+        if old_cases.get(case):
+            ratio = '%9.2fx' % (value / float(old_cases[case]))
+        print('%-48s %14.6g %10s' % (case, value, ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[64, 128])
+    parser.add_argument('--dtypes', nargs='+',
+                        default=['uint8', 'int16', 'float32'])
+    parser.add_argument('--loaders', nargs='+', default=sorted(LOADERS),
+                        choices=sorted(LOADERS))
+    parser.add_argument('--dicom-size', type=int, default=128,
+                        help='edge of the synthetic DICOM series, 0 to skip')
+    parser.add_argument('--window', type=int, default=600)
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--picks', type=int, default=1000)
+    parser.add_argument('--slices', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--results', default='bench_results.jsonl')
+    args = parser.parse_args()
+
+    numpy.random.seed(0)
+    random.seed(0)
+    cases = {}
+
+    if args.dicom_size:
+        directory = tempfile.mkdtemp(prefix='picking_bench_')
+        try:
+            volume = synthetic_volume(args.dicom_size, numpy.int16)
+            write_dicom_series(volume, (0.5, 0.5, 1.0), directory)
+            for name, value in bench_load(directory, args.loaders,
+                                          args.repeat).items():
+                cases['dicom%d.%s' % (args.dicom_size, name)] = value
+        finally:
+            shutil.rmtree(directory)
+
+    for size in args.sizes:
+        for dtype in args.dtypes:
+            img_vtk = numpy_to_vtk_image(synthetic_volume(size, dtype),
+                                         (1.0, 1.0, 1.0))
+            results = bench_reslice(img_vtk, args.slices)
+            results.update(bench_scene(img_vtk, args.window,
+                                       args.frames, args.picks))
+            for name, value in results.items():
+                cases['%s%d.%s' % (dtype, size, name)] = value
+
+    run = {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+           'host': socket.gethostname(),
+           'python': sys.version.split()[0],
+           'vtk': vtk.vtkVersion.GetVTKVersion(),
+           'render_window': vtk.vtkRenderWindow().GetClassName(),
+           'numpy': numpy.__version__,
+           'cases': cases}
+    print_comparison(run, previous_run(args.results))
+    with open(args.results, 'a') as results_file:
+        results_file.write(json.dumps(run, sort_keys=True) + '\n')
+
+
+if __name__ == '__main__':
+    main()
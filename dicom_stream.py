@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Streaming DICOM series source: the series is read in Z-slabs, only for
+the update extent requested downstream, under a bounded memory budget.
+"""
+
+import collections
+import numpy
+import SimpleITK as sitk
+from lazy import lazy_import, vtk_module
+from image_io import series_geometry
+
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+vtkCommonDataModel = vtk_module('vtkCommonDataModel')
+vtkCommonExecutionModel = vtk_module('vtkCommonExecutionModel')
+# A base class is needed at once: this imports vtkFiltersPython and the
+# modules it depends on, not the whole `vtk` package
+VTKPythonAlgorithmBase = lazy_import(
+    'vtkmodules.util.vtkAlgorithm',
+    'vtk.util.vtkAlgorithm').VTKPythonAlgorithmBase
+
+
+class DICOMSeriesSource(VTKPythonAlgorithmBase):
+    """
+    A vtkImageData source over a DICOM series which honours update extents.
+    Connect it with SetInputConnection(source.GetOutputPort()): a
+    vtkImagePlaneWidget (through its vtkImageReslice) then only pulls the
+    slices it displays, instead of the whole volume.
+    Decoded slabs are kept in a LRU cache capped at `budget` bytes.
+    The budget is of the cache only: the output holds the requested
+    extent, whatever its size, as a VTK source has to. A consumer asking
+    for the whole extent (an outline filter, a volume mapper...) gets the
+    whole volume allocated, on top of the cache.
+    Note: axes are in ITK order (x, y, z), as `read_DICOM_native`.
+    """
+
+    def __init__(self, path_DICOM, slab_size=16, budget=256 * 2 ** 20,
+                 file_names=None):
+        """
+        :param path_DICOM: the PATH of DICOM series
+        :param slab_size: number of slices decoded at once
+        :param budget: maximum bytes of decoded slabs kept in memory
+        :param file_names: the sorted files of the series if known (see
+        image_io.read_DICOM_header), not to scan the directory again
+        """
+        VTKPythonAlgorithmBase.__init__(self, nInputPorts=0, nOutputPorts=1,
+                                        outputType='vtkImageData')
+        self.file_names = file_names or \
+            sitk.ImageSeriesReader.GetGDCMSeriesFileNames(path_DICOM)
+        self.slab_size = max(1, int(slab_size))
+        self.budget = budget
+        self.slabs = collections.OrderedDict()
+        self.slabs_read = 0
+
+        self.dimensions, self.spacing, self.origin, self.dtype = \
+            series_geometry(self.file_names)
+
+    def GetSlabBytes(self):
+        nx, ny = self.dimensions[:2]
+        return nx * ny * self.slab_size * self.dtype.itemsize
+
+    def GetCachedBytes(self):
+        return sum(slab.nbytes for slab in self.slabs.values())
+
+    def SetBudget(self, budget):
+        self.budget = budget
+        self._evict()
+        self.Modified()
+
+    def _evict(self):
+        max_slabs = max(1, self.budget // self.GetSlabBytes())
+        while len(self.slabs) > max_slabs:
+            self.slabs.popitem(last=False)
+
+    def _get_slab(self, index):
+        """
+        Decoded slab `index` as a (z, y, x) array, from cache if possible
+        """
+        if index in self.slabs:
+            slab = self.slabs.pop(index)
+        else:
+            start = index * self.slab_size
+            reader = sitk.ImageSeriesReader()
+            reader.SetFileNames(
+                self.file_names[start:start + self.slab_size])
+            slab = sitk.GetArrayFromImage(reader.Execute())
+            slab = slab.astype(self.dtype, copy=False)
+            self.slabs_read += 1
+        self.slabs[index] = slab  # most recently used at the end
+        self._evict()
+        return slab
+
+    def RequestInformation(self, request, inInfo, outInfo):
+        nx, ny, nz = self.dimensions
+        info = outInfo.GetInformationObject(0)
+        pipeline = vtkCommonExecutionModel.vtkStreamingDemandDrivenPipeline
+        data_object = vtkCommonDataModel.vtkDataObject
+        info.Set(pipeline.WHOLE_EXTENT(),
+                 (0, nx - 1, 0, ny - 1, 0, nz - 1), 6)
+        info.Set(data_object.SPACING(), self.spacing, 3)
+        info.Set(data_object.ORIGIN(), self.origin, 3)
+        info.Set(vtkCommonExecutionModel.vtkAlgorithm.CAN_PRODUCE_SUB_EXTENT(),
+                 1)
+        data_object.SetPointDataActiveScalarInfo(
+            info, numpy_support.get_vtk_array_type(self.dtype), 1)
+        return 1
+
+    def RequestData(self, request, inInfo, outInfo):
+        info = outInfo.GetInformationObject(0)
+        x0, x1, y0, y1, z0, z1 = info.Get(
+            vtkCommonExecutionModel.vtkStreamingDemandDrivenPipeline
+            .UPDATE_EXTENT())
+
+        block = numpy.empty((z1 - z0 + 1, y1 - y0 + 1, x1 - x0 + 1),
+                            dtype=self.dtype)
+        for index in range(z0 // self.slab_size,
+                           z1 // self.slab_size + 1):
+            start = index * self.slab_size
+            lo = max(z0, start)
+            hi = min(z1, start + self.slab_size - 1)
+            slab = self._get_slab(index)
+            block[lo - z0:hi - z0 + 1] = \
+                slab[lo - start:hi - start + 1, y0:y1 + 1, x0:x1 + 1]
+
+        output = vtkCommonDataModel.vtkImageData.GetData(outInfo)
+        output.SetExtent(x0, x1, y0, y1, z0, z1)
+        output.SetSpacing(self.spacing)
+        output.SetOrigin(self.origin)
+        # `block` is fresh, share it instead of copying
+        output.GetPointData().SetScalars(numpy_support.numpy_to_vtk(
+            block.reshape(-1), deep=False,
+            array_type=numpy_support.get_vtk_array_type(self.dtype)))
+        return 1
+
+    def GetBounds(self):
+        """
+        Bounds of the whole series, known without reading any pixel
+        """
+        bounds = []
+        for o, s, n in zip(self.origin, self.spacing, self.dimensions):
+            bounds.extend([o, o + s * (n - 1)])
+        return bounds
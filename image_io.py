@@ -0,0 +1,657 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Image loaders: DICOM series (SimpleITK) and Meta Image (VTK) to vtkImageData.
+"""
+
+import sys
+import resource
+import concurrent.futures
+from lazy import lazy_import, vtk_module
+from profiling import timed
+from volume_stats import image_statistics, StatisticsBuilder
+
+# Imported by the first loader called, not with this module
+numpy = lazy_import('numpy')
+sitk = lazy_import('SimpleITK')
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+vtkCommonCore = vtk_module('vtkCommonCore')
+vtkCommonDataModel = vtk_module('vtkCommonDataModel')
+vtkImagingCore = vtk_module('vtkImagingCore')
+vtkIOImage = vtk_module('vtkIOImage')
+
+# Valid `cast_type` values, see `read_DICOM`
+CAST_TYPES = range(2, 12)
+
+# `cast_type` choosing the smallest lossless type from the data
+CAST_AUTO = 'auto'
+
+# `cast_type` values keeping the decoded values, so the statistics index
+# built while decoding holds for the image
+LOSSLESS_CASTS = (0, CAST_AUTO, 11)
+
+# Integer types tried by CAST_AUTO, smallest first
+AUTO_INTEGER_TYPES = ['uint8', 'int8', 'uint16', 'int16', 'uint32', 'int32']
+
+# SimpleITK pixel ID (by name) -> numpy type, see `sitk_dtype`
+SITK_DTYPES = {'sitkUInt8': 'uint8',
+               'sitkInt8': 'int8',
+               'sitkUInt16': 'uint16',
+               'sitkInt16': 'int16',
+               'sitkUInt32': 'uint32',
+               'sitkInt32': 'int32',
+               'sitkUInt64': 'uint64',
+               'sitkInt64': 'int64',
+               'sitkFloat32': 'float32',
+               'sitkFloat64': 'float64'}
+
+# DICOM tags (group|element) of the rescale applied to stored values
+TAG_RESCALE_INTERCEPT = '0028|1052'
+TAG_RESCALE_SLOPE = '0028|1053'
+
+
+def sitk_dtype(pixel_id):
+    """
+    numpy dtype of a SimpleITK pixel ID
+    """
+    for name, dtype in SITK_DTYPES.items():
+        if getattr(sitk, name) == pixel_id:
+            return numpy.dtype(dtype)
+    raise ValueError('Unsupported SimpleITK pixel type %r' % pixel_id)
+
+
+def peak_rss():
+    """
+    High-water mark of the resident set size of this process, in bytes.
+    `ru_maxrss` is in kilobytes on Linux but in bytes on Mac OS X.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss
+    return rss * 1024
+
+
+def cast_image(img_vtk, cast_type, stats=None):
+    """
+    Cast a vtkImageData to another scalar type with vtkImageCast
+    :param img_vtk: vtkImageData
+    :param cast_type: 0 for no casting, CAST_AUTO, otherwise 2, 3, ..., or 11
+    :param stats: optional dict, see `auto_cast`
+    :return: vtkImageData
+    """
+    # No cast
+    if cast_type == 0:
+        return img_vtk
+
+    elif cast_type == CAST_AUTO:
+        view = numpy_support.vtk_to_numpy(
+            img_vtk.GetPointData().GetScalars()).reshape(
+            img_vtk.GetDimensions()[::-1])
+        array = auto_cast(view, stats=stats)
+        if array is view:
+            return img_vtk
+        return numpy_to_vtk_image(array, img_vtk.GetSpacing(),
+                                  img_vtk.GetOrigin())
+
+    # Cast the image to another data type
+    elif cast_type in CAST_TYPES:
+        cast = vtkImagingCore.vtkImageCast()
+        cast.SetInputData(img_vtk)
+        cast.SetOutputScalarType(cast_type)
+        cast.Update()
+
+        # The output of `cast` is a vtkImageData
+        # `cast` is a vtkImageAlgorithm
+        return cast.GetOutput()
+
+    # Wrong cast type. Return the no-cast vtkImageData
+    else:
+        sys.stderr.write('Wrong Cast Type! It should be 2, 3, ..., or 11')
+        return img_vtk
+
+
+def _slabs(array, slab_bytes=64 * 2 ** 20):
+    """
+    Consecutive views along the first axis, to bound temporaries
+    """
+    step = max(1, slab_bytes // max(1, array[:1].nbytes))
+    for start in range(0, len(array), step):
+        yield array[start:start + step]
+
+
+def lossless_dtype(array, integral=None):
+    """
+    Smallest type representing every value of `array` exactly
+    :param integral: True if the values are known to be integers, None to
+    check it on the data. The DICOM loaders always check: the rescale of
+    a series may differ from slice to slice (PET, some MR).
+    :return: numpy dtype
+    """
+    lo, hi = array.min(), array.max()
+    if integral is None:
+        integral = array.dtype.kind in 'iub' or all(
+            numpy.array_equal(slab, numpy.rint(slab))
+            for slab in _slabs(array))
+    if integral:
+        for candidate in AUTO_INTEGER_TYPES:
+            info = numpy.iinfo(candidate)
+            if info.min <= lo and hi <= info.max:
+                return numpy.dtype(candidate)
+        return array.dtype
+    if array.dtype.itemsize > 4 and all(
+            numpy.array_equal(slab.astype(numpy.float32), slab)
+            for slab in _slabs(array)):
+        return numpy.dtype(numpy.float32)
+    return array.dtype
+
+
+def auto_cast(array, integral=None, stats=None):
+    """
+    Convert `array` to `lossless_dtype` in one pass (no copy if it is
+    already the smallest type)
+    :param stats: optional dict, filled with the chosen type and the
+    bytes saved against the input and against a double volume
+    """
+    dtype = lossless_dtype(array, integral)
+    result = array if dtype == array.dtype else array.astype(dtype)
+    if stats is not None:
+        stats['auto_type'] = dtype.name
+        stats['bytes_saved'] = array.nbytes - result.nbytes
+        stats['bytes_saved_vs_double'] = 8 * array.size - result.nbytes
+    return result
+
+
+def _fill_stats(stats, mode, img_vtk, rss_before):
+    """
+    Record what a loader produced and how much memory it took.
+    `peak_rss_delta` is how far the process high-water mark moved
+    during the load, i.e. the transient peak of this mode.
+    """
+    if stats is None:
+        return
+    scalars = img_vtk.GetPointData().GetScalars()
+    stats['mode'] = mode
+    stats['scalar_type'] = img_vtk.GetScalarTypeAsString()
+    stats['dimensions'] = img_vtk.GetDimensions()
+    stats['buffer_bytes'] = \
+        scalars.GetNumberOfTuples() * scalars.GetDataTypeSize()
+    stats['peak_rss'] = peak_rss()
+    stats['peak_rss_delta'] = stats['peak_rss'] - rss_before
+
+
+def _index_statistics(img_vtk, statistics, name):
+    """
+    Build the statistics index of a loaded image if asked for and not
+    already there: a pass over the image, for the loaders that cannot
+    index while decoding
+    """
+    if statistics:
+        with timed(name + '.statistics'):
+            image_statistics(img_vtk)
+    return img_vtk
+
+
+def read_DICOM(path_DICOM, cast_type=11, stats=None, cache=None,
+               statistics=False, file_names=None):
+    """
+    Read a serial of DICOM images with SimpleITK,
+    Cast it and return a VTK image (vtkImageData)
+    Note: numpy's array order is opposite with ITK's
+    :param path_DICOM: the PATH of DICOM series
+    :param cast_type:
+    'auto' - Smallest type holding the data losslessly, see `auto_cast`
+    0 - No casting
+    2 - VTK_CHAR
+    3 - VTK_UNSIGNED_CHAR
+    4 - VTK_SHORT
+    5 - VTK_UNSIGNED_SHORT
+    6 - VTK_INT
+    7 - VTK_UNSIGNED_INT
+    8 - VTK_LONG
+    9 - VTK_UNSIGNED_LONG
+    10 - VTK_FLOAT
+    11 - VTK_DOUBLE   * default *
+    :param stats: optional dict, filled with the memory report of the load
+    :param cache: optional volume_cache.VolumeCache
+    :param statistics: index the data as it is loaded, the result is
+    `img_vtk.statistics` (see volume_stats), cached with the volume.
+    The series is then decoded chunk by chunk (see `decode_series`),
+    each chunk indexed as it comes: no other pass over the volume, unless
+    `cast_type` changes the values (not in LOSSLESS_CASTS)
+    :param file_names: the sorted files of the series when already known
+    (see `read_DICOM_header`), not to scan the directory again
+    :return: vtkImageData
+    """
+    rss_before = peak_rss()
+    if file_names is None:
+        file_names = sitk.ImageSeriesReader.GetGDCMSeriesFileNames(path_DICOM)
+    if cache is not None:
+        key = cache.key_for_series(path_DICOM, 'legacy', cast_type,
+                                   file_names=file_names)
+        img_vtk = cache.load(key)
+        if img_vtk is not None:
+            _fill_stats(stats, 'legacy (cached)', img_vtk, rss_before)
+            return _index_statistics(img_vtk, statistics, 'read_DICOM')
+
+    index = None
+    if statistics and cast_type in LOSSLESS_CASTS:
+        with timed('read_DICOM.read'):
+            numpy_data_array, spacing, _, index = decode_series(
+                file_names, cast_type == CAST_AUTO, statistics=True)
+        # The x and z axes are swapped below
+        index = index.transposed()
+    else:
+        # Load DICOM images
+        with timed('read_DICOM.read'):
+            # the entire 3D image is stored
+            img_sitk = read_series(file_names, cast_type == CAST_AUTO)
+        spacing = img_sitk.GetSpacing()
+
+        # Convert SimpleITK image to numpy array
+        with timed('read_DICOM.to_numpy'):
+            numpy_data_array = sitk.GetArrayFromImage(img_sitk)
+
+    # Automatic type: cast once, before the transpose, never to double
+    if cast_type == CAST_AUTO:
+        with timed('read_DICOM.cast'):
+            numpy_data_array = auto_cast(numpy_data_array, stats=stats)
+        with timed('read_DICOM.transpose'):
+            numpy_data_array_t = numpy_data_array.transpose(2, 1, 0).ravel()
+        img_vtk = vtkCommonDataModel.vtkImageData()
+        img_vtk.SetDimensions(numpy_data_array.shape)
+        img_vtk.SetSpacing(spacing[::-1])
+        # The transposed copy is fresh, share it
+        img_vtk.GetPointData().SetScalars(numpy_support.numpy_to_vtk(
+            numpy_data_array_t, deep=False,
+            array_type=numpy_support.get_vtk_array_type(
+                numpy_data_array_t.dtype)))
+        img_vtk.statistics = index
+        _index_statistics(img_vtk, statistics, 'read_DICOM')
+        if cache is not None:
+            cache.store(key, img_vtk)
+        _fill_stats(stats, 'legacy', img_vtk, rss_before)
+        return img_vtk
+
+    # Note the opposite array order!
+    with timed('read_DICOM.transpose'):
+        numpy_data_array_t = numpy_data_array.transpose(2, 1, 0).ravel()
+
+    # Convert numpy array to VTK array (vtkDoubleArray).
+    with timed('read_DICOM.to_vtk'):
+        vtk_data_array = numpy_support.numpy_to_vtk(
+            num_array=numpy_data_array_t,
+            deep=True,
+            array_type=vtkCommonCore.VTK_DOUBLE)
+
+    # Convert vtkArray to vtkImageData
+    img_vtk = vtkCommonDataModel.vtkImageData()
+    img_vtk.SetDimensions(numpy_data_array.shape)
+    img_vtk.SetSpacing(spacing[::-1])  # Note the order should be reversed!
+    img_vtk.GetPointData().SetScalars(vtk_data_array)  # is a vtkImageData
+
+    with timed('read_DICOM.cast'):
+        img_vtk = cast_image(img_vtk, cast_type)
+    img_vtk.statistics = index
+    _index_statistics(img_vtk, statistics, 'read_DICOM')
+    if cache is not None:
+        cache.store(key, img_vtk)
+    _fill_stats(stats, 'legacy', img_vtk, rss_before)
+    return img_vtk
+
+
+def read_DICOM_native(path_DICOM, cast_type=0, stats=None, cache=None,
+                      statistics=False, file_names=None):
+    """
+    Read a serial of DICOM images with SimpleITK and wrap the ITK pixel
+    buffer in a vtkImageData WITHOUT copying it.
+    The scanner's dtype is kept (e.g. int16 for CT), so the volume is held
+    once instead of as a transposed double copy plus a cast.
+    Note: ITK's buffer is already x-fastest, which is exactly VTK's point
+    order, so no transpose is needed: dimensions, spacing and origin are
+    taken from ITK as they are (x, y, z). Unlike `read_DICOM`, the axes
+    are NOT swapped.
+    :param path_DICOM: the PATH of DICOM series
+    :param cast_type: 0 (default) keeps the native type, otherwise
+    see `read_DICOM`. Casting makes a new buffer, unless 'auto' finds
+    the native type is already the smallest.
+    :param stats: optional dict, filled with the memory report of the load
+    :param cache: optional volume_cache.VolumeCache
+    :param statistics: see `read_DICOM`. The slices are then decoded in
+    chunks into one buffer instead of ITK's, as `read_DICOM_parallel`
+    does with one worker.
+    :param file_names: see `read_DICOM`
+    :return: vtkImageData
+    """
+    rss_before = peak_rss()
+    if file_names is None:
+        file_names = sitk.ImageSeriesReader.GetGDCMSeriesFileNames(path_DICOM)
+    if cache is not None:
+        key = cache.key_for_series(path_DICOM, 'native', cast_type,
+                                   file_names=file_names)
+        img_vtk = cache.load(key)
+        if img_vtk is not None:
+            _fill_stats(stats, 'native (cached)', img_vtk, rss_before)
+            return _index_statistics(img_vtk, statistics,
+                                     'read_DICOM_native')
+
+    if statistics and cast_type in LOSSLESS_CASTS:
+        with timed('read_DICOM_native.read'):
+            buffer, spacing, origin, index = decode_series(
+                file_names, cast_type == CAST_AUTO, statistics=True)
+        with timed('read_DICOM_native.to_vtk'):
+            img_vtk = numpy_to_vtk_image(buffer, spacing, origin)
+        with timed('read_DICOM_native.cast'):
+            img_vtk = cast_image(img_vtk, cast_type, stats)
+        img_vtk.statistics = index
+        if cache is not None:
+            cache.store(key, img_vtk)
+        _fill_stats(stats, 'native', img_vtk, rss_before)
+        return img_vtk
+
+    with timed('read_DICOM_native.read'):
+        img_sitk = read_series(file_names, cast_type == CAST_AUTO)
+
+    if cast_type == CAST_AUTO:
+        view = sitk.GetArrayViewFromImage(img_sitk)
+        with timed('read_DICOM_native.cast'):
+            array = auto_cast(view, stats=stats)
+        with timed('read_DICOM_native.to_vtk'):
+            if array is view:
+                img_vtk = sitk_to_vtk(img_sitk)
+            else:
+                img_vtk = numpy_to_vtk_image(array, img_sitk.GetSpacing(),
+                                             img_sitk.GetOrigin())
+    else:
+        with timed('read_DICOM_native.to_vtk'):
+            img_vtk = sitk_to_vtk(img_sitk)
+        with timed('read_DICOM_native.cast'):
+            img_vtk = cast_image(img_vtk, cast_type)
+    _index_statistics(img_vtk, statistics, 'read_DICOM_native')
+    if cache is not None:
+        cache.store(key, img_vtk)
+    _fill_stats(stats, 'native', img_vtk, rss_before)
+    return img_vtk
+
+
+def sitk_to_vtk(img_sitk):
+    """
+    Wrap a 3D SimpleITK image in a vtkImageData sharing its buffer.
+    The returned image keeps `img_sitk` alive.
+    :param img_sitk: SimpleITK.Image with a scalar pixel type
+    :return: vtkImageData
+    """
+    # (z, y, x) view on the ITK buffer, C-contiguous, no copy
+    img_vtk = numpy_to_vtk_image(sitk.GetArrayViewFromImage(img_sitk),
+                                 img_sitk.GetSpacing(), img_sitk.GetOrigin())
+    # A shallow vtkArray only keeps the numpy view. Hold the owner too.
+    img_vtk.GetPointData().GetScalars()._sitk_reference = img_sitk
+    return img_vtk
+
+
+def numpy_to_vtk_image(array, spacing, origin=(0, 0, 0)):
+    """
+    Wrap a C-contiguous (z, y, x) numpy array in a vtkImageData, no copy.
+    :param array: 3D numpy array, x varying fastest like VTK's points
+    :param spacing: (x, y, z) spacing
+    :param origin: (x, y, z) origin
+    :return: vtkImageData
+    """
+    vtk_data_array = numpy_support.numpy_to_vtk(
+        num_array=array.reshape(-1),
+        deep=False,
+        array_type=numpy_support.get_vtk_array_type(array.dtype))
+
+    img_vtk = vtkCommonDataModel.vtkImageData()
+    img_vtk.SetDimensions(array.shape[::-1])
+    img_vtk.SetSpacing(spacing)
+    img_vtk.SetOrigin(origin)
+    img_vtk.GetPointData().SetScalars(vtk_data_array)
+    return img_vtk
+
+
+def _read_header(file_name):
+    header = sitk.ImageFileReader()
+    header.SetFileName(file_name)
+    header.ReadImageInformation()
+    return header
+
+
+def series_header(file_names):
+    """
+    Geometry of a sorted DICOM series from the headers of its first two
+    slices: no pixel is decoded, whatever the size of the series.
+    :param file_names: output of GetGDCMSeriesFileNames
+    :return: dict of `dimensions`, `spacing`, `origin` (x, y, z), `dtype`
+    (numpy, as ITK would decode it) and `bounds`
+    """
+    first = _read_header(file_names[0])
+    nx, ny = first.GetSize()[:2]
+    dims = (nx, ny, len(file_names))
+    origin = first.GetOrigin()
+    spacing = list(first.GetSpacing())
+    if len(file_names) > 1:
+        second = _read_header(file_names[1])
+        spacing[2] = numpy.linalg.norm(
+            numpy.subtract(second.GetOrigin(), origin)) or spacing[2]
+    bounds = []
+    for o, s, n in zip(origin, spacing, dims):
+        bounds.extend([o, o + s * (n - 1)])
+    return {'dimensions': dims,
+            'spacing': tuple(spacing),
+            'origin': origin,
+            'dtype': sitk_dtype(first.GetPixelID()),
+            'bounds': bounds}
+
+
+def read_DICOM_header(path_DICOM):
+    """
+    See `series_header`, with the file names under `file_names`
+    """
+    file_names = sitk.ImageSeriesReader.GetGDCMSeriesFileNames(path_DICOM)
+    header = series_header(file_names)
+    header['file_names'] = file_names
+    return header
+
+
+def series_geometry(file_names):
+    """
+    Geometry of a sorted DICOM series, from its first two headers only
+    :param file_names: output of GetGDCMSeriesFileNames
+    :return: (dimensions, spacing, origin, numpy dtype), in (x, y, z)
+    """
+    header = series_header(file_names)
+    return header['dimensions'], header['spacing'], header['origin'], \
+        header['dtype']
+
+
+def _rescale_varies(reader, count):
+    """
+    Whether the slices read by a sitk.ImageSeriesReader (with its meta
+    data dictionary array) have different rescale slopes or intercepts
+    """
+    for tag in (TAG_RESCALE_SLOPE, TAG_RESCALE_INTERCEPT):
+        values = set(float(reader.GetMetaData(k, tag))
+                     if reader.HasMetaDataKey(k, tag) else None
+                     for k in range(count))
+        if len(values) > 1:
+            return True
+    return False
+
+
+def read_series(file_names, lossless=False):
+    """
+    Read a sorted DICOM series with SimpleITK
+    :param lossless: ITK gives every slice the pixel type of the first
+    one, rounding slices with their own rescale (PET, some MR). If True,
+    such a series is read again as double.
+    :return: SimpleITK.Image
+    """
+    reader = sitk.ImageSeriesReader()
+    reader.SetFileNames(file_names)
+    reader.SetMetaDataDictionaryArrayUpdate(lossless)
+    img_sitk = reader.Execute()
+    if lossless and img_sitk.GetPixelID() != sitk.sitkFloat64 and \
+            _rescale_varies(reader, len(file_names)):
+        reader.SetOutputPixelType(sitk.sitkFloat64)
+        img_sitk = reader.Execute()
+    return img_sitk
+
+
+def decode_slices(file_names, lossless=False):
+    """
+    Decode some consecutive slices of a series to a (z, y, x) array
+    :param lossless: see `read_series`
+    """
+    return sitk.GetArrayFromImage(read_series(file_names, lossless))
+
+
+def decode_series(file_names, lossless=False, statistics=False,
+                  chunk_size=8, executor=None):
+    """
+    Decode a sorted series chunk by chunk into one preallocated (z, y, x)
+    buffer, indexing each chunk as it is written
+    :param lossless: see `read_series`
+    :param statistics: build the statistics index of the decoded values
+    (see volume_stats.StatisticsBuilder) on the way
+    :param chunk_size: number of slices decoded at once
+    :param executor: concurrent.futures executor decoding the chunks in
+    parallel, None to decode them in turn here
+    :return: (buffer, spacing, origin, VolumeStatistics or None)
+    """
+    dims, spacing, origin, dtype = series_geometry(file_names)
+    buffer = numpy.empty(dims[::-1], dtype=dtype)
+    builder = StatisticsBuilder(buffer.shape) if statistics else None
+    starts = range(0, len(file_names), chunk_size)
+    if executor is None:
+        chunks = ((start, decode_slices(file_names[start:start + chunk_size],
+                                        lossless))
+                  for start in starts)
+    else:
+        futures = dict(
+            (executor.submit(decode_slices,
+                             file_names[start:start + chunk_size],
+                             lossless), start)
+            for start in starts)
+        chunks = ((futures[future], future.result())
+                  for future in concurrent.futures.as_completed(futures))
+    for start, chunk in chunks:
+        if lossless and chunk.dtype != buffer.dtype:
+            # Slices with their own rescale came as double
+            buffer = buffer.astype(
+                numpy.result_type(buffer.dtype, chunk.dtype))
+        buffer[start:start + len(chunk)] = chunk
+        if builder is not None:
+            builder.add(start, chunk)
+    return buffer, spacing, origin, \
+        builder.result() if builder is not None else None
+
+
+def read_DICOM_parallel(path_DICOM, workers=None, use_processes=False,
+                        chunk_size=8, cast_type=0, stats=None,
+                        statistics=False, file_names=None):
+    """
+    Read a serial of DICOM images, decoding the slices in parallel.
+    Chunks of consecutive slices are decoded by a pool of workers and
+    written in place into one preallocated (z, y, x) buffer (see
+    `decode_series`), which is then wrapped without copy like
+    `read_DICOM_native`. As there, the axes are ITK's (x, y, z) with the
+    origin of the series: unlike `read_DICOM`, X and Z are NOT swapped.
+    :param path_DICOM: the PATH of DICOM series
+    :param workers: size of the pool, None for the number of CPUs
+    :param use_processes: use a process pool instead of threads.
+    Worth it when the decoder holds the GIL, at the price of a copy
+    of each chunk back to this process.
+    :param chunk_size: number of slices decoded by one task
+    :param cast_type: see `read_DICOM_native`, 'auto' included
+    :param stats: optional dict, filled with the memory report of the load
+    :param statistics: see `read_DICOM`, each chunk is indexed as it
+    arrives
+    :param file_names: see `read_DICOM`
+    :return: vtkImageData
+    """
+    rss_before = peak_rss()
+
+    if file_names is None:
+        file_names = sitk.ImageSeriesReader.GetGDCMSeriesFileNames(path_DICOM)
+    if use_processes:
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    else:
+        executor = concurrent.futures.ThreadPoolExecutor(workers)
+    index_while_decoding = statistics and cast_type in LOSSLESS_CASTS
+    with executor, timed('read_DICOM_parallel.read'):
+        buffer, spacing, origin, index = decode_series(
+            file_names, cast_type == CAST_AUTO, index_while_decoding,
+            chunk_size, executor)
+
+    with timed('read_DICOM_parallel.to_vtk'):
+        img_vtk = numpy_to_vtk_image(buffer, spacing, origin)
+    with timed('read_DICOM_parallel.cast'):
+        img_vtk = cast_image(img_vtk, cast_type, stats)
+    img_vtk.statistics = index
+    _index_statistics(img_vtk, statistics, 'read_DICOM_parallel')
+    _fill_stats(stats, 'parallel', img_vtk, rss_before)
+    return img_vtk
+
+
+def read_meta_image(meta_name, cast_type=5, cache=None, statistics=False):
+    """
+    Usually Meta Image is `unsigned short`
+    No casting leads to wrong reslut!
+    :param cast_type: see `read_DICOM`, 5 by default
+    :param cache: optional volume_cache.VolumeCache
+    :param statistics: see `read_DICOM`. vtkMetaImageReader reads the
+    whole volume at once: the index is built in a pass after it.
+    """
+    if cache is not None:
+        key = cache.key_for_meta_image(meta_name, cast_type)
+        img_vtk = cache.load(key)
+        if img_vtk is not None:
+            return _index_statistics(img_vtk, statistics, 'read_meta_image')
+
+    reader = vtkIOImage.vtkMetaImageReader()
+    reader.SetFileName(meta_name)
+    with timed('read_meta_image.read'):
+        reader.Update()
+
+    # No cast
+    if cast_type == 0:
+        return _index_statistics(reader.GetOutput(), statistics,
+                                 'read_meta_image')
+
+    elif cast_type == CAST_AUTO:
+        output = reader.GetOutput()
+        view = numpy_support.vtk_to_numpy(
+            output.GetPointData().GetScalars()).reshape(
+            output.GetDimensions()[::-1])
+        with timed('read_meta_image.cast'):
+            array = auto_cast(view)
+        if array is view:
+            img_vtk = output
+        else:
+            img_vtk = numpy_to_vtk_image(array, output.GetSpacing(),
+                                         output.GetOrigin())
+        _index_statistics(img_vtk, statistics, 'read_meta_image')
+        if cache is not None:
+            cache.store(key, img_vtk)
+        return img_vtk
+
+    # Cast the image to another data type
+    elif cast_type in CAST_TYPES:
+        cast = vtkImagingCore.vtkImageCast()
+        # cast.SetInputData(img_vtk)
+        cast.SetInputConnection(reader.GetOutputPort())
+        cast.SetOutputScalarType(cast_type)
+        with timed('read_meta_image.cast'):
+            cast.Update()
+        img_vtk = cast.GetOutput()  # The output of `cast` is a vtkImageData
+        _index_statistics(img_vtk, statistics, 'read_meta_image')
+        if cache is not None:
+            cache.store(key, img_vtk)
+        return img_vtk
+
+    # Wrong cast type. Return the no-cast vtkImageData
+    else:
+        sys.stderr.write('Wrong Cast Type! It should be 2, 3, ..., or 11')
+        return reader.GetOutput()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Isosurfaces of a volume, whole or around a point, cached by threshold.
+"""
+
+import collections
+import numpy
+from lazy import vtk_module
+
+vtkCommonDataModel = vtk_module('vtkCommonDataModel')
+vtkFiltersCore = vtk_module('vtkFiltersCore')
+vtkImagingCore = vtk_module('vtkImagingCore')
+vtkRenderingCore = vtk_module('vtkRenderingCore')
+
+
+def _iso_filter():
+    """
+    vtkFlyingEdges3D, multithreaded (vtkSMPTools) since VTK 7.1, marching
+    cubes before
+    """
+    return getattr(vtkFiltersCore, 'vtkFlyingEdges3D',
+                   vtkFiltersCore.vtkMarchingCubes)()
+
+
+def roi_around(image_data, position, radius):
+    """
+    Voxel extent of the box of half side `radius` (world units) around
+    `position`, clipped to the image
+    :return: (i0, i1, j0, j1, k0, k1), empty (i0 > i1, j0 > j1 or
+    k0 > k1) when the box misses the image
+    """
+    spacing = numpy.array(image_data.GetSpacing())
+    origin = numpy.array(image_data.GetOrigin())
+    extent = image_data.GetExtent()
+    low = numpy.floor((numpy.asarray(position) - radius - origin) / spacing)
+    high = numpy.ceil((numpy.asarray(position) + radius - origin) / spacing)
+    roi = []
+    for axis in range(3):
+        roi.append(int(max(low[axis], extent[2 * axis])))
+        roi.append(int(min(high[axis], extent[2 * axis + 1])))
+    return tuple(roi)
+
+
+def _skip_empty(image_data, roi, threshold):
+    """
+    Shrink a voxel extent to the slices the surface can cross, using the
+    statistics index of the image if it has one (see volume_stats)
+    """
+    statistics = getattr(image_data, 'statistics', None)
+    if statistics is None:
+        return roi
+    extent = image_data.GetExtent()
+    roi = list(roi)
+    for axis in range(3):
+        # A slice below the threshold next to one above is crossed too
+        first, stop = statistics.occupied_range(axis, threshold)
+        if first == stop:
+            return None
+        low = extent[2 * axis] + first - 1
+        high = extent[2 * axis] + stop
+        roi[2 * axis] = max(roi[2 * axis], low)
+        roi[2 * axis + 1] = min(roi[2 * axis + 1], high)
+        if roi[2 * axis] > roi[2 * axis + 1]:
+            return None
+    return tuple(roi)
+
+
+class IsosurfaceCache(object):
+    """
+    Meshes keyed by (volume, threshold, region of interest, decimation),
+    least recently used dropped beyond `max_bytes`: going back to a
+    threshold already seen is a dictionary lookup.
+    A volume is identified by its C++ object and modification time, so a
+    modified (or another) image is a miss; its meshes are dropped when it
+    is deleted, before another image can take its address.
+    """
+
+    def __init__(self, max_bytes=512 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.meshes = collections.OrderedDict()  # key -> vtkPolyData
+        self.watched = set()  # images observed for their deletion
+        self.hits = 0
+        self.misses = 0
+
+    def cached_bytes(self):
+        return sum(mesh.GetActualMemorySize() * 1024
+                   for mesh in self.meshes.values())
+
+    def _evict(self):
+        while len(self.meshes) > 1 and self.cached_bytes() > self.max_bytes:
+            self.meshes.popitem(last=False)
+
+    def get(self, image_data, threshold, roi=None, decimation=0.):
+        """
+        Isosurface of `image_data` at `threshold`
+        :param roi: voxel extent (i0, i1, j0, j1, k0, k1), None for all,
+        see `roi_around`
+        :param decimation: fraction of the triangles removed, 0 for none
+        :return: vtkPolyData, shared with the cache: do not modify it
+        """
+        if roi is None:
+            roi = image_data.GetExtent()
+        address = image_data.__this__
+        key = (address, image_data.GetMTime(), float(threshold),
+               tuple(roi), float(decimation))
+        if key in self.meshes:
+            self.hits += 1
+            self.meshes.move_to_end(key)
+            return self.meshes[key]
+        self.misses += 1
+        mesh = self._extract(image_data, threshold, roi, decimation)
+        self.meshes[key] = mesh
+        if address not in self.watched:
+            self.watched.add(address)
+            image_data.AddObserver(
+                'DeleteEvent',
+                lambda obj, event: self._forget(address))
+        self._evict()
+        return mesh
+
+    def _forget(self, address):
+        """
+        Drop the meshes of a deleted image
+        """
+        self.watched.discard(address)
+        for key in [key for key in self.meshes if key[0] == address]:
+            del self.meshes[key]
+
+    def _extract(self, image_data, threshold, roi, decimation):
+        if any(roi[2 * axis] > roi[2 * axis + 1] for axis in range(3)):
+            # Outside of the image, see roi_around
+            return vtkCommonDataModel.vtkPolyData()
+        roi = _skip_empty(image_data, roi, threshold)
+        if roi is None:
+            return vtkCommonDataModel.vtkPolyData()
+
+        voi = vtkImagingCore.vtkExtractVOI()
+        voi.SetInputData(image_data)
+        voi.SetVOI(roi)
+
+        iso = _iso_filter()
+        iso.SetInputConnection(voi.GetOutputPort())
+        iso.SetValue(0, threshold)
+        iso.ComputeNormalsOn()
+        iso.ComputeScalarsOff()
+        output = iso.GetOutputPort()
+
+        if decimation:
+            decimate = vtkFiltersCore.vtkQuadricDecimation()
+            decimate.SetInputConnection(output)
+            decimate.SetTargetReduction(decimation)
+            normals = vtkFiltersCore.vtkPolyDataNormals()
+            normals.SetInputConnection(decimate.GetOutputPort())
+            normals.SplittingOff()
+            output = normals.GetOutputPort()
+
+        algorithm = output.GetProducer()
+        algorithm.Update()
+        mesh = vtkCommonDataModel.vtkPolyData()
+        # Detached from the pipeline, which is dropped with the ROI copy
+        mesh.ShallowCopy(algorithm.GetOutputDataObject(0))
+        return mesh
+
+    def clear(self):
+        self.meshes.clear()
+
+
+class IsosurfaceActor(object):
+    """
+    One actor showing meshes of an IsosurfaceCache, switched by input
+    """
+
+    def __init__(self, cache, _renderer, color=(0.95, 0.9, 0.8),
+                 opacity=1.):
+        self.cache = cache
+        self.mapper = vtkRenderingCore.vtkPolyDataMapper()
+        self.mapper.ScalarVisibilityOff()
+        self.actor = vtkRenderingCore.vtkActor()
+        self.actor.SetMapper(self.mapper)
+        self.actor.GetProperty().SetColor(color)
+        self.actor.GetProperty().SetOpacity(opacity)
+        self.actor.PickableOff()
+        self.actor.VisibilityOff()
+        _renderer.AddActor(self.actor)
+
+    def show(self, image_data, threshold, roi=None, decimation=0.):
+        """
+        :return: the mesh shown, see IsosurfaceCache.get
+        """
+        mesh = self.cache.get(image_data, threshold, roi, decimation)
+        self.mapper.SetInputData(mesh)
+        self.actor.VisibilityOn()
+        return mesh
+
+    def hide(self):
+        self.actor.VisibilityOff()
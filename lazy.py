@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Deferred imports, so importing a module of this package costs no more
+than the standard library: VTK, SimpleITK and NumPy are only imported
+by the first function which needs them.
+
+    numpy = lazy_import('numpy')
+    vtkRenderingCore = vtk_module('vtkRenderingCore')
+
+    def f():
+        return vtkRenderingCore.vtkActor()  # imported here, once
+"""
+
+import types
+import importlib
+
+# Modules registering the object factories a render window needs
+# (OpenGL classes, default interactor style, text rendering)
+RENDERING_MODULES = ('vtkRenderingOpenGL2', 'vtkInteractionStyle',
+                     'vtkRenderingFreeType')
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stands for a module until an attribute of it is asked for, then
+    imports it: the first of `names` whose package is installed
+    """
+
+    def __init__(self, *names):
+        types.ModuleType.__init__(self, names[0])
+        self._names = names
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            error = None
+            for name in self._names:
+                try:
+                    self._module = importlib.import_module(name)
+                    break
+                except ImportError as import_error:
+                    # Only a missing package falls back to the next name,
+                    # not a misspelled module or a broken one in it
+                    if import_error.name != name.split('.')[0]:
+                        raise
+                    error = error or import_error
+            else:
+                raise error
+        return self._module
+
+    def __getattr__(self, attribute):
+        # Only called for what the stand-in itself does not have
+        return getattr(self._load(), attribute)
+
+
+def lazy_import(*names):
+    """
+    :param names: module names, the first one whose top level package is
+    installed is used
+    """
+    return LazyModule(*names)
+
+
+def vtk_module(name):
+    """
+    One VTK module, e.g. 'vtkRenderingCore', instead of the whole `vtk`
+    package. VTK older than 8.2 has no `vtkmodules`: `vtk` it is then,
+    but only then, a wrong module name raises.
+    """
+    return LazyModule('vtkmodules.' + name, 'vtk')
+
+
+def load_rendering():
+    """
+    Import RENDERING_MODULES, before the first render window is made
+    (`import vtk` would import them with everything else)
+    """
+    for name in RENDERING_MODULES:
+        vtk_module(name)._load()
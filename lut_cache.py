@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cached window/level lookup tables shared by the plane widgets.
+"""
+
+import collections
+import numpy
+from lazy import lazy_import, vtk_module
+
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+vtkCommonCore = vtk_module('vtkCommonCore')
+vtkCommonDataModel = vtk_module('vtkCommonDataModel')
+
+# Hounsfield presets: name -> (window, level)
+PRESETS = {'bone': (2000, 300),
+           'lung': (1500, -600),
+           'soft_tissue': (400, 40),
+           'brain': (80, 40)}
+
+# Scalar types small enough for one table entry per value: VTK_CHAR,
+# VTK_UNSIGNED_CHAR, VTK_SHORT, VTK_UNSIGNED_SHORT, VTK_SIGNED_CHAR (the
+# values of vtkType.h, not to import VTK with this module)
+INDEXED_TYPES = {2: numpy.int8,
+                 3: numpy.uint8,
+                 4: numpy.int16,
+                 5: numpy.uint16,
+                 15: numpy.int8}
+
+
+def _gray_ramp(values, window, level):
+    """
+    RGBA (uint8) of a linear gray ramp over [level - w/2, level + w/2]
+    """
+    gray = numpy.clip((values - (level - window / 2.)) / float(window), 0, 1)
+    rgba = numpy.empty((len(values), 4), dtype=numpy.uint8)
+    rgba[:, :3] = numpy.rint(255 * gray)[:, None]
+    rgba[:, 3] = 255
+    return rgba
+
+
+def _scalar_type(widget):
+    """
+    Scalar type of the input of a plane widget, from the pipeline
+    information of its reslice: a streaming source connected to it may
+    not have produced its data yet
+    """
+    reslice = widget.GetReslice()
+    reslice.UpdateInformation()
+    data_object = vtkCommonDataModel.vtkDataObject
+    scalar_info = data_object.GetActiveFieldInformation(
+        reslice.GetInputInformation(),
+        data_object.FIELD_ASSOCIATION_POINTS,
+        vtkCommonDataModel.vtkDataSetAttributes.SCALARS)
+    if scalar_info is not None and \
+            scalar_info.Has(data_object.FIELD_ARRAY_TYPE()):
+        return scalar_info.Get(data_object.FIELD_ARRAY_TYPE())
+    return reslice.GetInput().GetScalarType()
+
+
+class LookupTableCache(object):
+    """
+    Lookup tables keyed by (window, level, scalar type), each built once,
+    the least recently used dropped beyond `max_tables`.
+    For 8 and 16 bit data a table has one entry per possible value (its
+    range is the whole type range): the window is baked in the colors, so
+    a pixel is coloured by a direct index and switching windows is a swap
+    of table, never a rebuild.
+    Other types get a 256 entry gray ramp over the window.
+    The widgets are given the cached table itself: with a user controlled
+    table a widget's window/level only changes its readout, never the
+    table. `follow` makes a window/level drag swap tables too.
+    """
+
+    def __init__(self, max_tables=32):
+        """
+        :param max_tables: tables kept, a 16 bit one is 256 KiB
+        """
+        self.max_tables = max_tables
+        self.tables = collections.OrderedDict()
+        self.window_level = None  # of the tables on the widgets
+        self.observers = []
+
+    def get(self, window, level, scalar_type):
+        """
+        :return: (vtkLookupTable, its table range)
+        """
+        key = (window, level, scalar_type)
+        if key in self.tables:
+            self.tables.move_to_end(key)
+        else:
+            self.tables[key] = self._build(window, level, scalar_type)
+            while len(self.tables) > self.max_tables:
+                self.tables.popitem(last=False)
+        return self.tables[key]
+
+    def _build(self, window, level, scalar_type):
+        lut = vtkCommonCore.vtkLookupTable()
+        if scalar_type in INDEXED_TYPES:
+            info = numpy.iinfo(INDEXED_TYPES[scalar_type])
+            values = numpy.arange(info.min, info.max + 1, dtype=numpy.float64)
+            table_range = (info.min, info.max)
+        else:
+            values = numpy.linspace(level - window / 2., level + window / 2.,
+                                    256)
+            table_range = (values[0], values[-1])
+        lut.SetNumberOfTableValues(len(values))
+        lut.SetTable(numpy_support.numpy_to_vtk(
+            _gray_ramp(values, window, level), deep=True,
+            array_type=vtkCommonCore.VTK_UNSIGNED_CHAR))
+        lut.SetTableRange(table_range)
+        lut.SetRampToLinear()
+        return lut, table_range
+
+    def apply(self, plane_widgets, window, level, scalar_type=None):
+        """
+        Give every widget the cached table of a window
+        :param scalar_type: default that of the first widget's input
+        :return: the vtkLookupTable
+        """
+        if scalar_type is None:
+            scalar_type = _scalar_type(plane_widgets[0])
+        lut, _ = self.get(window, level, scalar_type)
+        for widget in plane_widgets:
+            widget.UserControlledLookupTableOn()
+            widget.SetLookupTable(lut)
+            # The readout (and the start of a drag), not the table
+            widget.SetWindowLevel(window, level, 1)
+        self.window_level = (window, level)
+        return lut
+
+    def apply_preset(self, plane_widgets, name, scalar_type=None):
+        window, level = PRESETS[name]
+        return self.apply(plane_widgets, window, level, scalar_type)
+
+    def follow(self, plane_widgets):
+        """
+        Make a window/level drag on a widget apply the cached table of the
+        new window, rounded to integers to bound the tables built
+        """
+        def on_window_level(obj, event):
+            if self.window_level is not None:
+                self.apply(plane_widgets, round(obj.GetWindow()),
+                           round(obj.GetLevel()))
+
+        for widget in plane_widgets:
+            self.observers.append((widget, widget.AddObserver(
+                'WindowLevelEvent', on_window_level)))
+
+    def unfollow(self):
+        for widget, observer in self.observers:
+            widget.RemoveObserver(observer)
+        self.observers = []
+
+    def clear(self):
+        self.tables.clear()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Batched scene markers: many points drawn by a single actor.
+"""
+
+import numpy
+from lazy import lazy_import, vtk_module
+
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+vtkCommonCore = vtk_module('vtkCommonCore')
+vtkCommonDataModel = vtk_module('vtkCommonDataModel')
+vtkFiltersSources = vtk_module('vtkFiltersSources')
+vtkRenderingCore = vtk_module('vtkRenderingCore')
+vtkRenderingLabel = vtk_module('vtkRenderingLabel')
+
+
+class PointSet(object):
+    """
+    All the picked points in one vtkPolyData, drawn by one vtkGlyph3DMapper.
+    Each point has its own color and radius (point data arrays), so the
+    cost of a frame does not depend on one actor per point any more.
+    Appending and removing only touch the end of the arrays.
+    """
+
+    def __init__(self, resolution=10):
+        """
+        :param resolution: phi and theta resolution of the sphere glyph
+        """
+        self.points = vtkCommonCore.vtkPoints()
+        self.points.SetDataTypeToFloat()
+
+        self.colors = vtkCommonCore.vtkUnsignedCharArray()
+        self.colors.SetName('colors')
+        self.colors.SetNumberOfComponents(3)
+
+        self.radii = vtkCommonCore.vtkFloatArray()
+        self.radii.SetName('radius')
+
+        self.poly_data = vtkCommonDataModel.vtkPolyData()
+        self.poly_data.SetPoints(self.points)
+        self.poly_data.GetPointData().SetScalars(self.colors)
+        self.poly_data.GetPointData().AddArray(self.radii)
+
+        # Unit sphere: the `radius` array is the scale factor
+        sphere = vtkFiltersSources.vtkSphereSource()
+        sphere.SetRadius(1)
+        sphere.SetPhiResolution(resolution)
+        sphere.SetThetaResolution(resolution)
+
+        self.mapper = vtkRenderingCore.vtkGlyph3DMapper()
+        self.mapper.SetInputData(self.poly_data)
+        self.mapper.SetSourceConnection(sphere.GetOutputPort())
+        self.mapper.ScalingOn()
+        self.mapper.SetScaleModeToScaleByMagnitude()
+        self.mapper.SetScaleArray('radius')
+        self.mapper.SetColorModeToDirectScalars()
+        self.mapper.OrientOff()
+
+        self.actor = vtkRenderingCore.vtkActor()
+        self.actor.SetMapper(self.mapper)
+
+        # Bumped whenever points move to other indices (see LandmarkIndex)
+        self.reorders = 0
+
+    def __len__(self):
+        return self.points.GetNumberOfPoints()
+
+    def _modified(self):
+        self.points.Modified()
+        self.colors.Modified()
+        self.radii.Modified()
+        self.poly_data.Modified()
+
+    def append(self, position, color=(0.4, 0.4, 0.4), radius=0.2):
+        """
+        Add a point
+        :param color: RGB in [0, 1]
+        :return: index of the new point
+        """
+        index = self.points.InsertNextPoint(position)
+        self.colors.InsertNextTuple3(*[255 * c for c in color])
+        self.radii.InsertNextValue(radius)
+        self._modified()
+        return index
+
+    def remove(self, index):
+        """
+        Remove a point by moving the last one into its slot.
+        :return: the former index of the point now at `index`,
+        or None when the last point was removed
+        """
+        if not 0 <= index < len(self):
+            raise IndexError('point index out of range')
+        last = len(self) - 1
+        moved = None
+        if index != last:
+            self.points.SetPoint(index, self.points.GetPoint(last))
+            self.colors.SetTuple(index, self.colors.GetTuple(last))
+            self.radii.SetValue(index, self.radii.GetValue(last))
+            moved = last
+        self.points.GetData().RemoveLastTuple()
+        self.colors.RemoveLastTuple()
+        self.radii.RemoveLastTuple()
+        self.reorders += 1
+        self._modified()
+        return moved
+
+    def extend(self, positions, colors=(0.4, 0.4, 0.4), radii=0.2):
+        """
+        Add many points at once, e.g. when reloading a session
+        :param positions: N x 3 array
+        :param colors: N x 3 array or one RGB for all, in [0, 1]
+        :param radii: N array or one radius for all
+        """
+        positions = numpy.asarray(positions,
+                                  dtype=numpy.float32).reshape(-1, 3)
+        count = len(positions)
+        if not count:
+            return
+        colors = numpy.broadcast_to(
+            numpy.asarray(colors, dtype=numpy.float32) * 255, (count, 3))
+        radii = numpy.broadcast_to(
+            numpy.asarray(radii, dtype=numpy.float32), (count,))
+
+        old = len(self)
+        self.points.SetNumberOfPoints(old + count)
+        self.colors.SetNumberOfTuples(old + count)
+        self.radii.SetNumberOfTuples(old + count)
+        # Write in place through NumPy views on the VTK arrays
+        numpy_support.vtk_to_numpy(self.points.GetData())[old:] = positions
+        numpy_support.vtk_to_numpy(self.colors)[old:] = colors
+        numpy_support.vtk_to_numpy(self.radii)[old:] = radii
+        self._modified()
+
+    def clear(self):
+        self.points.Reset()
+        self.colors.Reset()
+        self.radii.Reset()
+        self.reorders += 1
+        self._modified()
+
+    def set_color(self, index, color):
+        self.colors.SetTuple3(index, *[255 * c for c in color])
+        self.colors.Modified()
+
+    def set_radius(self, index, radius):
+        self.radii.SetValue(index, radius)
+        self.radii.Modified()
+
+    def add_to(self, _renderer):
+        _renderer.AddActor(self.actor)
+
+
+class LandmarkIndex(object):
+    """
+    Spatial index over the points of a PointSet, for nearest, k-nearest
+    and radius queries, and for snapping picks to existing landmarks.
+    The points indexed so far are in a vtkStaticPointLocator built on a
+    snapshot of them; the points appended since are few and scanned with
+    NumPy. When they exceed `rebuild_threshold`, or points were removed
+    (indices changed), the locator is rebuilt, which is a C++ bucket sort.
+    """
+
+    def __init__(self, point_set, rebuild_threshold=1024):
+        self.point_set = point_set
+        self.rebuild_threshold = rebuild_threshold
+        self.snapshot = vtkCommonDataModel.vtkPolyData()
+        self.locator = vtkCommonDataModel.vtkStaticPointLocator()
+        self.indexed = 0  # points [0, indexed) are in the locator
+        self.reorders = None
+        self.ids = vtkCommonCore.vtkIdList()
+
+    def _positions(self):
+        return numpy_support.vtk_to_numpy(self.point_set.points.GetData())
+
+    def update(self):
+        """
+        Rebuild the locator if needed. Called by every query.
+        """
+        count = len(self.point_set)
+        if self.reorders == self.point_set.reorders and \
+                count - self.indexed <= self.rebuild_threshold:
+            return
+        self.reorders = self.point_set.reorders
+        if not count:
+            # VTK logs an error building a locator on no points, and the
+            # pending scan covers the next appends
+            self.indexed = 0
+            return
+        points = vtkCommonCore.vtkPoints()
+        points.DeepCopy(self.point_set.points)
+        self.snapshot.SetPoints(points)
+        self.locator.SetDataSet(self.snapshot)
+        self.locator.BuildLocator()
+        self.indexed = count
+
+    def _pending(self, position):
+        """
+        Indices and squared distances of the points not in the locator
+        """
+        pending = self._positions()[self.indexed:]
+        distances = numpy.sum((pending - position) ** 2, axis=1)
+        return numpy.arange(self.indexed, self.indexed + len(pending)), \
+            distances
+
+    def nearest(self, position):
+        """
+        :return: (index, distance) of the nearest point, or (None, None)
+        """
+        self.update()
+        position = numpy.asarray(position, dtype=numpy.float32)
+        best, best_d2 = None, numpy.inf
+        if self.indexed:
+            best = self.locator.FindClosestPoint(position)
+            best_d2 = numpy.sum(
+                (numpy.array(self.snapshot.GetPoint(best)) - position) ** 2)
+        indices, distances = self._pending(position)
+        if len(indices) and distances.min() < best_d2:
+            best = int(indices[distances.argmin()])
+            best_d2 = distances.min()
+        if best is None:
+            return None, None
+        return best, float(numpy.sqrt(best_d2))
+
+    def within(self, position, radius):
+        """
+        :return: indices of the points closer than `radius`
+        """
+        self.update()
+        result = []
+        if self.indexed:
+            self.locator.FindPointsWithinRadius(radius, position, self.ids)
+            result = [self.ids.GetId(n)
+                      for n in range(self.ids.GetNumberOfIds())]
+        indices, distances = self._pending(
+            numpy.asarray(position, dtype=numpy.float32))
+        result.extend(indices[distances <= radius * radius].tolist())
+        return result
+
+    def k_nearest(self, position, k):
+        """
+        :return: indices of the `k` nearest points, nearest first
+        """
+        self.update()
+        position = numpy.asarray(position, dtype=numpy.float32)
+        candidates = []
+        if self.indexed:
+            self.locator.FindClosestNPoints(k, position, self.ids)
+            candidates = [self.ids.GetId(n)
+                          for n in range(self.ids.GetNumberOfIds())]
+        indices, _ = self._pending(position)
+        candidates = numpy.concatenate(
+            [numpy.array(candidates, dtype=int), indices])
+        distances = numpy.sum(
+            (self._positions()[candidates] - position) ** 2, axis=1)
+        return candidates[numpy.argsort(distances)[:k]].tolist()
+
+    def snap(self, position, tolerance):
+        """
+        :return: (position, index) of the nearest landmark closer than
+        `tolerance`, or (`position`, None) if there is none
+        """
+        index, distance = self.nearest(position)
+        if index is None or distance > tolerance:
+            return position, None
+        return self.point_set.points.GetPoint(index), index
+
+
+class LabelSet(object):
+    """
+    All the point labels in one vtkPolyData with a string array, drawn by
+    one vtkLabelPlacementMapper in screen space.
+    Labels are not 3D followers, so nothing re-orients per label when the
+    camera moves; overlapping labels are culled by the placement mapper,
+    which keeps the frame time flat as the number of labels grows.
+    """
+
+    def __init__(self, color=(0.5, 0.5, 0.5), font_size=12):
+        self.points = vtkCommonCore.vtkPoints()
+        self.points.SetDataTypeToFloat()
+
+        self.labels = vtkCommonCore.vtkStringArray()
+        self.labels.SetName('labels')
+
+        # Higher priority labels win when they overlap
+        self.priorities = vtkCommonCore.vtkIntArray()
+        self.priorities.SetName('priority')
+
+        self.poly_data = vtkCommonDataModel.vtkPolyData()
+        self.poly_data.SetPoints(self.points)
+        self.poly_data.GetPointData().AddArray(self.labels)
+        self.poly_data.GetPointData().AddArray(self.priorities)
+
+        self.hierarchy = vtkRenderingLabel.vtkPointSetToLabelHierarchy()
+        self.hierarchy.SetInputData(self.poly_data)
+        self.hierarchy.SetLabelArrayName('labels')
+        self.hierarchy.SetPriorityArrayName('priority')
+        text_property = self.hierarchy.GetTextProperty()
+        text_property.SetColor(color)
+        text_property.SetFontSize(font_size)
+
+        self.mapper = vtkRenderingLabel.vtkLabelPlacementMapper()
+        self.mapper.SetInputConnection(self.hierarchy.GetOutputPort())
+        self.mapper.UseDepthBufferOn()  # hide labels behind the planes
+
+        self.actor = vtkRenderingCore.vtkActor2D()
+        self.actor.SetMapper(self.mapper)
+
+    def __len__(self):
+        return self.points.GetNumberOfPoints()
+
+    def _modified(self):
+        self.points.Modified()
+        self.labels.Modified()
+        self.priorities.Modified()
+        self.poly_data.Modified()
+
+    def append(self, position, text, priority=0):
+        """
+        Add a label anchored at `position`
+        :return: index of the new label
+        """
+        index = self.points.InsertNextPoint(position)
+        self.labels.InsertNextValue(text)
+        self.priorities.InsertNextValue(priority)
+        self._modified()
+        return index
+
+    def remove(self, index):
+        """
+        Remove a label by moving the last one into its slot.
+        :return: see `PointSet.remove`
+        """
+        if not 0 <= index < len(self):
+            raise IndexError('label index out of range')
+        last = len(self) - 1
+        moved = None
+        if index != last:
+            self.points.SetPoint(index, self.points.GetPoint(last))
+            self.labels.SetValue(index, self.labels.GetValue(last))
+            self.priorities.SetValue(index, self.priorities.GetValue(last))
+            moved = last
+        self.points.GetData().RemoveLastTuple()
+        self.labels.SetNumberOfValues(last)
+        self.priorities.RemoveLastTuple()
+        self._modified()
+        return moved
+
+    def set_text(self, index, text):
+        self.labels.SetValue(index, text)
+        self.labels.Modified()
+        self.poly_data.Modified()
+
+    def clear(self):
+        self.points.Reset()
+        self.labels.Reset()
+        self.priorities.Reset()
+        self._modified()
+
+    def add_to(self, _renderer):
+        _renderer.AddViewProp(self.actor)
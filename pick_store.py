@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Persistent log of picks, stored by columns.
+"""
+
+import csv
+import time
+import array
+import numpy
+
+# Column name -> array.array type code
+COLUMNS = [('x', 'd'), ('y', 'd'), ('z', 'd'),
+           ('i', 'i'), ('j', 'i'), ('k', 'i'),
+           ('value', 'd'),
+           ('axis', 'b'),  # plane orientation, -1 if unknown
+           ('study', 'i'),  # index in `studies`
+           ('timestamp', 'd')]
+
+
+class PickStore(object):
+    """
+    Picks as typed columns (array.array), not one Python object per pick:
+    an append is a few machine words, and the columns go to and from disk
+    as whole buffers.
+    """
+
+    def __init__(self):
+        self.columns = dict((name, array.array(code))
+                            for name, code in COLUMNS)
+        self.studies = []  # study names, e.g. DICOM paths or series UIDs
+        self.study_ids = {}
+
+    def __len__(self):
+        return len(self.columns['timestamp'])
+
+    def study_index(self, study):
+        if study not in self.study_ids:
+            self.study_ids[study] = len(self.studies)
+            self.studies.append(study)
+        return self.study_ids[study]
+
+    def append(self, result, study='', timestamp=None):
+        """
+        Record a pick
+        :param result: dict from picking.ImagePlanePicker.pick
+        :param study: name of the picked volume
+        """
+        columns = self.columns
+        x, y, z = result['position']
+        i, j, k = result['index']
+        axis = result.get('axis')
+        columns['x'].append(x)
+        columns['y'].append(y)
+        columns['z'].append(z)
+        columns['i'].append(int(i))
+        columns['j'].append(int(j))
+        columns['k'].append(int(k))
+        columns['value'].append(float(result['value']))
+        columns['axis'].append(-1 if axis is None else axis)
+        columns['study'].append(self.study_index(study))
+        columns['timestamp'].append(time.time() if timestamp is None
+                                    else timestamp)
+
+    def column(self, name):
+        """
+        NumPy copy of a column: a view would keep the array.array from
+        growing (BufferError on the next append) while it is held
+        """
+        if not len(self.columns[name]):
+            return numpy.zeros(0, dtype=self.columns[name].typecode)
+        return numpy.frombuffer(self.columns[name],
+                                dtype=self.columns[name].typecode).copy()
+
+    def positions(self, study=None):
+        """
+        N x 3 world coordinates, of one study or of all
+        """
+        positions = numpy.column_stack([self.column(c) for c in 'xyz'])
+        if study is None:
+            return positions
+        if study not in self.study_ids:
+            return positions[:0]
+        return positions[self.column('study') == self.study_ids[study]]
+
+    def extend(self, other):
+        """
+        Append all the picks of another store
+        """
+        remap = numpy.array([self.study_index(s) for s in other.studies] or
+                            [0], dtype=numpy.int32)
+        for name, code in COLUMNS:
+            values = other.column(name)
+            if name == 'study':
+                values = remap[values]
+            self.columns[name].frombytes(values.astype(code).tobytes())
+
+    def save(self, file_name):
+        """
+        Binary columnar file (NumPy .npz, one array per column), written
+        to `file_name` as it is: numpy.savez would append .npz to a name
+        without it, which `load` would then not find
+        """
+        arrays = dict((name, self.column(name)) for name, _ in COLUMNS)
+        arrays['studies'] = numpy.array(self.studies, dtype=str)
+        with open(file_name, 'wb') as npz_file:
+            numpy.savez(npz_file, **arrays)
+
+    @classmethod
+    def load(cls, file_name):
+        store = cls()
+        with numpy.load(file_name) as arrays:
+            for name, code in COLUMNS:
+                store.columns[name].frombytes(
+                    arrays[name].astype(code).tobytes())
+            for study in arrays['studies']:
+                store.study_index(str(study))
+        return store
+
+    def export_csv(self, file_name):
+        names = [name for name, _ in COLUMNS]
+        with open(file_name, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(names)
+            study = names.index('study')
+            for row in zip(*[self.columns[name] for name in names]):
+                row = list(row)
+                row[study] = self.studies[row[study]]
+                writer.writerow(row)
+
+    @classmethod
+    def import_csv(cls, file_name):
+        store = cls()
+        with open(file_name, newline='') as csv_file:
+            for row in csv.DictReader(csv_file):
+                store.append({'position': (float(row['x']), float(row['y']),
+                                           float(row['z'])),
+                              'index': (int(row['i']), int(row['j']),
+                                        int(row['k'])),
+                              'value': float(row['value']),
+                              'axis': int(row['axis'])},
+                             study=row['study'],
+                             timestamp=float(row['timestamp']))
+        return store
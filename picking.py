@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Analytic picking on axis-aligned image planes.
+"""
+
+import timeit
+import numpy
+from profiling import timed
+from lazy import lazy_import, vtk_module
+
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+
+
+class ImagePlanePicker(object):
+    """
+    Pick on the axis-aligned planes of an image without ray casting props.
+    The view ray is intersected with the plane equations (x = a, y = b or
+    z = c) and the hit is mapped straight to a voxel with the spacing and
+    origin of the image, so the cost does not grow with the props of the
+    scene (bench_suite times it against the vtkCellPicker of the widgets).
+    """
+
+    def __init__(self, image_data, plane_widgets=()):
+        """
+        :param image_data: the vtkImageData shown by the planes
+        :param plane_widgets: vtkImagePlaneWidgets whose planes are picked.
+        Oblique or disabled widgets are ignored.
+        """
+        self.plane_widgets = list(plane_widgets)
+        self.set_image(image_data)
+
+    def set_image(self, image_data):
+        self.spacing = numpy.array(image_data.GetSpacing())
+        self.origin = numpy.array(image_data.GetOrigin())
+        extent = image_data.GetExtent()
+        self.index_min = numpy.array(extent[0::2])
+        self.index_max = numpy.array(extent[1::2])
+        # (z, y, x) view on the scalars, no copy
+        self.values = numpy_support.vtk_to_numpy(
+            image_data.GetPointData().GetScalars()).reshape(
+            (self.index_max - self.index_min + 1)[::-1])
+        self.bounds_min = self.origin + self.spacing * self.index_min
+        self.bounds_max = self.origin + self.spacing * self.index_max
+        # Same as plain floats for `pick` and `probe`
+        self.spacing_list = self.spacing.tolist()
+        self.origin_list = self.origin.tolist()
+        self.index_min_list = self.index_min.tolist()
+        self.index_max_list = self.index_max.tolist()
+        self.pick_min = (self.bounds_min - 0.5 * self.spacing).tolist()
+        self.pick_max = (self.bounds_max + 0.5 * self.spacing).tolist()
+
+    def planes(self):
+        """
+        (axis, position) of the enabled axis-aligned widgets
+        """
+        for widget in self.plane_widgets:
+            axis = widget.GetPlaneOrientation()
+            if widget.GetEnabled() and axis in (0, 1, 2):
+                yield axis, widget.GetSlicePosition()
+
+    def pick(self, x, y, _renderer, planes=None):
+        """
+        Pick at display position (x, y)
+        :param planes: (axis, position) pairs, default from the widgets
+        :return: dict with `position` (world), `index` (i, j, k), `value`
+        and `axis` of the nearest plane hit, or None
+        """
+        with timed('pick'):
+            return self._pick(x, y, _renderer, planes)
+
+    def _pick(self, x, y, _renderer, planes):
+        _renderer.SetDisplayPoint(x, y, 0)
+        _renderer.DisplayToWorld()
+        near_x, near_y, near_z, near_w = _renderer.GetWorldPoint()
+        _renderer.SetDisplayPoint(x, y, 1)
+        _renderer.DisplayToWorld()
+        far_x, far_y, far_z, far_w = _renderer.GetWorldPoint()
+        # Plain floats: NumPy costs more than it saves on 3-vectors
+        near = (near_x / near_w, near_y / near_w, near_z / near_w)
+        direction = (far_x / far_w - near[0], far_y / far_w - near[1],
+                     far_z / far_w - near[2])
+
+        best = None
+        for axis, position in (self.planes() if planes is None else planes):
+            if direction[axis] == 0:
+                continue  # ray parallel to the plane
+            t = (position - near[axis]) / direction[axis]
+            if t < 0 or (best is not None and t >= best[0]):
+                continue
+            hit = [near[n] + t * direction[n] for n in range(3)]
+            hit[axis] = position
+            # Half a voxel of tolerance, as the texture covers it
+            if all(low <= value <= high for low, value, high in
+                   zip(self.pick_min, hit, self.pick_max)):
+                best = (t, axis, hit)
+
+        if best is None:
+            return None
+        _, axis, hit = best
+        return self.probe(hit, axis)
+
+    def probe(self, position, axis=None):
+        """
+        Voxel nearest to a world position. A position outside the image
+        gives the nearest voxel on its border, never None.
+        :return: see `pick`
+        """
+        index = tuple(
+            min(max(int(round((value - origin) / spacing)), low), high)
+            for value, origin, spacing, low, high in
+            zip(position, self.origin_list, self.spacing_list,
+                self.index_min_list, self.index_max_list))
+        return {'position': tuple(position),
+                'index': index,
+                'value': self.values[index[2] - self.index_min_list[2],
+                                     index[1] - self.index_min_list[1],
+                                     index[0] - self.index_min_list[0]],
+                'axis': axis}
+
+
+def pick_text(result):
+    """
+    Same text as the widgets display with their default discrete cursor:
+    voxel index and value
+    """
+    if result is None:
+        return 'Off Image'
+    return '( %g, %g, %g ): %g' % (result['index'] + (result['value'],))
+
+
+def _voxel_key(result):
+    return None if result is None else (result['index'], result['axis'])
+
+
+class ThrottledPicker(object):
+    """
+    Coalesce the mouse move events of an interactor into picks.
+    At most one pick runs per `interval`: events arriving in between only
+    replace the pending position (the stale ones are dropped) and a one
+    shot timer picks the latest one when the interval has elapsed.
+    `on_change` is called, and the window rendered, only when the picked
+    voxel differs from the previous pick.
+    """
+
+    def __init__(self, interactor, pick, on_change, interval=1 / 60.,
+                 key=_voxel_key):
+        """
+        :param interactor: vtkRenderWindowInteractor
+        :param pick: function (x, y) -> result, e.g. a bound
+        ImagePlanePicker.pick with the renderer fixed
+        :param on_change: function (result), updates the scene
+        :param interval: minimum seconds between two picks
+        :param key: function (result) -> what has to change to re-render
+        """
+        self.interactor = interactor
+        self.pick = pick
+        self.on_change = on_change
+        self.interval = interval
+        self.key = key
+
+        self.pending = None  # latest position not picked yet
+        self.timer_id = None
+        self.last_pick_time = -interval
+        self.last_key = None
+        self.counters = {'events': 0, 'dropped': 0, 'picks': 0,
+                         'renders': 0, 'renders_skipped': 0}
+
+        self.observers = [
+            interactor.AddObserver('MouseMoveEvent', self.on_mouse_move),
+            interactor.AddObserver('TimerEvent', self.on_timer)]
+
+    def remove(self):
+        for observer in self.observers:
+            self.interactor.RemoveObserver(observer)
+        if self.timer_id is not None:
+            self.interactor.DestroyTimer(self.timer_id)
+            self.timer_id = None
+
+    def on_mouse_move(self, obj, event):
+        self.counters['events'] += 1
+        if self.pending is not None:
+            self.counters['dropped'] += 1
+        self.pending = obj.GetEventPosition()
+
+        wait = self.last_pick_time + self.interval - timeit.default_timer()
+        if wait <= 0:
+            self.flush()
+        elif self.timer_id is None:
+            self.timer_id = obj.CreateOneShotTimer(
+                max(1, int(1000 * wait)))
+
+    def on_timer(self, obj, event):
+        if self.timer_id is None or \
+                obj.GetTimerEventId() != self.timer_id:
+            return
+        self.timer_id = None
+        self.flush()
+
+    def flush(self):
+        """
+        Pick the pending position now, if any
+        """
+        if self.pending is None:
+            return
+        x, y = self.pending
+        self.pending = None
+        self.last_pick_time = timeit.default_timer()
+        result = self.pick(x, y)
+        self.counters['picks'] += 1
+
+        key = self.key(result)
+        if key == self.last_key:
+            self.counters['renders_skipped'] += 1
+            return
+        self.last_key = key
+        self.on_change(result)
+        self.interactor.GetRenderWindow().Render()
+        self.counters['renders'] += 1
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Headless batch picking: extract slices and probe points of many series,
+without any window.
+
+$ python picking_cli.py SERIES [SERIES ...] --slices z:mid x:120 \\
+      --points points.csv --output results --processes 8
+
+Slices are given as AXIS:INDEX, AXIS being x, y or z like the plane
+widgets, INDEX a slice index or `mid`. Points are a CSV (x, y, z per line,
+an optional header) or a .npy N x 3 array of world coordinates.
+For each series, OUTPUT/NNN_NAME/ receives one .npy per slice and a
+probe.csv, and OUTPUT/summary.json the throughput of the run.
+"""
+
+import os
+import re
+import sys
+import json
+import timeit
+import argparse
+import concurrent.futures
+import numpy
+from vtk.util import numpy_support
+from image_io import read_DICOM, read_DICOM_native, read_DICOM_parallel, \
+    read_meta_image
+from probe import VolumeProbe, INTERPOLATIONS
+
+LOADERS = {'legacy': read_DICOM,
+           'native': read_DICOM_native,
+           'parallel': read_DICOM_parallel}
+
+
+def load(path, loader):
+    """
+    A DICOM directory with `loader`, or a Meta Image file
+    """
+    if os.path.isfile(path) and path.lower().endswith(('.mhd', '.mha')):
+        return read_meta_image(path)
+    return LOADERS[loader](path)
+
+
+def parse_slice(text):
+    match = re.match(r'^([xyz]):(\d+|mid)$', text)
+    if not match:
+        raise argparse.ArgumentTypeError(
+            'Slice should be AXIS:INDEX, e.g. z:42 or x:mid, not %r' % text)
+    axis = 'xyz'.index(match.group(1))
+    index = match.group(2)
+    return axis, None if index == 'mid' else int(index)
+
+
+def read_points(file_name):
+    if file_name.endswith('.npy'):
+        return numpy.load(file_name).reshape(-1, 3)
+    with open(file_name) as points_file:
+        first = points_file.readline()
+    skip = 0 if re.match(r'^\s*[-+0-9.]', first) else 1
+    return numpy.loadtxt(file_name, delimiter=',', skiprows=skip,
+                         ndmin=2)[:, :3]
+
+
+def extract_slice(volume, axis, index):
+    """
+    Slice `index` of a (z, y, x) volume normal to VTK axis `axis`,
+    as the plane widget of that orientation shows it
+    """
+    return numpy.ascontiguousarray(
+        numpy.take(volume, index, axis=2 - axis))
+
+
+def process_series(number, path, args):
+    """
+    Load one series, write its slices and probed values
+    :return: dict of timings and counts
+    """
+    start = timeit.default_timer()
+    img_vtk = load(path, args.loader)
+    loaded = timeit.default_timer()
+
+    base_name = os.path.basename(os.path.normpath(path))
+    name = '%03d_%s' % (number, re.sub(r'[^\w.-]+', '_', base_name))
+    directory = os.path.join(args.output, name)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    dims = img_vtk.GetDimensions()
+    volume = numpy_support.vtk_to_numpy(
+        img_vtk.GetPointData().GetScalars()).reshape(dims[::-1])
+    slices = 0
+    for axis, index in args.slices:
+        if index is None:
+            index = dims[axis] // 2
+        if not 0 <= index < dims[axis]:
+            sys.stderr.write('%s: slice %s:%d out of 0..%d\n' % (
+                path, 'xyz'[axis], index, dims[axis] - 1))
+            continue
+        numpy.save(os.path.join(directory, '%s%04d.npy' % ('xyz'[axis],
+                                                          index)),
+                   extract_slice(volume, axis, index))
+        slices += 1
+    sliced = timeit.default_timer()
+
+    points = 0
+    if args.points_array is not None:
+        values, indices = VolumeProbe(img_vtk).probe(
+            args.points_array, args.interpolation, workers=args.threads)
+        numpy.savetxt(os.path.join(directory, 'probe.csv'),
+                      numpy.column_stack([args.points_array, indices, values]),
+                      delimiter=',', header='x,y,z,i,j,k,value',
+                      comments='',
+                      fmt=['%.17g'] * 3 + ['%d'] * 3 + ['%.17g'])
+        points = len(values)
+    probed = timeit.default_timer()
+
+    return {'path': path,
+            'output': directory,
+            'voxels': int(numpy.prod(dims)),
+            'slices': slices,
+            'points': points,
+            'load_seconds': loaded - start,
+            'slice_seconds': sliced - loaded,
+            'probe_seconds': probed - sliced}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n\n')[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='\n\n'.join(__doc__.strip().split('\n\n')[1:]))
+    parser.add_argument('series', nargs='+',
+                        help='DICOM directories or Meta Image files')
+    parser.add_argument('--slices', type=parse_slice, nargs='*', default=[])
+    parser.add_argument('--points', help='CSV or .npy of world points')
+    parser.add_argument('--interpolation', default='linear',
+                        choices=INTERPOLATIONS)
+    parser.add_argument('--loader', default='native', choices=sorted(LOADERS))
+    parser.add_argument('--output', default='picking_output')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='series processed at once, default all CPUs')
+    parser.add_argument('--threads', type=int, default=1,
+                        help='probing threads per series')
+    args = parser.parse_args(argv)
+    args.points_array = read_points(args.points) if args.points else None
+
+    start = timeit.default_timer()
+    results = []
+    failures = 0
+    with concurrent.futures.ProcessPoolExecutor(args.processes) as executor:
+        futures = dict((executor.submit(process_series, number, path, args),
+                        path) for number, path in enumerate(args.series))
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                failures += 1
+                sys.stderr.write('%s: %s\n' % (futures[future], error))
+                continue
+            results.append(result)
+            print('%(path)s: load %(load_seconds).2fs, %(slices)d slices '
+                  '%(slice_seconds).3fs, %(points)d points '
+                  '%(probe_seconds).3fs' % result)
+    elapsed = timeit.default_timer() - start
+
+    summary = {'series': len(results),
+               'failures': failures,
+               'seconds': elapsed,
+               'series_per_second': len(results) / elapsed,
+               'voxels_per_second':
+                   sum(r['voxels'] for r in results) / elapsed,
+               'points_per_second':
+                   sum(r['points'] for r in results) / elapsed,
+               'results': sorted(results, key=lambda r: r['output'])}
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    with open(os.path.join(args.output, 'summary.json'), 'w') as json_file:
+        json.dump(summary, json_file, indent=2)
+    print('%d series in %.2fs (%.2f series/s), %d failed' % (
+        len(results), elapsed, summary['series_per_second'], failures))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Hot path instrumentation: timings of load stages, picks and frames,
+gathered in histograms, dumped as JSON or shown on screen.
+
+    import profiling
+    profiling.profiler.enabled = True
+    with profiling.timed('my_stage'):
+        ...
+    profiling.profiler.dump_json('profile.json')
+"""
+
+import json
+import bisect
+import timeit
+import contextlib
+from lazy import vtk_module
+
+vtkRenderingCore = vtk_module('vtkRenderingCore')
+
+# Histogram bin edges in seconds, log spaced from 10 us to 100 s, 20 bins
+# per decade: a percentile read from the bins is within 6 %
+BIN_EDGES = [10 ** (e / 20.) for e in range(-100, 41)]
+
+
+class Histogram(object):
+    """
+    Counts of one measure per bin of BIN_EDGES, with the count, total, min
+    and max: fixed size and O(1) to add to, however long the session
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BIN_EDGES) + 1)
+        self.count = 0
+        self.total = 0.
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_right(BIN_EDGES, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """
+        Geometric middle of the bin holding the q-th percentile, within
+        [min, max]
+        """
+        rank = q / 100. * (self.count - 1)
+        cumulative = 0
+        for edge, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative > rank:
+                break
+        low = BIN_EDGES[edge - 1] if edge else self.min
+        high = BIN_EDGES[edge] if edge < len(BIN_EDGES) else self.max
+        return min(max((low * high) ** 0.5, self.min), self.max)
+
+    def summary(self):
+        """
+        :return: dict of count, total, min, mean, max, percentiles and
+        counts per bin of BIN_EDGES (the first bin is everything below,
+        the last bin everything above)
+        """
+        if not self.count:
+            return {'count': 0}
+        return {'count': self.count,
+                'total': self.total,
+                'min': self.min,
+                'mean': self.total / self.count,
+                'p50': self.percentile(50),
+                'p95': self.percentile(95),
+                'p99': self.percentile(99),
+                'max': self.max,
+                'bin_edges': BIN_EDGES,
+                'bin_counts': list(self.counts)}
+
+
+class _Timer(object):
+    """
+    Records the duration of a `with` block
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = timeit.default_timer()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.name, timeit.default_timer() - self.start)
+        return False
+
+
+# What `timed` returns when disabled, shared: nothing is built per call
+_NOT_TIMED = contextlib.nullcontext()
+
+
+class Profiler(object):
+    """
+    Named histograms of durations.
+    Disabled, recording costs one attribute test.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.render_start = None
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        if name not in self.histograms:
+            self.histograms[name] = Histogram()
+        self.histograms[name].add(seconds)
+
+    def timed(self, name):
+        """
+        Context manager recording the duration of its block as `name`
+        """
+        if not self.enabled:
+            return _NOT_TIMED
+        return _Timer(self, name)
+
+    def clear(self):
+        self.histograms = {}
+
+    def summary(self):
+        return dict((name, histogram.summary())
+                    for name, histogram in self.histograms.items())
+
+    def dump_json(self, file_name):
+        with open(file_name, 'w') as json_file:
+            json.dump(self.summary(), json_file, indent=2, sort_keys=True)
+
+    def text(self):
+        """
+        One line per measure, in milliseconds
+        """
+        lines = []
+        for name, stats in sorted(self.summary().items()):
+            if stats['count']:
+                lines.append('%-24s n=%-6d mean %8.2f  p95 %8.2f ms' % (
+                    name, stats['count'], 1e3 * stats['mean'],
+                    1e3 * stats['p95']))
+        return '\n'.join(lines)
+
+    def watch_render_window(self, render_window, name='render'):
+        """
+        Record the time of every frame, from StartEvent to EndEvent
+        """
+        def on_start(obj, event):
+            self.render_start = timeit.default_timer()
+
+        def on_end(obj, event):
+            if self.render_start is not None:
+                self.record(name, timeit.default_timer() - self.render_start)
+                self.render_start = None
+
+        render_window.AddObserver('StartEvent', on_start)
+        render_window.AddObserver('EndEvent', on_end)
+
+    def add_overlay(self, _renderer, render_window, refresh=0.5):
+        """
+        Show the measures in the upper left corner, refreshed by the first
+        frame after every `refresh` seconds (with the figures up to the
+        previous frame), not to spend the frame time measured on the text
+        """
+        overlay = vtkRenderingCore.vtkTextActor()
+        overlay.GetTextProperty().SetFontFamilyToCourier()
+        overlay.GetTextProperty().SetFontSize(12)
+        overlay.GetTextProperty().SetVerticalJustificationToTop()
+        overlay.GetPositionCoordinate().SetCoordinateSystemToNormalizedViewport()
+        overlay.SetPosition(0.01, 0.99)
+        _renderer.AddViewProp(overlay)
+        last_refresh = [-refresh]
+
+        def on_start(obj, event):
+            now = timeit.default_timer()
+            if now - last_refresh[0] >= refresh:
+                last_refresh[0] = now
+                overlay.SetInput(self.text())
+
+        render_window.AddObserver('StartEvent', on_start)
+        return overlay
+
+
+# Shared by the loaders and the pickers
+profiler = Profiler()
+timed = profiler.timed
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Multi-resolution image pyramid, for interactive slicing of huge volumes.
+"""
+
+import threading
+import numpy
+from image_io import numpy_to_vtk_image
+from lazy import lazy_import, vtk_module
+
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+
+
+def _half(array):
+    """
+    Mean of the 2x2x2 blocks of a (z, y, x) array (odd edges dropped),
+    of the same type. Floats are summed in their own precision, integers
+    in double and rounded.
+    """
+    nz, ny, nx = [max(1, n // 2) * 2 if n > 1 else 1 for n in array.shape]
+    total = numpy.zeros([max(1, n // 2) for n in (nz, ny, nx)],
+                        dtype=array.dtype if array.dtype.kind == 'f'
+                        else numpy.float64)
+    count = 0
+    for dz in range(min(2, nz)):
+        for dy in range(min(2, ny)):
+            for dx in range(min(2, nx)):
+                total += array[dz:nz:2, dy:ny:2, dx:nx:2]
+                count += 1
+    total /= count
+    if array.dtype.kind in 'iu':
+        numpy.rint(total, out=total)
+    return total.astype(array.dtype)
+
+
+class ImagePyramid(object):
+    """
+    Coarser copies of a vtkImageData, each half the previous resolution.
+    Levels are computed on demand, or all in a background thread with
+    `build_async`; the work is NumPy only (no VTK) so it is thread safe,
+    and the vtkImageData of a level is only made when it is asked for.
+    """
+
+    def __init__(self, image_data, levels=3):
+        """
+        :param image_data: the full resolution vtkImageData, level 0
+        :param levels: number of coarser levels
+        """
+        self.image_data = image_data
+        self.levels = levels
+        self.spacing = numpy.array(image_data.GetSpacing())
+        self.origin = numpy.array(image_data.GetOrigin()) + \
+            self.spacing * numpy.array(image_data.GetExtent()[0::2])
+        self.arrays = [numpy_support.vtk_to_numpy(
+            image_data.GetPointData().GetScalars()).reshape(
+            image_data.GetDimensions()[::-1])]
+        self.images = {0: image_data}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def _build(self, level):
+        with self.lock:
+            while len(self.arrays) <= level:
+                self.arrays.append(_half(self.arrays[-1]))
+
+    def build_async(self):
+        """
+        Compute every level in a background thread
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._build,
+                                           args=(self.levels,))
+            self.thread.daemon = True
+            self.thread.start()
+        return self.thread
+
+    def is_ready(self, level):
+        return len(self.arrays) > level
+
+    def level(self, level, wait=True):
+        """
+        vtkImageData of a level, cell-centred on the blocks it averages
+        :param wait: if False, return None when the level is not built yet
+        """
+        level = min(level, self.levels)
+        if level not in self.images:
+            if not self.is_ready(level):
+                if not wait:
+                    return None
+                self._build(level)
+            factor = 2 ** level
+            self.images[level] = numpy_to_vtk_image(
+                self.arrays[level], self.spacing * factor,
+                self.origin + self.spacing * (factor - 1) / 2.)
+        return self.images[level]
+
+    def ready_level(self, level):
+        """
+        The coarsest level available now, no coarser than `level` (0 when
+        none is built yet), so an interaction never waits for the
+        background build
+        """
+        for candidate in range(min(level, self.levels), 0, -1):
+            if self.is_ready(candidate):
+                return candidate
+        return 0
+
+
+class PyramidInteraction(object):
+    """
+    While a plane widget is dragged it reslices a coarse level of the
+    pyramid at that level's resolution; when the drag ends it goes back to
+    the full resolution image.
+    The widget keeps its own plane geometry and input: only the input and
+    output grid of its vtkImageReslice are swapped.
+    """
+
+    def __init__(self, pyramid, plane_widgets, level=2):
+        self.pyramid = pyramid
+        self.level = level
+        self.observers = []
+        for widget in plane_widgets:
+            self.observers.append((widget, widget.AddObserver(
+                'StartInteractionEvent', self.on_start)))
+            self.observers.append((widget, widget.AddObserver(
+                'InteractionEvent', self.on_interaction)))
+            self.observers.append((widget, widget.AddObserver(
+                'EndInteractionEvent', self.on_end)))
+
+    def remove(self):
+        for widget, observer in self.observers:
+            widget.RemoveObserver(observer)
+
+    def _full_grid(self, widget):
+        """
+        Output (spacing, extent) of the reslice of a plane at level 0, as
+        the widget computes it: the plane spanned by a power of two of
+        pixels, about the size of the voxels along its axes
+        """
+        origin = numpy.array(widget.GetOrigin())
+        spacing = []
+        extent = []
+        for point in (widget.GetPoint1(), widget.GetPoint2()):
+            axis = numpy.array(point) - origin
+            size = numpy.linalg.norm(axis)
+            if size == 0:
+                spacing.append(1.)
+                extent.append(1)
+                continue
+            voxel = numpy.abs(axis / size).dot(self.pyramid.spacing)
+            pixels = 1
+            while pixels < size / voxel:
+                pixels <<= 1
+            spacing.append(size / pixels)
+            extent.append(pixels)
+        return spacing, extent
+
+    def _coarsen(self, widget):
+        level = self.pyramid.ready_level(self.level)
+        if level == 0:
+            return
+        reslice = widget.GetReslice()
+        reslice.SetInputData(self.pyramid.level(level))
+        # From the level 0 grid, whatever the widget last sized it from
+        factor = 2 ** level
+        (spacing_x, spacing_y), (extent_x, extent_y) = \
+            self._full_grid(widget)
+        extent_x = max(1, extent_x // factor)
+        extent_y = max(1, extent_y // factor)
+        spacing_x *= factor
+        spacing_y *= factor
+        reslice.SetOutputSpacing(spacing_x, spacing_y, 1)
+        reslice.SetOutputOrigin(0.5 * spacing_x, 0.5 * spacing_y, 0)
+        reslice.SetOutputExtent(0, extent_x - 1, 0, extent_y - 1, 0, 0)
+
+    def on_start(self, obj, event):
+        self._coarsen(obj)
+
+    def on_interaction(self, obj, event):
+        # Moving the plane made the widget reset the reslice output grid,
+        # from the coarse input
+        self._coarsen(obj)
+
+    def on_end(self, obj, event):
+        obj.GetReslice().SetInputData(self.pyramid.image_data)
+        # Resizes the reslice output grid for level 0
+        obj.UpdatePlacement()
+        obj.GetInteractor().GetRenderWindow().Render()
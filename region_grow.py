@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Seeded region growing from picked voxels, into a 1 bit per voxel mask,
+and its overlay on the image plane widgets.
+"""
+
+import concurrent.futures
+import numpy
+from lazy import lazy_import, vtk_module
+
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+vtkCommonCore = vtk_module('vtkCommonCore')
+vtkCommonDataModel = vtk_module('vtkCommonDataModel')
+vtkRenderingCore = vtk_module('vtkRenderingCore')
+
+
+def _bounding_box(mask):
+    """
+    Slices of the smallest box holding the True voxels of a 3D mask
+    """
+    box = []
+    for axis in range(3):
+        other = tuple(a for a in range(3) if a != axis)
+        indices = numpy.flatnonzero(mask.any(axis=other))
+        box.append(slice(indices[0], indices[-1] + 1))
+    return tuple(box)
+
+
+def _dilate(mask):
+    """
+    6-connected dilation of a 3D mask, without the wrap of numpy.roll
+    """
+    grown = mask.copy()
+    grown[1:] |= mask[:-1]
+    grown[:-1] |= mask[1:]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    grown[:, :, 1:] |= mask[:, :, :-1]
+    grown[:, :, :-1] |= mask[:, :, 1:]
+    return grown
+
+
+class RegionGrower(object):
+    """
+    Connected threshold region growing (6-connectivity) over a
+    vtkImageData, the region being kept as a bitmask packed along x
+    (numpy.packbits), an eighth of a byte per voxel.
+    The volume is split in slabs along z, grown in parallel by a thread
+    pool (NumPy releases the GIL); voxels reaching the border of a slab
+    seed its neighbour in the next round, until no slab grows.
+    Growing is incremental: the mask is a fixed point of the growth, so
+    a new seed only grows from itself, layer by layer, on the bounding
+    box of the last layer.
+    """
+
+    def __init__(self, image_data, lower=None, upper=None, workers=None,
+                 slab_size=32):
+        """
+        :param image_data: the vtkImageData to segment
+        :param lower, upper: range of the region, see `confidence_range`
+        to get one from the seeds
+        :param workers: threads, None for the number of CPUs
+        :param slab_size: slices per slab
+        """
+        self.image_data = image_data
+        self.spacing = numpy.array(image_data.GetSpacing())
+        extent = image_data.GetExtent()
+        self.origin = numpy.array(image_data.GetOrigin()) + \
+            self.spacing * numpy.array(extent[0::2])
+        self.shape = tuple(image_data.GetDimensions()[::-1])  # (z, y, x)
+        self.values = numpy_support.vtk_to_numpy(
+            image_data.GetPointData().GetScalars()).reshape(self.shape)
+        self.workers = workers
+        self.slab_size = slab_size
+        self.lower = lower
+        self.upper = upper
+        self.mask = numpy.zeros((self.shape[0], self.shape[1],
+                                 (self.shape[2] + 7) // 8),
+                                dtype=numpy.uint8)
+        self.count = 0
+
+    def reset(self):
+        self.mask[:] = 0
+        self.count = 0
+
+    def set_threshold(self, lower, upper):
+        """
+        Grow within [lower, upper] from now on, the region is cleared
+        """
+        self.lower = lower
+        self.upper = upper
+        self.reset()
+
+    def confidence_range(self, indices, radius=2, multiplier=2.5):
+        """
+        Confidence connected: set the threshold to mean +/- `multiplier`
+        standard deviations of the neighbourhoods of the seeds
+        :param indices: N x 3 (i, j, k) voxel indices
+        :return: (lower, upper)
+        """
+        samples = []
+        for i, j, k in numpy.asarray(indices).reshape(-1, 3):
+            box = tuple(slice(max(c - radius, 0), c + radius + 1)
+                        for c in (k, j, i))
+            samples.append(self.values[box].ravel())
+        samples = numpy.concatenate(samples).astype(numpy.float64)
+        mean, std = samples.mean(), samples.std()
+        self.set_threshold(mean - multiplier * std, mean + multiplier * std)
+        return self.lower, self.upper
+
+    def index_of(self, position):
+        """
+        Nearest (i, j, k) voxel of a world position, None outside
+        """
+        index = numpy.rint((numpy.asarray(position) - self.origin) /
+                           self.spacing).astype(numpy.int64)
+        if numpy.any(index < 0) or numpy.any(index >= self.shape[::-1]):
+            return None
+        return index
+
+    def _in_range(self, values):
+        return (values >= self.lower) & (values <= self.upper)
+
+    def _grow_slab(self, start, stop, seeds):
+        """
+        Grow one slab from its seeds until it stops
+        :param seeds: N x 3 (k, j, i), k absolute
+        :return: (voxels added, N x 3 seeds for the neighbour slabs)
+        """
+        nx = self.shape[2]
+        values = self.values[start:stop]
+        mask = numpy.unpackbits(self.mask[start:stop], axis=2,
+                                count=nx).view(bool)
+        first, last = mask[0].copy(), mask[-1].copy()
+
+        k, j, i = seeds[:, 0] - start, seeds[:, 1], seeds[:, 2]
+        keep = self._in_range(values[k, j, i]) & ~mask[k, j, i]
+        k, j, i = k[keep], j[keep], i[keep]
+        if not len(k):
+            return 0, numpy.zeros((0, 3), dtype=numpy.int64)
+        mask[k, j, i] = True
+        added = len(k)
+
+        # The last layer, on its bounding box at `corner`
+        corner = numpy.array([k.min(), j.min(), i.min()])
+        layer = numpy.zeros(numpy.array([k.max(), j.max(), i.max()]) -
+                            corner + 1, dtype=bool)
+        layer[k - corner[0], j - corner[1], i - corner[2]] = True
+        while True:
+            low = numpy.maximum(corner - 1, 0)
+            high = numpy.minimum(corner + layer.shape + 1, mask.shape)
+            box = tuple(slice(l, h) for l, h in zip(low, high))
+            around = numpy.zeros(high - low, dtype=bool)
+            offset = corner - low
+            around[tuple(slice(o, o + n)
+                         for o, n in zip(offset, layer.shape))] = layer
+            new = _dilate(around) & ~mask[box] & self._in_range(values[box])
+            if not new.any():
+                break
+            mask[box] |= new
+            added += int(new.sum())
+            crop = _bounding_box(new)
+            layer = new[crop]
+            corner = low + numpy.array([c.start for c in crop])
+
+        self.mask[start:stop] = numpy.packbits(mask, axis=2)
+        borders = []
+        if start > 0:
+            j, i = numpy.nonzero(mask[0] & ~first)
+            borders.append(numpy.column_stack(
+                [numpy.full(len(j), start - 1), j, i]))
+        if stop < self.shape[0]:
+            j, i = numpy.nonzero(mask[-1] & ~last)
+            borders.append(numpy.column_stack(
+                [numpy.full(len(j), stop), j, i]))
+        if borders:
+            return added, numpy.concatenate(borders).astype(numpy.int64)
+        return added, numpy.zeros((0, 3), dtype=numpy.int64)
+
+    def add_seeds(self, indices):
+        """
+        Grow the region from more seeds
+        :param indices: N x 3 (i, j, k) voxel indices
+        :return: number of voxels added
+        """
+        if self.lower is None or self.upper is None:
+            raise ValueError('No threshold, see set_threshold or '
+                             'confidence_range')
+        seeds = numpy.asarray(indices, dtype=numpy.int64).reshape(-1, 3)
+        seeds = numpy.unique(seeds[:, ::-1], axis=0)  # (k, j, i)
+        added = 0
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            while len(seeds):
+                slabs = seeds[:, 0] // self.slab_size
+                jobs = []
+                for slab in numpy.unique(slabs):
+                    start = slab * self.slab_size
+                    stop = min(start + self.slab_size, self.shape[0])
+                    jobs.append(executor.submit(self._grow_slab, start, stop,
+                                                seeds[slabs == slab]))
+                results = [job.result() for job in jobs]
+                added += sum(result[0] for result in results)
+                seeds = numpy.concatenate([result[1] for result in results])
+                seeds = numpy.unique(seeds, axis=0)
+        self.count += added
+        return added
+
+    def add_point(self, position):
+        """
+        Grow from the voxel at a world position
+        :return: number of voxels added
+        """
+        index = self.index_of(position)
+        if index is None:
+            return 0
+        return self.add_seeds([index])
+
+    def mask_slice(self, axis, index):
+        """
+        Boolean slice of the region normal to VTK axis `axis`:
+        (y, x) for z, (z, x) for y, (z, y) for x
+        """
+        if axis == 2:
+            return numpy.unpackbits(self.mask[index], axis=1,
+                                    count=self.shape[2]).view(bool)
+        if axis == 1:
+            return numpy.unpackbits(self.mask[:, index], axis=1,
+                                    count=self.shape[2]).view(bool)
+        # packbits puts the first voxel in the most significant bit
+        return ((self.mask[:, :, index >> 3] >> (7 - (index & 7))) &
+                1).view(bool)
+
+    def to_array(self):
+        """
+        The region as a (z, y, x) boolean array, full size
+        """
+        return numpy.unpackbits(self.mask, axis=2,
+                                count=self.shape[2]).view(bool)
+
+
+class RegionOverlay(object):
+    """
+    Shows the region of a RegionGrower on the slices of the plane widgets,
+    as translucent image actors (one on each side of every plane), only
+    the displayed slices being unpacked.
+    """
+
+    def __init__(self, grower, plane_widgets, _renderer, color=(1, 0, 0),
+                 opacity=0.4):
+        self.grower = grower
+        self.color = numpy.array(color) * 255
+        self.opacity = opacity
+        self.planes = []
+        for widget in plane_widgets:
+            image = vtkCommonDataModel.vtkImageData()
+            actors = []
+            for side in (-1, 1):
+                actor = vtkRenderingCore.vtkImageActor()
+                actor.GetMapper().SetInputData(image)
+                actor.SetOpacity(opacity)
+                actor.PickableOff()
+                _renderer.AddActor(actor)
+                actors.append((side, actor))
+            observer = widget.AddObserver('InteractionEvent',
+                                          self.on_interaction)
+            self.planes.append((widget, image, actors, observer))
+        self.update()
+
+    def _update_plane(self, widget, image, actors):
+        axis = widget.GetPlaneOrientation()
+        if axis not in (0, 1, 2):
+            for _, actor in actors:
+                actor.VisibilityOff()
+            return
+        index = widget.GetSliceIndex()
+        region = self.grower.mask_slice(axis, index)
+        rgba = numpy.zeros(region.shape + (4,), dtype=numpy.uint8)
+        rgba[region, :3] = self.color
+        rgba[region, 3] = 255
+
+        nz, ny, nx = self.grower.shape
+        extent = [0, nx - 1, 0, ny - 1, 0, nz - 1]
+        extent[2 * axis:2 * axis + 2] = [index, index]
+        image.SetExtent(extent)
+        image.SetOrigin(self.grower.origin)
+        image.SetSpacing(self.grower.spacing)
+        scalars = numpy_support.numpy_to_vtk(
+            rgba.reshape(-1, 4), array_type=vtkCommonCore.VTK_UNSIGNED_CHAR)
+        scalars._numpy_reference = rgba
+        image.GetPointData().SetScalars(scalars)
+        image.Modified()
+        # Off the plane by a tenth of a voxel, not to fight with its texture
+        for side, actor in actors:
+            position = [0, 0, 0]
+            position[axis] = side * 0.1 * self.grower.spacing[axis]
+            actor.SetPosition(position)
+            actor.SetVisibility(self.grower.count > 0)
+
+    def update(self):
+        for widget, image, actors, _ in self.planes:
+            self._update_plane(widget, image, actors)
+
+    def on_interaction(self, obj, event):
+        for widget, image, actors, _ in self.planes:
+            if widget is obj:
+                self._update_plane(widget, image, actors)
+
+    def remove(self, _renderer):
+        for widget, _, actors, observer in self.planes:
+            widget.RemoveObserver(observer)
+            for _, actor in actors:
+                _renderer.RemoveActor(actor)
+        self.planes = []
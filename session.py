@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Session over many studies: loaded volumes kept under a memory budget,
+the next one prefetched, the plane widgets rebound to the active one.
+"""
+
+import sys
+import collections
+import concurrent.futures
+from image_io import read_DICOM_native
+
+
+class Study(object):
+    """
+    A loaded volume and the state of the widgets over it
+    """
+
+    def __init__(self, path, image):
+        self.path = path
+        self.image = image
+        self.nbytes = image.GetActualMemorySize() * 1024
+        self.slice_indices = None  # per widget, None until first shown
+        self.window_levels = None
+
+
+class StudySession(object):
+    """
+    Steps through a list of studies with the same three plane widgets.
+    Loaded studies are kept, least recently used first, until their bytes
+    go over `max_bytes`; the active one is never evicted. The study after
+    the active one is loaded on a worker thread while the current one is
+    looked at. The loader builds its vtkImageData there (`read_DICOM`
+    runs a vtkImageCast on it), an image no other VTK object refers to
+    until it is bound to the widgets, from the main thread.
+    Prefetched volumes count in `max_bytes` too: no more are loaded than
+    fit next to the active study (taking them to be its size), and once
+    loaded older studies are evicted to make room for them at the next
+    switch, or they are dropped if the active study alone leaves none.
+    Between their load and that switch, the budget can be exceeded by the
+    prefetched volumes.
+    Switching rebinds the inputs of the widgets, the renderer and its
+    actors are untouched; the slices and the window/level of each widget
+    are saved with the study they were shown on and restored with it.
+    """
+
+    def __init__(self, paths, plane_widgets, load=read_DICOM_native,
+                 max_bytes=2 * 2 ** 30, prefetch=1, on_activate=None):
+        """
+        :param paths: the studies, in browsing order
+        :param plane_widgets: vtkImagePlaneWidgets to rebind
+        :param load: function path -> vtkImageData
+        :param max_bytes: budget of the loaded and prefetched volumes
+        :param prefetch: number of studies loaded ahead, 0 disables it
+        :param on_activate: function (study) called after a switch, e.g.
+        to update a picker or an outline
+        """
+        self.paths = list(paths)
+        self.plane_widgets = plane_widgets
+        self.load = load
+        self.max_bytes = max_bytes
+        self.prefetch = prefetch
+        self.on_activate = on_activate
+        self.loaded = collections.OrderedDict()  # path -> Study, LRU first
+        self.pending = {}  # path -> Future
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.active = None
+        self.position = None
+
+    def loaded_bytes(self):
+        return sum(study.nbytes for study in self.loaded.values())
+
+    def prefetched_bytes(self):
+        """
+        Bytes of the prefetched volumes not shown yet
+        """
+        return sum(future.result().GetActualMemorySize() * 1024
+                   for future in self.pending.values()
+                   if future.done() and not future.cancelled() and
+                   future.exception() is None)
+
+    def add(self, path, image):
+        """
+        Keep an image loaded elsewhere, e.g. the first study
+        """
+        self.loaded[path] = Study(path, image)
+
+    def get(self, path):
+        """
+        The Study of `path`, loading it (or waiting for its prefetch)
+        """
+        if path in self.loaded:
+            self.loaded.move_to_end(path)
+            return self.loaded[path]
+        future = self.pending.pop(path, None)
+        image = future.result() if future is not None else self.load(path)
+        study = Study(path, image)
+        self.loaded[path] = study
+        return study
+
+    def _evict(self):
+        for path in list(self.loaded):
+            if self.loaded_bytes() + self.prefetched_bytes() <= \
+                    self.max_bytes:
+                return
+            if self.active is not None and path == self.active.path:
+                continue
+            del self.loaded[path]
+        # The active study and the prefetched ones do not fit
+        for path in list(self.pending):
+            if self.loaded_bytes() + self.prefetched_bytes() <= \
+                    self.max_bytes:
+                return
+            if self.pending[path].done():
+                del self.pending[path]
+
+    def _prefetch(self):
+        if self.position is None:
+            return
+        # As many as fit next to the active study, if the next ones are
+        # the size of it
+        fit = (self.max_bytes - self.active.nbytes) // \
+            max(self.active.nbytes, 1)
+        ahead = self.paths[self.position + 1:
+                           self.position + 1 + min(self.prefetch, fit)]
+        for path in ahead:
+            if path not in self.loaded and path not in self.pending:
+                self.pending[path] = self.executor.submit(self.load, path)
+        # Loads nobody will ask for anymore are dropped, done or not
+        for path in list(self.pending):
+            future = self.pending[path]
+            if path not in ahead and (future.done() or future.cancel()):
+                del self.pending[path]
+
+    def _save_state(self):
+        study = self.active
+        if study is None:
+            return
+        study.slice_indices = [w.GetSliceIndex() for w in self.plane_widgets]
+        study.window_levels = [(w.GetWindow(), w.GetLevel())
+                               for w in self.plane_widgets]
+
+    def _bind(self, study):
+        for i, widget in enumerate(self.plane_widgets):
+            widget.SetInputData(study.image)
+            # The widget is placed over the bounds of its input
+            widget.PlaceWidget()
+            if study.slice_indices is None:
+                dims = study.image.GetDimensions()
+                axis = widget.GetPlaneOrientation()
+                widget.SetSliceIndex(dims[axis] // 2)
+            else:
+                widget.SetSliceIndex(study.slice_indices[i])
+                window, level = study.window_levels[i]
+                widget.SetWindowLevel(window, level)
+
+    def activate(self, position):
+        """
+        Show study number `position` on the widgets
+        :return: its Study
+        """
+        path = self.paths[position]
+        self._save_state()
+        try:
+            study = self.get(path)
+        except Exception as error:
+            sys.stderr.write('%s: %s\n' % (path, error))
+            return self.active
+        self.active = study
+        self.position = position
+        self._bind(study)
+        self._prefetch()
+        self._evict()
+        if self.on_activate is not None:
+            self.on_activate(study)
+        return study
+
+    def next(self):
+        return self.activate(min(self.position + 1, len(self.paths) - 1))
+
+    def previous(self):
+        return self.activate(max(self.position - 1, 0))
+
+    def shutdown(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending = {}
+        self.executor.shutdown(wait=False)
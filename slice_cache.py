@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Prefetched slices for cine scrolling through the image plane widgets.
+"""
+
+import concurrent.futures
+import numpy
+from lazy import lazy_import, vtk_module
+
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+vtkCommonCore = vtk_module('vtkCommonCore')
+vtkCommonDataModel = vtk_module('vtkCommonDataModel')
+vtkCommonMath = vtk_module('vtkCommonMath')
+vtkImagingCore = vtk_module('vtkImagingCore')
+
+
+class SliceCache(object):
+    """
+    Ring buffer of resliced and color-mapped slices around the slice index
+    of one orthogonal vtkImagePlaneWidget.
+    On a hit, the RGBA slice is handed to the texture of the widget and
+    its reslice / map-to-colors pipeline does not run at all; on a miss
+    the widget draws as usual. Either way the slices ahead in the scroll
+    direction (and a few behind) are computed on a worker thread and
+    overwrite the slots of the slices farthest from the cursor.
+    The worker runs copies of the widget's vtkImageReslice (same grid and
+    interpolation) and vtkImageMapToColors (same lookup table, with its
+    out of range and NaN colors), made in the main thread: a cached slice
+    is what the widget would draw. A window/level change, a new input or
+    an oblique plane drops the cached slices.
+    """
+
+    def __init__(self, plane_widget, ahead=32, behind=8):
+        """
+        :param plane_widget: a vtkImagePlaneWidget
+        :param ahead: slices prefetched in the scroll direction
+        :param behind: slices kept in the other direction
+        """
+        self.widget = plane_widget
+        self.ahead = ahead
+        self.behind = behind
+        self.slots = [None] * (ahead + behind + 1)  # (generation, index, rgba)
+        self.generation = 0
+        self.key = None
+        self.request = None
+        self.last_index = None
+        self.direction = 1
+        self.shown = None  # image on the texture, None for the pipeline
+        self.hits = 0
+        self.misses = 0
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.observer = plane_widget.AddObserver('InteractionEvent',
+                                                 self.on_interaction)
+
+    def _key(self):
+        """
+        What the cached slices depend on, None for an oblique plane
+        """
+        axis = self.widget.GetPlaneOrientation()
+        image = self.widget.GetInput()
+        if axis not in (0, 1, 2) or image is None:
+            return None
+        reslice = self.widget.GetReslice()
+        matrix = reslice.GetResliceAxes()
+        axes = numpy.array([[matrix.GetElement(r, c) for c in range(4)]
+                            for r in range(3)])
+        # Pushing the plane moves the origin along the normal only
+        normal = axes[:, 2]
+        in_plane = axes[:, 3] - numpy.dot(axes[:, 3], normal) * normal
+        return (id(image), image.GetMTime(),
+                self.widget.GetLookupTable().GetMTime(),
+                tuple(reslice.GetOutputExtent()),
+                tuple(reslice.GetOutputSpacing()),
+                tuple(reslice.GetOutputOrigin()),
+                tuple(numpy.round(axes[:, :3], 6).ravel()),
+                tuple(numpy.round(in_plane, 6)))
+
+    def _reset(self, key):
+        """
+        Drop the slices and snapshot the geometry of the current one
+        """
+        self.generation += 1
+        self.slots = [None] * len(self.slots)
+        self.key = key
+        self.request = None
+        self.last_index = None
+        if key is None:
+            return
+        widget = self.widget
+        reslice = widget.GetReslice()
+        # Shares the scalars, not the pipeline information of the input
+        image = vtkCommonDataModel.vtkImageData()
+        image.ShallowCopy(widget.GetInput())
+        axes = vtkCommonMath.vtkMatrix4x4()
+        axes.DeepCopy(reslice.GetResliceAxes())
+        slice_reslice = vtkImagingCore.vtkImageReslice()
+        slice_reslice.SetInputData(image)
+        slice_reslice.SetResliceAxes(axes)
+        slice_reslice.SetOutputDimensionality(2)
+        slice_reslice.SetInterpolationMode(reslice.GetInterpolationMode())
+        slice_reslice.SetBackgroundColor(reslice.GetBackgroundColor())
+        extent = reslice.GetOutputExtent()
+        spacing = reslice.GetOutputSpacing()
+        origin = reslice.GetOutputOrigin()
+        slice_reslice.SetOutputExtent(extent)
+        slice_reslice.SetOutputSpacing(spacing)
+        slice_reslice.SetOutputOrigin(origin)
+
+        lut = widget.GetLookupTable()
+        table = lut.NewInstance()
+        table.DeepCopy(lut)
+        if isinstance(lut, vtkCommonCore.vtkLookupTable):
+            # Not part of vtkLookupTable.DeepCopy
+            table.SetUseBelowRangeColor(lut.GetUseBelowRangeColor())
+            table.SetBelowRangeColor(lut.GetBelowRangeColor())
+            table.SetUseAboveRangeColor(lut.GetUseAboveRangeColor())
+            table.SetAboveRangeColor(lut.GetAboveRangeColor())
+        color_map = vtkImagingCore.vtkImageMapToColors()
+        color_map.SetInputConnection(slice_reslice.GetOutputPort())
+        color_map.SetLookupTable(table)
+        color_map.SetOutputFormat(widget.GetColorMap().GetOutputFormat())
+        color_map.SetPassAlphaToOutput(
+            widget.GetColorMap().GetPassAlphaToOutput())
+
+        self.axis = widget.GetPlaneOrientation()
+        self.base = widget.GetSliceIndex()
+        image_extent = image.GetExtent()
+        self.dims = numpy.array(image_extent[1::2]) - \
+            numpy.array(image_extent[0::2]) + 1
+        # The worker only uses this tuple, replaced as a whole
+        self.pipeline = (axes, axes.GetElement(self.axis, 3),
+                         image.GetSpacing()[self.axis], color_map)
+        self.geometry = (extent, spacing, origin)
+
+    def _compute(self, slice_index):
+        """
+        RGBA (v, u, 4) of slice `slice_index` (worker thread)
+        """
+        axes, position, step, color_map = self.pipeline
+        axes.SetElement(self.axis, 3,
+                        position + step * (slice_index - self.base))
+        color_map.Update()
+        output = color_map.GetOutput()
+        extent = output.GetExtent()
+        scalars = numpy_support.vtk_to_numpy(
+            output.GetPointData().GetScalars())
+        return scalars.reshape(extent[3] - extent[2] + 1,
+                               extent[1] - extent[0] + 1, -1).copy()
+
+    def _fill(self, request, wanted):
+        generation = request[0]
+        for slice_index in wanted:
+            if self.request is not request:
+                return
+            slot = slice_index % len(self.slots)
+            entry = self.slots[slot]
+            if entry is not None and entry[0] == generation and \
+                    entry[1] == slice_index:
+                continue
+            rgba = self._compute(slice_index)
+            if self.generation == generation:
+                self.slots[slot] = (generation, slice_index, rgba)
+
+    def _prefetch(self, slice_index):
+        count = self.dims[self.axis]
+        wanted = [slice_index + self.direction * step
+                  for step in range(self.ahead + 1)] + \
+                 [slice_index - self.direction * step
+                  for step in range(1, self.behind + 1)]
+        wanted = [i for i in wanted if 0 <= i < count]
+        self.request = (self.generation, slice_index)
+        self.executor.submit(self._fill, self.request, wanted)
+
+    def _show(self, rgba):
+        texture = self.widget.GetTexture()
+        if rgba is None:
+            if self.shown is not None:
+                texture.SetInputConnection(
+                    self.widget.GetColorMap().GetOutputPort())
+                self.shown = None
+            return
+        extent, spacing, origin = self.geometry
+        image = vtkCommonDataModel.vtkImageData()
+        image.SetExtent(extent[0], extent[1], extent[2], extent[3], 0, 0)
+        image.SetSpacing(spacing)
+        image.SetOrigin(origin)
+        scalars = numpy_support.numpy_to_vtk(
+            rgba.reshape(-1, rgba.shape[-1]),
+            array_type=vtkCommonCore.VTK_UNSIGNED_CHAR)
+        scalars._numpy_reference = rgba
+        image.GetPointData().SetScalars(scalars)
+        texture.SetInputData(image)
+        self.shown = image
+
+    def update(self):
+        """
+        Show the current slice of the widget, from the cache if it is
+        there, and prefetch around it
+        """
+        key = self._key()
+        if key != self.key:
+            self._reset(key)
+        if key is None:
+            self._show(None)
+            return
+        slice_index = self.widget.GetSliceIndex()
+        if self.last_index is not None and slice_index != self.last_index:
+            self.direction = 1 if slice_index > self.last_index else -1
+        self.last_index = slice_index
+        entry = self.slots[slice_index % len(self.slots)]
+        if entry is not None and entry[0] == self.generation and \
+                entry[1] == slice_index:
+            self.hits += 1
+            self._show(entry[2])
+        else:
+            self.misses += 1
+            self._show(None)
+        self._prefetch(slice_index)
+
+    def set_slice_index(self, slice_index):
+        """
+        SetSliceIndex on the widget, through the cache
+        """
+        count = self.widget.GetInput().GetDimensions()[
+            self.widget.GetPlaneOrientation()]
+        self.widget.SetSliceIndex(max(0, min(slice_index, count - 1)))
+        self.update()
+
+    def on_interaction(self, obj, event):
+        self.update()
+
+    def remove(self):
+        self.widget.RemoveObserver(self.observer)
+        self.request = None
+        self.executor.shutdown(wait=False)
+        self._show(None)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import numpy
+import pytest
+import SimpleITK as sitk
+from vtk.util import numpy_support
+from image_io import lossless_dtype, auto_cast, read_DICOM, \
+    read_DICOM_native, read_DICOM_parallel, CAST_AUTO, \
+    TAG_RESCALE_SLOPE, TAG_RESCALE_INTERCEPT
+
+
+@pytest.mark.parametrize('values, dtype', [
+    ([0, 17, 255], 'uint8'),
+    ([-128, 0, 127], 'int8'),
+    ([0, 256], 'uint16'),
+    ([-1024, 3071], 'int16'),
+    ([0, 70000], 'uint32'),
+    ([-70000, 1], 'int32'),
+    ([0.5, -2.25], 'float32'),
+    ([0.1, 3], 'float64')])
+def test_lossless_dtype(values, dtype):
+    array = numpy.array(values, dtype=numpy.float64).reshape(1, 1, -1)
+    assert lossless_dtype(array) == numpy.dtype(dtype)
+    numpy.testing.assert_array_equal(auto_cast(array), array)
+
+
+def test_one_fraction_is_enough():
+    array = numpy.zeros((3, 4, 5))
+    array[2, 3, 4] = 0.5
+    assert lossless_dtype(array) == numpy.dtype('float32')
+
+
+def test_stats():
+    stats = {}
+    array = auto_cast(numpy.arange(100, dtype=numpy.int32).reshape(1, 10, 10),
+                      stats=stats)
+    assert array.dtype == numpy.uint8
+    assert stats['auto_type'] == 'uint8'
+    assert stats['bytes_saved'] == 300
+    assert stats['bytes_saved_vs_double'] == 700
+
+
+# (slope, intercept) of each slice: the first one is integral, so ITK
+# reads the series as integers unless told otherwise
+RESCALES = [(1, 0), (0.5, 0.25), (2, -1), (1, 0)]
+
+
+@pytest.fixture(scope='module')
+def rescaled_series(tmp_path_factory):
+    """
+    A DICOM series with one rescale per slice, and its true values
+    """
+    directory = str(tmp_path_factory.mktemp('rescaled'))
+    stored = numpy.arange(len(RESCALES) * 4 * 5).reshape(-1, 4, 5)
+    series_uid = '1.2.826.0.1.3680043.2.1125.1'
+    writer = sitk.ImageFileWriter()
+    writer.KeepOriginalImageUIDOn()
+    values = []
+    for k, (slope, intercept) in enumerate(RESCALES):
+        values.append(stored[k] * slope + intercept)
+        image = sitk.GetImageFromArray(values[-1][None].astype(numpy.float64))
+        image = image[:, :, 0]
+        for tag, value in [('0008|0060', 'CT'),
+                           ('0008|0018', '%s.%d' % (series_uid, k + 1)),
+                           ('0020|000e', series_uid),
+                           ('0020|0013', str(k + 1)),
+                           ('0020|0032', '0\\0\\%d' % k),
+                           ('0020|0037', '1\\0\\0\\0\\1\\0'),
+                           ('0028|0100', '16'), ('0028|0101', '16'),
+                           ('0028|0102', '15'), ('0028|0103', '1'),
+                           (TAG_RESCALE_SLOPE, str(slope)),
+                           (TAG_RESCALE_INTERCEPT, str(intercept))]:
+            image.SetMetaData(tag, value)
+        writer.SetFileName(os.path.join(directory, '%03d.dcm' % k))
+        writer.Execute(image)
+    return directory, numpy.array(values)
+
+
+def to_array(img_vtk):
+    return numpy_support.vtk_to_numpy(
+        img_vtk.GetPointData().GetScalars()).reshape(
+        img_vtk.GetDimensions()[::-1])
+
+
+def test_per_slice_rescale_native(rescaled_series):
+    directory, values = rescaled_series
+    img_vtk = read_DICOM_native(directory, cast_type=CAST_AUTO)
+    assert img_vtk.GetScalarTypeAsString() == 'float'
+    numpy.testing.assert_array_equal(to_array(img_vtk), values)
+
+
+def test_per_slice_rescale_legacy(rescaled_series):
+    directory, values = rescaled_series
+    img_vtk = read_DICOM(directory, cast_type=CAST_AUTO)
+    # Axes swapped by the legacy loader
+    numpy.testing.assert_array_equal(to_array(img_vtk),
+                                     values.transpose(2, 1, 0))
+
+
+def test_per_slice_rescale_parallel(rescaled_series):
+    directory, values = rescaled_series
+    stats = {}
+    img_vtk = read_DICOM_parallel(directory, chunk_size=1,
+                                  cast_type=CAST_AUTO, stats=stats)
+    assert stats['auto_type'] == 'float32'
+    numpy.testing.assert_array_equal(to_array(img_vtk), values)
+
+
+def test_integral_series(rescaled_series, tmp_path):
+    directory, values = rescaled_series
+    # The first slice alone has an integral rescale
+    single = tmp_path / 'single'
+    single.mkdir()
+    first = sorted(os.listdir(directory))[0]
+    shutil.copy(os.path.join(directory, first), str(single / first))
+    img_vtk = read_DICOM_native(str(single), cast_type=CAST_AUTO)
+    assert img_vtk.GetScalarTypeAsString() == 'unsigned char'
+    numpy.testing.assert_array_equal(to_array(img_vtk)[0], values[0])
@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gc
+import numpy
+import pytest
+from image_io import numpy_to_vtk_image
+from volume_stats import image_statistics
+from isosurface import IsosurfaceCache, roi_around
+
+SPACING = numpy.array([0.5, 0.75, 2.])
+ORIGIN = numpy.array([-10., 5., 1.])
+SHAPE = (12, 16, 20)  # (z, y, x)
+
+
+@pytest.fixture
+def ball():
+    """
+    Distance to the centre of the volume, in voxels
+    """
+    k, j, i = numpy.indices(SHAPE)
+    centre = (numpy.array(SHAPE) - 1) / 2.
+    return numpy.sqrt((k - centre[0]) ** 2 + (j - centre[1]) ** 2 +
+                      (i - centre[2]) ** 2)
+
+
+@pytest.fixture
+def image(ball):
+    return numpy_to_vtk_image(ball, SPACING, ORIGIN)
+
+
+def test_hits(image):
+    cache = IsosurfaceCache()
+    mesh = cache.get(image, 4.)
+    assert mesh.GetNumberOfPolys() > 0
+    assert cache.get(image, 4.) is mesh
+    assert cache.get(image, 3.) is not mesh
+    assert (cache.hits, cache.misses) == (1, 2)
+    # Back to a threshold seen before
+    assert cache.get(image, 4.) is mesh
+    # A modified image is another volume
+    image.Modified()
+    assert cache.get(image, 4.) is not mesh
+    assert (cache.hits, cache.misses) == (2, 3)
+
+
+def test_eviction(image):
+    cache = IsosurfaceCache()
+    first = cache.get(image, 3.)
+    cache.max_bytes = cache.cached_bytes()
+    # Room for one mesh: each new one pushes the previous one out
+    cache.get(image, 4.)
+    assert [key[2] for key in cache.meshes] == [4.]
+    cache.get(image, 3.5)
+    assert [key[2] for key in cache.meshes] == [3.5]
+    assert cache.get(image, 3.) is not first
+    cache.clear()
+    assert cache.cached_bytes() == 0
+
+
+def test_roi(image):
+    cache = IsosurfaceCache()
+    centre = ORIGIN + SPACING * (numpy.array(SHAPE[::-1]) - 1) / 2.
+    roi = roi_around(image, centre, 2.)
+    assert roi == (5, 14, 4, 11, 4, 7)
+    whole = cache.get(image, 4.)
+    part = cache.get(image, 4., roi)
+    assert part is not whole
+    assert 0 < part.GetNumberOfPolys() < whole.GetNumberOfPolys()
+    bounds = part.GetBounds()
+    for axis in range(3):
+        assert bounds[2 * axis] >= \
+            ORIGIN[axis] + SPACING[axis] * roi[2 * axis] - 1e-6
+        assert bounds[2 * axis + 1] <= \
+            ORIGIN[axis] + SPACING[axis] * roi[2 * axis + 1] + 1e-6
+    assert cache.get(image, 4., roi) is part
+    assert cache.get(image, 4., image.GetExtent()) is whole
+
+
+def test_roi_outside(image, capfd):
+    # The box misses the image: an empty extent, and an empty mesh without
+    # running the pipeline (VTK errors on stderr)
+    roi = roi_around(image, ORIGIN - 100., 2.)
+    assert roi[0] > roi[1]
+    mesh = IsosurfaceCache().get(image, 4., roi)
+    assert mesh.GetNumberOfPoints() == 0
+    assert 'ERR' not in capfd.readouterr().err
+
+
+def test_statistics(ball, image):
+    image_statistics(image)
+    cache = IsosurfaceCache()
+    numpy.testing.assert_allclose(cache.get(image, 4.).GetBounds(),
+                                  IsosurfaceCache().get(
+                                      numpy_to_vtk_image(ball, SPACING,
+                                                         ORIGIN),
+                                      4.).GetBounds())
+    # Above the maximum: no slice is crossed
+    assert cache.get(image, ball.max() + 1.).GetNumberOfPoints() == 0
+
+
+def test_deleted_image(ball):
+    cache = IsosurfaceCache()
+    image = numpy_to_vtk_image(ball, SPACING, ORIGIN)
+    cache.get(image, 4.)
+    cache.get(image, 3.)
+    other = numpy_to_vtk_image(ball, SPACING, ORIGIN)
+    cache.get(other, 4.)
+    del image
+    gc.collect()
+    # Only the meshes of the other image are left
+    assert len(cache.meshes) == 1
+    assert list(cache.watched) == [other.__this__]
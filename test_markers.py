@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+from vtk.util import numpy_support
+from markers import PointSet, LandmarkIndex
+
+
+def arrays(point_set):
+    """
+    Positions, colors and radii of a PointSet as NumPy arrays
+    """
+    return (numpy_support.vtk_to_numpy(point_set.points.GetData()),
+            numpy_support.vtk_to_numpy(point_set.colors),
+            numpy_support.vtk_to_numpy(point_set.radii))
+
+
+@pytest.fixture
+def positions():
+    return numpy.random.RandomState(0).uniform(-50., 50., (40, 3))
+
+
+def test_extend(positions):
+    point_set = PointSet()
+    point_set.append((1., 2., 3.), color=(1., 0., 0.), radius=0.5)
+    point_set.extend(positions, colors=(0., 1., 0.), radii=0.25)
+    assert len(point_set) == 41
+    points, colors, radii = arrays(point_set)
+    numpy.testing.assert_allclose(points[1:], positions, rtol=1e-6)
+    numpy.testing.assert_array_equal(colors[0], [255, 0, 0])
+    numpy.testing.assert_array_equal(colors[1:], [[0, 255, 0]] * 40)
+    numpy.testing.assert_array_equal(radii, [0.5] + [0.25] * 40)
+
+
+def test_extend_empty():
+    point_set = PointSet()
+    point_set.append((1., 2., 3.))
+    mtime = point_set.poly_data.GetMTime()
+    for empty in ([], numpy.empty((0, 3))):
+        point_set.extend(empty)
+    assert len(point_set) == 1
+    assert point_set.poly_data.GetMTime() == mtime
+
+
+def test_remove(positions):
+    point_set = PointSet()
+    point_set.extend(positions[:3], radii=[1., 2., 3.])
+    assert point_set.remove(0) == 2
+    points, _, radii = arrays(point_set)
+    numpy.testing.assert_allclose(points, positions[[2, 1]], rtol=1e-6)
+    numpy.testing.assert_array_equal(radii, [3., 2.])
+    assert point_set.remove(1) is None
+    with pytest.raises(IndexError):
+        point_set.remove(1)
+
+
+@pytest.mark.parametrize('rebuild_threshold', [1024, 4])
+def test_landmark_index(positions, rebuild_threshold):
+    point_set = PointSet()
+    index = LandmarkIndex(point_set, rebuild_threshold)
+    assert index.nearest((0., 0., 0.)) == (None, None)
+    # Some points in the locator, the others pending
+    point_set.extend(positions[:30])
+    index.nearest((0., 0., 0.))
+    point_set.extend(positions[30:])
+    stored = arrays(point_set)[0].astype(numpy.float64)
+    for query in positions[::7] + 1.5:
+        distances = numpy.sqrt(numpy.sum((stored - query) ** 2, axis=1))
+        nearest, distance = index.nearest(query)
+        assert nearest == distances.argmin()
+        assert distance == pytest.approx(distances.min(), rel=1e-5)
+        assert index.k_nearest(query, 5) == \
+            numpy.argsort(distances)[:5].tolist()
+        assert sorted(index.within(query, 20.)) == \
+            numpy.flatnonzero(distances <= 20.).tolist()
+
+    # The last point moves into the slot of the removed one
+    point_set.remove(0)
+    nearest, distance = index.nearest(positions[39])
+    assert nearest == 0
+    assert distance < 1e-4
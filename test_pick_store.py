@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+from pick_store import PickStore, COLUMNS
+
+
+def pick(n):
+    return {'position': (n + 0.5, 2. * n, -n / 4.),
+            'index': (n, n + 1, n + 2),
+            'value': 100. + n,
+            'axis': n % 3}
+
+
+@pytest.fixture
+def store():
+    store = PickStore()
+    for n in range(5):
+        store.append(pick(n), study='a' if n % 2 else 'b', timestamp=n)
+    return store
+
+
+def assert_same(first, second):
+    assert first.studies == second.studies
+    for name, _ in COLUMNS:
+        numpy.testing.assert_array_equal(first.column(name),
+                                         second.column(name))
+
+
+def test_append(store):
+    assert len(store) == 5
+    assert store.studies == ['b', 'a']
+    numpy.testing.assert_array_equal(store.column('i'), range(5))
+    numpy.testing.assert_array_equal(store.column('study'), [0, 1, 0, 1, 0])
+    numpy.testing.assert_array_equal(store.positions('a')[:, 0], [1.5, 3.5])
+    assert store.positions('c').shape == (0, 3)
+
+
+def test_append_while_column_held(store):
+    column = store.column('x')
+    store.append(pick(5))
+    store.extend(store)
+    assert len(column) == 5
+    assert len(store) == 12
+
+
+def test_extend_remaps_studies(store):
+    other = PickStore()
+    other.append(pick(7), study='c')
+    other.append(pick(8), study='a')
+    store.extend(other)
+    assert store.studies == ['b', 'a', 'c']
+    numpy.testing.assert_array_equal(store.column('study')[-2:], [2, 1])
+
+
+@pytest.mark.parametrize('base_name', ['picks.npz', 'picks', 'picks.log'])
+def test_save_load(store, tmp_path, base_name):
+    file_name = str(tmp_path / base_name)
+    store.save(file_name)
+    # The very name given, no suffix added
+    assert [path.name for path in tmp_path.iterdir()] == [base_name]
+    assert_same(store, PickStore.load(file_name))
+
+
+def test_csv(store, tmp_path):
+    file_name = str(tmp_path / 'picks.csv')
+    store.export_csv(file_name)
+    with open(file_name, newline='') as csv_file:
+        assert len(csv_file.read().splitlines()) == len(store) + 1
+    assert_same(store, PickStore.import_csv(file_name))
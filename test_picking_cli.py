@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import argparse
+import numpy
+import pytest
+import SimpleITK as sitk
+from picking_cli import process_series, parse_slice, read_points
+
+SPACING = (0.7, 0.9, 1.5)
+ORIGIN = (-12.3, 4.5, 100.25)
+SHAPE = (6, 5, 7)  # (z, y, x)
+
+
+@pytest.fixture(scope='module')
+def series(tmp_path_factory):
+    """
+    A CT DICOM series of int16 values, and those values (z, y, x)
+    """
+    directory = str(tmp_path_factory.mktemp('series'))
+    volume = (numpy.arange(numpy.prod(SHAPE)).reshape(SHAPE) * 7 - 100
+              ).astype(numpy.int16)
+    series_uid = '1.2.826.0.1.3680043.2.1125.2'
+    writer = sitk.ImageFileWriter()
+    writer.KeepOriginalImageUIDOn()
+    for k in range(SHAPE[0]):
+        image = sitk.GetImageFromArray(volume[k])
+        image.SetSpacing(SPACING[:2])
+        position = (ORIGIN[0], ORIGIN[1], ORIGIN[2] + k * SPACING[2])
+        for tag, value in [('0008|0060', 'CT'),
+                           ('0008|0018', '%s.%d' % (series_uid, k + 1)),
+                           ('0020|000e', series_uid),
+                           ('0020|0013', str(k + 1)),
+                           ('0020|0032', '\\'.join(map(repr, position))),
+                           ('0020|0037', '1\\0\\0\\0\\1\\0'),
+                           ('0028|0030', '%r\\%r' % SPACING[1::-1])]:
+            image.SetMetaData(tag, value)
+        writer.SetFileName(os.path.join(directory, '%03d.dcm' % k))
+        writer.Execute(image)
+    return directory, volume
+
+
+def test_parse_slice():
+    assert parse_slice('x:12') == (0, 12)
+    assert parse_slice('z:mid') == (2, None)
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_slice('k:3')
+
+
+@pytest.mark.parametrize('loader', ['native', 'parallel'])
+def test_process_series(series, tmp_path, loader):
+    directory, volume = series
+    index = numpy.array([[0, 0, 0], [6, 4, 5], [3, 2, 1]])
+    # Off the voxel centres by less than half a voxel, with all the digits
+    points = numpy.array(ORIGIN) + index * SPACING + \
+        numpy.array(SPACING) / 3.
+    points = numpy.vstack([points, [-1e3, 0., 0.]])
+    args = argparse.Namespace(
+        loader=loader, output=str(tmp_path), slices=[(2, None), (0, 6),
+                                                     (1, 5)],
+        points_array=points, interpolation='nearest', threads=1)
+    result = process_series(3, directory, args)
+    assert result['voxels'] == volume.size
+    # Slice y:5 is out of the volume
+    assert (result['slices'], result['points']) == (2, 4)
+    assert os.path.basename(result['output']) == \
+        '003_' + os.path.basename(directory)
+
+    numpy.testing.assert_array_equal(
+        numpy.load(os.path.join(result['output'], 'z0003.npy')), volume[3])
+    numpy.testing.assert_array_equal(
+        numpy.load(os.path.join(result['output'], 'x0006.npy')),
+        volume[:, :, 6])
+    assert not os.path.exists(os.path.join(result['output'], 'y0005.npy'))
+
+    probe_csv = os.path.join(result['output'], 'probe.csv')
+    table = numpy.loadtxt(probe_csv, delimiter=',', skiprows=1)
+    # Round trip of the coordinates
+    numpy.testing.assert_array_equal(table[:, :3], points)
+    numpy.testing.assert_array_equal(read_points(probe_csv), points)
+    numpy.testing.assert_array_equal(table[:3, 3:6], index)
+    numpy.testing.assert_array_equal(
+        table[:3, 6], volume[index[:, 2], index[:, 1], index[:, 0]])
+    numpy.testing.assert_array_equal(table[3, 3:6], [-1, -1, -1])
+    assert numpy.isnan(table[3, 6])
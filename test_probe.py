@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+from image_io import numpy_to_vtk_image
+from probe import VolumeProbe, probe_points
+
+SPACING = numpy.array([0.5, 0.75, 2.])
+ORIGIN = numpy.array([-10., 5., 1.])
+SHAPE = (6, 7, 8)  # (z, y, x)
+
+
+def ramp(i, j, k):
+    """
+    Linear in the indices, so linear and cubic interpolation are exact
+    """
+    return 3. * i - 2. * j + 5. * k + 1.
+
+
+@pytest.fixture
+def image():
+    k, j, i = numpy.indices(SHAPE)
+    return numpy_to_vtk_image(ramp(i, j, k), SPACING, ORIGIN)
+
+
+def world(index):
+    return ORIGIN + SPACING * numpy.asarray(index, dtype=float)
+
+
+def test_voxel_centres(image):
+    index = numpy.array([[0, 0, 0], [7, 6, 5], [3, 2, 1]])
+    for interpolation in ('nearest', 'linear', 'cubic'):
+        values, indices = probe_points(image, world(index), interpolation)
+        numpy.testing.assert_allclose(values, ramp(*index.T))
+        numpy.testing.assert_array_equal(indices, index)
+
+
+def test_interpolation(image):
+    index = numpy.array([[1.25, 2.5, 3.75], [4.5, 1.1, 2.9],
+                         [2.2, 4.4, 1.6]])
+    values, indices = probe_points(image, world(index), 'linear')
+    numpy.testing.assert_allclose(values, ramp(*index.T))
+    numpy.testing.assert_array_equal(indices, numpy.rint(index))
+    values, _ = probe_points(image, world(index), 'cubic')
+    numpy.testing.assert_allclose(values, ramp(*index.T))
+    values, _ = probe_points(image, world(index), 'nearest')
+    numpy.testing.assert_allclose(values, ramp(*numpy.rint(index).T))
+
+
+def test_outside(image):
+    index = numpy.array([[-0.6, 0, 0], [0, 6.6, 0], [0, 0, 5.4]])
+    values, indices = probe_points(image, world(index), 'linear')
+    assert numpy.isnan(values[:2]).all()
+    assert (indices[:2] == -1).all()
+    # Within half a voxel of the last one: edge padded
+    assert values[2] == pytest.approx(ramp(0, 0, 5))
+
+
+def test_chunks_and_workers(image):
+    points = world(numpy.random.RandomState(0).uniform(
+        -1, 7, (1000, 3)))
+    expected = VolumeProbe(image).probe(points, 'cubic')
+    values, indices = VolumeProbe(image).probe(points, 'cubic', workers=4,
+                                               chunk_size=64)
+    numpy.testing.assert_array_equal(values, expected[0])
+    numpy.testing.assert_array_equal(indices, expected[1])
+
+
+def test_wrong_interpolation(image):
+    with pytest.raises(ValueError):
+        probe_points(image, [[0, 0, 0]], 'spline')
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import collections
+import numpy
+import pytest
+from image_io import numpy_to_vtk_image
+from region_grow import RegionGrower
+
+SPACING = numpy.array([0.5, 0.75, 2.])
+ORIGIN = numpy.array([-10., 5., 1.])
+SHAPE = (12, 10, 13)  # (z, y, x), x not a multiple of 8
+
+
+def connected(inside, seed):
+    """
+    Reference 6-connected component of `inside` holding `seed` (k, j, i)
+    """
+    region = numpy.zeros_like(inside)
+    if not inside[seed]:
+        return region
+    region[seed] = True
+    queue = collections.deque([seed])
+    while queue:
+        voxel = queue.popleft()
+        for axis in range(3):
+            for step in (-1, 1):
+                neighbour = list(voxel)
+                neighbour[axis] += step
+                neighbour = tuple(neighbour)
+                if 0 <= neighbour[axis] < inside.shape[axis] and \
+                        inside[neighbour] and not region[neighbour]:
+                    region[neighbour] = True
+                    queue.append(neighbour)
+    return region
+
+
+@pytest.fixture
+def blobs():
+    """
+    Two balls at 100 on a 0 background, and a U tube at 100 winding
+    through the slabs along z
+    """
+    k, j, i = numpy.indices(SHAPE)
+    values = numpy.zeros(SHAPE)
+    values[(k - 3) ** 2 + (j - 3) ** 2 + (i - 3) ** 2 <= 6] = 100.
+    values[(k - 8) ** 2 + (j - 6) ** 2 + (i - 9) ** 2 <= 4] = 100.
+    values[1:11, 8, 0] = 100.
+    values[1, 8, 0:3] = 100.
+    values[1:11, 8, 2] = 100.
+    return values
+
+
+def grower_of(values, **options):
+    return RegionGrower(numpy_to_vtk_image(values, SPACING, ORIGIN),
+                        50., 150., **options)
+
+
+@pytest.mark.parametrize('slab_size', [32, 4, 1])
+def test_ball(blobs, slab_size):
+    grower = grower_of(blobs, slab_size=slab_size)
+    expected = connected(blobs > 50, (3, 3, 3))
+    assert grower.add_seeds([[3, 3, 3]]) == expected.sum()
+    numpy.testing.assert_array_equal(grower.to_array(), expected)
+    assert grower.count == expected.sum()
+
+
+@pytest.mark.parametrize('slab_size', [32, 3, 1])
+def test_across_slabs(blobs, slab_size):
+    # Down one branch of the U and up the other: several rounds of slabs
+    grower = grower_of(blobs, slab_size=slab_size, workers=2)
+    expected = connected(blobs > 50, (10, 8, 0))
+    assert expected[10, 8, 2]
+    grower.add_seeds([[0, 8, 10]])
+    numpy.testing.assert_array_equal(grower.to_array(), expected)
+
+
+def test_incremental(blobs):
+    grower = grower_of(blobs, slab_size=4)
+    first = grower.add_seeds([[3, 3, 3]])
+    # Inside the region already, or out of the range: nothing new
+    assert grower.add_seeds([[3, 4, 3], [0, 0, 0]]) == 0
+    second = grower.add_seeds([[9, 6, 8]])
+    expected = connected(blobs > 50, (3, 3, 3)) | \
+        connected(blobs > 50, (8, 6, 9))
+    assert first + second == expected.sum() == grower.count
+    numpy.testing.assert_array_equal(grower.to_array(), expected)
+
+    grower.set_threshold(150., 200.)
+    assert grower.count == 0
+    assert not grower.to_array().any()
+
+
+def test_no_threshold(blobs):
+    image = numpy_to_vtk_image(blobs, SPACING, ORIGIN)
+    with pytest.raises(ValueError):
+        RegionGrower(image).add_seeds([[3, 3, 3]])
+
+
+def test_add_point(blobs):
+    grower = grower_of(blobs)
+    assert numpy.array_equal(grower.index_of(ORIGIN + SPACING * [3, 3, 3]),
+                             [3, 3, 3])
+    assert grower.index_of(ORIGIN - SPACING) is None
+    assert grower.add_point(ORIGIN - SPACING) == 0
+    assert grower.add_point(ORIGIN + SPACING * [3.2, 2.9, 3.1]) == \
+        connected(blobs > 50, (3, 3, 3)).sum()
+
+
+def test_mask_slice(blobs):
+    grower = grower_of(blobs)
+    grower.add_seeds([[3, 3, 3], [9, 6, 8], [0, 8, 1]])
+    region = grower.to_array()
+    for index in range(SHAPE[2]):
+        numpy.testing.assert_array_equal(grower.mask_slice(0, index),
+                                         region[:, :, index])
+    for index in range(SHAPE[1]):
+        numpy.testing.assert_array_equal(grower.mask_slice(1, index),
+                                         region[:, index])
+    for index in range(SHAPE[0]):
+        numpy.testing.assert_array_equal(grower.mask_slice(2, index),
+                                         region[index])
+
+
+def test_confidence_range():
+    values = numpy.random.RandomState(0).normal(0., 5., SHAPE)
+    values[2:9, 2:8, 3:11] += 300.
+    grower = grower_of(values)
+    lower, upper = grower.confidence_range([[6, 5, 5]])
+    assert (grower.lower, grower.upper) == (lower, upper)
+    assert 200. < lower < 300. < upper < 400.
+    grower.add_seeds([[6, 5, 5]])
+    region = grower.to_array()
+    numpy.testing.assert_array_equal(
+        region, connected((values >= lower) & (values <= upper), (5, 5, 6)))
+    # Most of the box, nothing of the background
+    assert region.sum() > 0.9 * 7 * 6 * 8
+    assert not region[values < 150.].any()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy
+import pytest
+from image_io import numpy_to_vtk_image
+from volume_cache import VolumeCache
+from volume_stats import VolumeStatistics, StatisticsBuilder, \
+    image_statistics
+
+SHAPE = (5, 6, 7)  # (z, y, x)
+
+
+@pytest.fixture
+def volume():
+    return numpy.random.RandomState(0).normal(
+        100., 30., SHAPE).astype(numpy.float32)
+
+
+def check_slices(statistics, array):
+    """
+    Per-slice min, max, mean and histogram against NumPy, VTK axes
+    """
+    edges = statistics.bin_edges
+    for axis in range(3):
+        for index in range(array.shape[2 - axis]):
+            values = numpy.take(array, index, axis=2 - axis)
+            values = values[numpy.isfinite(values)]
+            assert statistics.slice_range(axis, index) == \
+                (values.min(), values.max())
+            assert statistics.slice_mean[axis][index] == \
+                pytest.approx(values.mean())
+            histogram = numpy.histogram(values, edges)[0]
+            numpy.testing.assert_array_equal(
+                statistics.slice_histograms[axis][index], histogram)
+
+
+@pytest.mark.parametrize('slab_voxels', [2 ** 22, 42, 1])
+def test_slices(volume, slab_voxels):
+    statistics = VolumeStatistics.from_array(volume, 32, slab_voxels)
+    assert statistics.minimum == volume.min()
+    assert statistics.maximum == volume.max()
+    assert statistics.mean == pytest.approx(volume.mean(dtype=numpy.float64))
+    numpy.testing.assert_array_equal(statistics.histogram,
+                                     numpy.histogram(volume,
+                                                     statistics.bin_edges)[0])
+    check_slices(statistics, volume)
+    assert statistics.slab_range(2, 1, 3) == \
+        (volume[1:3].min(), volume[1:3].max())
+
+
+@pytest.mark.parametrize('dtype', [numpy.int16, numpy.float64])
+def test_builder(dtype):
+    # Slabs out of order, each widening the range: the bins are merged
+    array = numpy.random.RandomState(1).normal(0., 1., SHAPE)
+    array *= 10. ** numpy.arange(SHAPE[0])[:, None, None]
+    array = array.astype(dtype)
+    builder = StatisticsBuilder(SHAPE, 64)
+    for start in (2, 0, 4, 1, 3):
+        builder.add(start, array[start:start + 1])
+    statistics = builder.result()
+    assert (statistics.minimum, statistics.maximum) == \
+        (array.min(), array.max())
+    assert 32 <= len(statistics.bin_edges) - 1 <= 64
+    numpy.testing.assert_array_equal(statistics.histogram,
+                                     numpy.histogram(array,
+                                                     statistics.bin_edges)[0])
+    check_slices(statistics, array)
+
+
+def test_integers():
+    array = numpy.arange(3 * 4 * 5, dtype=numpy.int16).reshape(3, 4, 5) % 7
+    statistics = VolumeStatistics.from_array(array)
+    # One bin per value
+    numpy.testing.assert_array_equal(statistics.bin_edges,
+                                     numpy.arange(8) - 0.5)
+    numpy.testing.assert_array_equal(statistics.histogram,
+                                     numpy.bincount(array.ravel()))
+    check_slices(statistics, array)
+
+
+def test_nan(volume):
+    volume[1, 2:4, 3:6] = numpy.nan
+    volume[3, 0, 0] = numpy.inf
+    volume[4] = numpy.nan
+    statistics = VolumeStatistics.from_array(volume, 32)
+    finite = volume[numpy.isfinite(volume)]
+    assert statistics.minimum == finite.min()
+    assert statistics.maximum == finite.max()
+    assert statistics.mean == pytest.approx(finite.mean(dtype=numpy.float64))
+    assert statistics.histogram.sum() == finite.size
+    check_slices(statistics, volume[:4])
+    # The NaN slice
+    assert statistics.slice_range(2, 4) == (numpy.inf, -numpy.inf)
+    assert numpy.isnan(statistics.slice_mean[2][4])
+    assert not statistics.slice_histograms[2][4].any()
+    assert statistics.occupied_range(2, -numpy.inf) == (0, 4)
+
+
+def test_percentile_window_level():
+    array = numpy.repeat(numpy.arange(100, dtype=numpy.float64), 10)
+    statistics = VolumeStatistics.from_array(array.reshape(10, 10, 10), 100)
+    assert statistics.percentile(50) == pytest.approx(50., abs=1.)
+    window, level = statistics.window_level(low=10., high=90.)
+    assert window == pytest.approx(80., abs=2.)
+    assert level == pytest.approx(50., abs=1.)
+    # Slice 0 normal to z holds the values 0..9
+    assert statistics.percentile(100, 2, 0) == pytest.approx(10., abs=1.)
+
+
+def test_occupied_range():
+    array = numpy.full((6, 3, 3), -1000.)
+    array[2:4, 1, 1] = 40.
+    statistics = VolumeStatistics.from_array(array)
+    assert statistics.occupied_range(2, -500) == (2, 4)
+    assert statistics.occupied_range(0, -500) == (1, 2)
+    assert statistics.occupied_range(2, 100) == (0, 0)
+
+
+def test_save_load(volume, tmp_path):
+    statistics = VolumeStatistics.from_array(volume, 16)
+    file_name = str(tmp_path / 'volume.stats.npz')
+    statistics.save(file_name)
+    loaded = VolumeStatistics.load(file_name)
+    assert (loaded.minimum, loaded.maximum, loaded.mean) == \
+        (statistics.minimum, statistics.maximum, statistics.mean)
+    numpy.testing.assert_array_equal(loaded.bin_edges, statistics.bin_edges)
+    numpy.testing.assert_array_equal(loaded.histogram, statistics.histogram)
+    for axis in range(3):
+        for name in ('slice_min', 'slice_max', 'slice_mean',
+                     'slice_histograms'):
+            numpy.testing.assert_array_equal(getattr(loaded, name)[axis],
+                                             getattr(statistics, name)[axis])
+
+
+def test_image_statistics(volume):
+    image = numpy_to_vtk_image(volume, (1., 1., 1.), (0., 0., 0.))
+    statistics = image_statistics(image)
+    assert image_statistics(image) is statistics
+    check_slices(statistics, volume)
+
+
+def test_cache_counts_statistics(volume, tmp_path):
+    cache = VolumeCache(str(tmp_path))
+    image = numpy_to_vtk_image(volume, (1., 1., 1.), (0., 0., 0.))
+    image_statistics(image)
+    cache.store('volume', image)
+    assert cache.size() == sum(
+        path.stat().st_size for path in tmp_path.iterdir())
+    assert cache.load('volume').statistics.maximum == volume.max()
+
+    cache.max_bytes = cache.size() - 1
+    cache.evict()
+    assert not list(tmp_path.iterdir())
+    assert cache.size() == 0
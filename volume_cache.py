@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+On-disk cache of decoded volumes.
+A volume is stored as a NPY file (plus a small JSON header for spacing and
+origin) which is memory-mapped straight back into a vtkImageData.
+"""
+
+import os
+import re
+import json
+import hashlib
+import numpy
+import SimpleITK as sitk
+from image_io import numpy_to_vtk_image
+from volume_stats import VolumeStatistics
+from lazy import lazy_import, vtk_module
+
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+
+# DICOM tag (group|element) of the Series Instance UID
+TAG_SERIES_UID = '0020|000e'
+
+
+def _stat_signature(digest, file_name):
+    """
+    Feed the name, size and mtime of a file into a hash
+    """
+    st = os.stat(file_name)
+    digest.update(('%s|%d|%d\n' % (
+        os.path.abspath(file_name), st.st_size,
+        int(st.st_mtime * 1e6))).encode('utf-8'))
+
+
+class VolumeCache(object):
+    """
+    A size-bounded, least recently used cache of volumes in `directory`.
+    Entries are keyed by the content of the source (series UID, file
+    names, sizes and modification times) and by how it was loaded, so a
+    changed file or another cast type is a miss, never a stale hit.
+    """
+
+    def __init__(self, directory, max_bytes=8 * 2 ** 30):
+        """
+        :param directory: where the cached volumes are written
+        :param max_bytes: total size of the cache before eviction
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key_for_series(self, path_DICOM, *options, file_names=None):
+        """
+        Key of a DICOM series
+        :param path_DICOM: the PATH of DICOM series
+        :param options: how it is loaded, e.g. the loader and cast type
+        :param file_names: the sorted files of the series if known
+        """
+        if file_names is None:
+            file_names = \
+                sitk.ImageSeriesReader.GetGDCMSeriesFileNames(path_DICOM)
+        header = sitk.ImageFileReader()
+        header.SetFileName(file_names[0])
+        header.ReadImageInformation()
+        series_uid = ''
+        if header.HasMetaDataKey(TAG_SERIES_UID):
+            series_uid = header.GetMetaData(TAG_SERIES_UID).strip()
+
+        digest = hashlib.sha1(series_uid.encode('utf-8'))
+        for file_name in file_names:
+            _stat_signature(digest, file_name)
+        digest.update(repr(options).encode('utf-8'))
+        return digest.hexdigest()
+
+    def key_for_meta_image(self, meta_name, *options):
+        """
+        Key of a Meta Image, its header and its detached data file if any
+        :param meta_name: the .mhd (or .mha) file
+        :param options: how it is loaded, e.g. the cast type
+        """
+        digest = hashlib.sha1()
+        _stat_signature(digest, meta_name)
+        with open(meta_name, 'rb') as header:
+            match = re.search(br'^ElementDataFile\s*=\s*(.+?)\s*$',
+                              header.read(4096), re.MULTILINE)
+        if match and match.group(1) != b'LOCAL':
+            data_name = os.path.join(os.path.dirname(meta_name),
+                                     match.group(1).decode('utf-8'))
+            if os.path.isfile(data_name):
+                _stat_signature(digest, data_name)
+        digest.update(repr(options).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.npy', base + '.json'
+
+    def _statistics_path(self, key):
+        return os.path.join(self.directory, key + '.stats.npz')
+
+    def load(self, key):
+        """
+        Memory-map a cached volume, no decoding
+        :return: vtkImageData, or None on a miss
+        """
+        data_name, header_name = self._paths(key)
+        try:
+            with open(header_name) as header_file:
+                header = json.load(header_file)
+            # Copy-on-write: pages are read lazily and shared with the
+            # page cache, yet VTK gets a writable buffer
+            array = numpy.load(data_name, mmap_mode='c')
+        except (IOError, OSError, ValueError):
+            return None
+        os.utime(data_name, None)  # mark as recently used
+        img_vtk = numpy_to_vtk_image(array, header['spacing'],
+                                     header['origin'])
+        # The statistics index, if it was stored with the volume
+        try:
+            img_vtk.statistics = VolumeStatistics.load(
+                self._statistics_path(key))
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        return img_vtk
+
+    def store(self, key, img_vtk):
+        """
+        Write a volume in the cache, then evict to stay within `max_bytes`.
+        Images with several components per point are not cached.
+        Its statistics index (`img_vtk.statistics`) is stored too.
+        """
+        scalars = img_vtk.GetPointData().GetScalars()
+        if scalars is None or scalars.GetNumberOfComponents() != 1:
+            return
+        array = numpy_support.vtk_to_numpy(scalars).reshape(
+            img_vtk.GetDimensions()[::-1])
+
+        data_name, header_name = self._paths(key)
+        # Write under temporary names so a crash never leaves a torn entry
+        numpy.save(data_name + '.tmp.npy', array)
+        os.rename(data_name + '.tmp.npy', data_name)
+        with open(header_name + '.tmp', 'w') as header_file:
+            json.dump({'spacing': img_vtk.GetSpacing(),
+                       'origin': img_vtk.GetOrigin()}, header_file)
+        os.rename(header_name + '.tmp', header_name)
+        statistics = getattr(img_vtk, 'statistics', None)
+        if statistics is not None:
+            statistics_name = self._statistics_path(key)
+            statistics.save(statistics_name + '.tmp.npz')
+            os.rename(statistics_name + '.tmp.npz', statistics_name)
+        self.evict()
+
+    def invalidate(self, key):
+        """
+        Remove one entry
+        """
+        for name in self._paths(key) + (self._statistics_path(key),):
+            if os.path.exists(name):
+                os.remove(name)
+
+    def clear(self):
+        """
+        Remove every entry
+        """
+        for key in self.keys():
+            self.invalidate(key)
+
+    def keys(self):
+        return [name[:-len('.npy')] for name in os.listdir(self.directory)
+                if name.endswith('.npy') and not name.endswith('.tmp.npy')]
+
+    def _entry_size(self, key):
+        """
+        Bytes of the volume, header and statistics files of an entry
+        """
+        return sum(os.path.getsize(name)
+                   for name in self._paths(key) + (self._statistics_path(key),)
+                   if os.path.exists(name))
+
+    def size(self):
+        return sum(self._entry_size(key) for key in self.keys())
+
+    def evict(self):
+        """
+        Drop the least recently used entries until the cache fits
+        """
+        entries = []
+        for key in self.keys():
+            entries.append((os.path.getmtime(self._paths(key)[0]),
+                            self._entry_size(key), key))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        while entries and total > self.max_bytes:
+            _, size, key = entries.pop(0)
+            self.invalidate(key)
+            total -= size
@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Statistics index of a volume: global and per-slice ranges, means and
+histograms, for auto window/level and range queries without a scan.
+"""
+
+from lazy import lazy_import
+
+numpy = lazy_import('numpy')
+numpy_support = lazy_import('vtkmodules.util.numpy_support',
+                            'vtk.util.numpy_support')
+
+
+class VolumeStatistics(object):
+    """
+    Min, max, mean and histogram of the whole volume and of every slice
+    along each axis. Axes are VTK's (0 is x, the slices of a plane widget
+    of orientation 0), the histograms share `bin_edges`.
+    Built in one sweep, slab by slab (see `StatisticsBuilder`, which the
+    loaders feed as they decode); queries then cost O(bins) at most,
+    whatever the size of the volume.
+    NaN and infinite voxels are left out of all of them; a slice without
+    any other has the range (inf, -inf) and a NaN mean.
+    """
+
+    def __init__(self, minimum, maximum, mean, bin_edges, histogram,
+                 slice_min, slice_max, slice_mean, slice_histograms):
+        """
+        :param slice_min, slice_max, slice_mean, slice_histograms: lists of
+        one array per axis (x, y, z), of one entry (or histogram) per slice
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.mean = mean
+        self.bin_edges = bin_edges
+        self.histogram = histogram
+        self.slice_min = slice_min
+        self.slice_max = slice_max
+        self.slice_mean = slice_mean
+        self.slice_histograms = slice_histograms
+
+    @classmethod
+    def from_array(cls, array, bins=256, slab_voxels=2 ** 22):
+        """
+        :param array: (z, y, x) volume
+        :param bins: see `StatisticsBuilder`
+        :param slab_voxels: bounds the temporaries of a slab
+        """
+        nz, ny, nx = array.shape
+        builder = StatisticsBuilder(array.shape, bins)
+        step = max(1, slab_voxels // max(1, ny * nx))
+        for start in range(0, nz, step):
+            builder.add(start, array[start:start + step])
+        return builder.result()
+
+    @classmethod
+    def from_image(cls, image_data, bins=256):
+        dims = image_data.GetDimensions()
+        return cls.from_array(numpy_support.vtk_to_numpy(
+            image_data.GetPointData().GetScalars()).reshape(dims[::-1]),
+            bins)
+
+    def slice_range(self, axis, index):
+        """
+        (min, max) of slice `index` normal to `axis`
+        """
+        return self.slice_min[axis][index], self.slice_max[axis][index]
+
+    def slab_range(self, axis, start, stop):
+        """
+        (min, max) of the slices start..stop-1 normal to `axis`
+        """
+        return self.slice_min[axis][start:stop].min(), \
+            self.slice_max[axis][start:stop].max()
+
+    def occupied(self, axis, threshold):
+        """
+        Mask of the slices normal to `axis` having a value above
+        `threshold`, e.g. -500 HU for anything but air
+        """
+        return self.slice_max[axis] > threshold
+
+    def occupied_range(self, axis, threshold):
+        """
+        (first, stop) of the slices normal to `axis` worth visiting,
+        everything outside is at most `threshold`. (0, 0) if none is.
+        """
+        indices = numpy.flatnonzero(self.occupied(axis, threshold))
+        if not len(indices):
+            return 0, 0
+        return int(indices[0]), int(indices[-1]) + 1
+
+    def percentile(self, q, axis=None, index=None):
+        """
+        Value below which q % of the voxels are, of the volume or of
+        slice `index` normal to `axis`, to the bin
+        """
+        histogram = self.histogram if axis is None \
+            else self.slice_histograms[axis][index]
+        cumulative = numpy.cumsum(histogram)
+        if not cumulative[-1]:
+            return self.minimum
+        bin_index = numpy.searchsorted(cumulative, q / 100. * cumulative[-1])
+        return float(self.bin_edges[min(bin_index + 1,
+                                        len(self.bin_edges) - 1)])
+
+    def window_level(self, axis=None, index=None, low=1., high=99.):
+        """
+        (window, level) spanning the `low` to `high` percentiles
+        """
+        lower = self.percentile(low, axis, index)
+        upper = self.percentile(high, axis, index)
+        return max(upper - lower, 1e-6), (upper + lower) / 2.
+
+    def transposed(self):
+        """
+        The statistics of the volume with its x and z axes swapped, as
+        image_io.read_DICOM gives it
+        """
+        return VolumeStatistics(
+            self.minimum, self.maximum, self.mean, self.bin_edges,
+            self.histogram, self.slice_min[::-1], self.slice_max[::-1],
+            self.slice_mean[::-1], self.slice_histograms[::-1])
+
+    def save(self, file_name):
+        arrays = {'scalars': numpy.array([self.minimum, self.maximum,
+                                          self.mean]),
+                  'bin_edges': self.bin_edges,
+                  'histogram': self.histogram}
+        for axis in range(3):
+            arrays['slice_min_%d' % axis] = self.slice_min[axis]
+            arrays['slice_max_%d' % axis] = self.slice_max[axis]
+            arrays['slice_mean_%d' % axis] = self.slice_mean[axis]
+            arrays['slice_histograms_%d' % axis] = \
+                self.slice_histograms[axis]
+        numpy.savez(file_name, **arrays)
+
+    @classmethod
+    def load(cls, file_name):
+        with numpy.load(file_name) as arrays:
+            minimum, maximum, mean = arrays['scalars']
+            return cls(float(minimum), float(maximum), float(mean),
+                       arrays['bin_edges'], arrays['histogram'],
+                       [arrays['slice_min_%d' % a] for a in range(3)],
+                       [arrays['slice_max_%d' % a] for a in range(3)],
+                       [arrays['slice_mean_%d' % a] for a in range(3)],
+                       [arrays['slice_histograms_%d' % a]
+                        for a in range(3)])
+
+
+def _finite(slab):
+    """
+    (mask of the finite voxels or None if all are, slab with the others
+    set to +inf, to -inf, to 0)
+    """
+    if slab.dtype.kind in 'iub':
+        return None, slab, slab, slab
+    valid = numpy.isfinite(slab)
+    return (valid, numpy.where(valid, slab, numpy.inf),
+            numpy.where(valid, slab, -numpy.inf),
+            numpy.where(valid, slab, 0))
+
+
+class StatisticsBuilder(object):
+    """
+    Accumulates the VolumeStatistics of a (z, y, x) volume slab by slab,
+    in any order, e.g. as a loader decodes it: no other pass is needed.
+    The range is not known before the last slab, so the histograms are
+    kept on a lattice of bins of a power of two width (centred on the
+    integers for integer data, one bin per value while they fit) which
+    is widened, merging bins, when a slab falls outside of it. In the
+    end at least half of the `bins` bins span [min, max].
+    """
+
+    def __init__(self, shape, bins=256):
+        """
+        :param shape: (z, y, x) of the volume
+        :param bins: maximum number of histogram bins
+        """
+        nz, ny, nx = shape
+        self.shape = tuple(shape)
+        self.bins = bins
+        self.low = numpy.inf
+        self.high = -numpy.inf
+        # Bin k of the lattice is [offset + k * width, offset + (k + 1) *
+        # width), the histograms hold bins first .. first + bins - 1
+        self.offset = None
+        self.width = None
+        self.first = 0
+        self.slice_min = [numpy.full(n, numpy.inf) for n in (nx, ny, nz)]
+        self.slice_max = [numpy.full(n, -numpy.inf) for n in (nx, ny, nz)]
+        self.slice_sum = [numpy.zeros(n) for n in (nx, ny, nz)]
+        self.slice_count = [numpy.zeros(n) for n in (nx, ny, nz)]
+        self.slice_histograms = [numpy.zeros((n, bins), dtype=numpy.int64)
+                                 for n in (nx, ny, nz)]
+
+    def _lattice_index(self, value, width):
+        return int(numpy.floor((value - self.offset) / width))
+
+    def _fit(self, low, high, integral):
+        """
+        Widen the lattice (and merge the bins) to hold [low, high] too
+        """
+        if self.width is None:
+            if integral:
+                self.offset, self.width = -0.5, 1.
+            else:
+                # The finest power of two the slab allows, it only widens
+                scale = (high - low) / self.bins or abs(low) / 2 ** 8 or 1.
+                self.offset, self.width = 0., 2. ** numpy.floor(
+                    numpy.log2(scale))
+            self.first = self._lattice_index(low, self.width)
+        low = min(low, self.low)
+        high = max(high, self.high)
+        shift = 0
+        width = self.width
+        while self._lattice_index(high, width) - \
+                self._lattice_index(low, width) >= self.bins:
+            shift += 1
+            width *= 2
+        # The histograms start at the bin of the lowest value
+        first = self._lattice_index(low, width)
+        if shift == 0 and first == self.first:
+            return
+        # Old bin b goes to the new bin (self.first + b) >> shift - first,
+        # which is monotonic: merge with reduceat
+        target = ((self.first + numpy.arange(self.bins)) >> shift) - first
+        target = numpy.clip(target, 0, self.bins - 1)
+        starts = numpy.flatnonzero(numpy.diff(target, prepend=-1))
+        for histograms in self.slice_histograms:
+            merged = numpy.add.reduceat(histograms, starts, axis=1)
+            histograms[:] = 0
+            histograms[:, target[starts]] = merged
+        self.width = width
+        self.first = first
+
+    def add(self, start, slab):
+        """
+        Account for the slices start .. start + len(slab) - 1 along z
+        :param slab: (n, y, x) array
+        """
+        stop = start + len(slab)
+        valid, slab_low, slab_high, slab_zero = _finite(slab)
+        z_min = slab_low.min(axis=(1, 2))
+        z_max = slab_high.max(axis=(1, 2))
+        self.slice_min[2][start:stop] = z_min
+        self.slice_max[2][start:stop] = z_max
+        numpy.minimum(self.slice_min[1], slab_low.min(axis=(0, 2)),
+                      out=self.slice_min[1])
+        numpy.maximum(self.slice_max[1], slab_high.max(axis=(0, 2)),
+                      out=self.slice_max[1])
+        numpy.minimum(self.slice_min[0], slab_low.min(axis=(0, 1)),
+                      out=self.slice_min[0])
+        numpy.maximum(self.slice_max[0], slab_high.max(axis=(0, 1)),
+                      out=self.slice_max[0])
+        self.slice_sum[2][start:stop] = slab_zero.sum(axis=(1, 2),
+                                                      dtype=numpy.float64)
+        self.slice_sum[1] += slab_zero.sum(axis=(0, 2), dtype=numpy.float64)
+        self.slice_sum[0] += slab_zero.sum(axis=(0, 1), dtype=numpy.float64)
+        if valid is None:
+            nz, ny, nx = slab.shape
+            self.slice_count[2][start:stop] = ny * nx
+            self.slice_count[1] += nz * nx
+            self.slice_count[0] += nz * ny
+        else:
+            self.slice_count[2][start:stop] = valid.sum(axis=(1, 2))
+            self.slice_count[1] += valid.sum(axis=(0, 2))
+            self.slice_count[0] += valid.sum(axis=(0, 1))
+
+        low, high = z_min.min(), z_max.max()
+        if low > high:
+            # Not a finite voxel
+            return
+        self._fit(low, high, slab.dtype.kind in 'iub')
+        self.low = min(low, self.low)
+        self.high = max(high, self.high)
+
+        bins = self.bins
+        if valid is None and self.offset == -0.5:
+            # Integers on the integer lattice: floor((v + 0.5) / 2 ** n)
+            # is v >> n, without a float temporary
+            entries = slab.astype(numpy.intp) >> int(numpy.log2(self.width))
+            entries -= self.first
+            numpy.clip(entries, 0, bins - 1, out=entries)
+        else:
+            entries = numpy.floor((slab_zero - self.offset) / self.width)
+            entries = numpy.clip(entries - self.first, 0,
+                                 bins - 1).astype(numpy.intp)
+        z_offsets = (numpy.arange(len(slab)) * bins)[:, None, None]
+        y_offsets = (numpy.arange(slab.shape[1]) * bins)[None, :, None]
+        x_offsets = (numpy.arange(slab.shape[2]) * bins)[None, None, :]
+        for axis, offsets in ((2, z_offsets), (1, y_offsets),
+                              (0, x_offsets)):
+            indices = entries + offsets
+            if valid is not None:
+                indices = indices[valid]
+            counts = numpy.bincount(indices.ravel(),
+                                    minlength=len(offsets.ravel()) * bins)
+            counts = counts.reshape(-1, bins)
+            if axis == 2:
+                self.slice_histograms[2][start:stop] = counts
+            else:
+                self.slice_histograms[axis] += counts
+
+    def result(self):
+        """
+        :return: VolumeStatistics of the slabs added
+        """
+        if self.width is None:
+            # Not a finite voxel
+            low = high = 0.
+            bin_edges = numpy.array([0., 1.])
+            histograms = [h[:, :1] * 0 for h in self.slice_histograms]
+        else:
+            low, high = float(self.low), float(self.high)
+            # Only the bins spanning [low, high]
+            first = self._lattice_index(low, self.width)
+            last = self._lattice_index(high, self.width)
+            bin_edges = self.offset + self.width * numpy.arange(
+                first, last + 2)
+            histograms = [h[:, first - self.first:last - self.first + 1]
+                          for h in self.slice_histograms]
+        count = self.slice_count[2].sum()
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            slice_mean = [total / count_ for total, count_ in
+                          zip(self.slice_sum, self.slice_count)]
+        return VolumeStatistics(
+            minimum=low, maximum=high,
+            mean=float(self.slice_sum[2].sum() / count) if count else 0.,
+            bin_edges=bin_edges,
+            histogram=histograms[2].sum(axis=0),
+            slice_min=self.slice_min, slice_max=self.slice_max,
+            slice_mean=slice_mean, slice_histograms=histograms)
+
+
+def image_statistics(image_data, bins=256):
+    """
+    The VolumeStatistics of a vtkImageData, computed once and kept on it
+    (as `image_data.statistics`, which the loaders fill when asked)
+    """
+    statistics = getattr(image_data, 'statistics', None)
+    if statistics is None:
+        statistics = VolumeStatistics.from_image(image_data, bins)
+        image_data.statistics = statistics
+    return statistics